@@ -26,6 +26,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # Token 時效：1 天 (60 分鐘 * 24 小
 # tokenUrl="/auth/login" 意思是：如果 token 無效，請用戶去 /auth/login 取得
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# 選擇性登入的端點用：沒有 Token 時不拋出 401，交給 get_optional_current_user 處理
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
 
 # --- 2. 建立「通行證」的函式 ---
 
@@ -95,4 +98,22 @@ def get_current_user(
         raise credentials_exception
         
     # 驗明正身！把 User 物件回傳給 API 路由
-    return user
\ No newline at end of file
+    return user
+
+
+def get_optional_current_user(
+    db: Session = Depends(get_db),
+    token: Optional[str] = Depends(oauth2_scheme_optional)
+) -> Optional[User]:
+    """
+    FastAPI Dependency:
+    與 get_current_user 相同，但沒有帶 Token 或 Token 無效（過期、簽名不符、使用者不存在）
+    時回傳 None，匿名也能使用的端點不會因為殘留的舊 Token 而失敗。
+    需要登入的功能由路由自行判斷 None 並回傳 401。
+    """
+    if token is None:
+        return None
+    try:
+        return get_current_user(db=db, token=token)
+    except HTTPException:
+        return None
@@ -91,6 +91,65 @@ async def start_background_purge_task():
     asyncio.create_task(purge_loop())
 
 
+@app.on_event("startup")
+async def warm_movie_vector_index():
+    """預先載入電影向量索引（優先 mmap 磁碟快照，快照不存在時從 DB 載入），
+    避免第一個推薦請求承擔載入成本。載入失敗時只記錄錯誤，搜索時會再嘗試。"""
+    from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+    from app.services.vector_index import warm_vector_index
+    from app.services.mood_template_embeddings import get_mood_template_embeddings
+    from app.services.pipeline_trace import recommend_logger
+
+    try:
+        await asyncio.to_thread(warm_vector_index, EMBEDDING_DIM, EMBEDDING_MODEL)
+    except Exception:
+        recommend_logger.exception("Error warming vector index")
+
+    # 預先計算的 Mood 模板 Embedding（tools/build_mood_template_embeddings.py；不存在時略過）
+    await asyncio.to_thread(get_mood_template_embeddings, EMBEDDING_MODEL, EMBEDDING_DIM)
+
+
+@app.on_event("startup")
+async def start_vector_index_refresher():
+    """啟動背景 Task，定期把 movie_vectors 的新增 / 重新計算 / 刪除套用到向量索引，
+    讓 tools/import_movies.py 與 batch_populate_enhanced_embeddings.py 的結果
+    在數秒內即可被搜索，不需要重新載入或重啟。"""
+    from app.services.phase36_config import PHASE36_CONFIG
+    from app.services.pipeline_trace import recommend_logger
+    from app.services.vector_index import refresh_loaded_vector_index
+
+    cfg = PHASE36_CONFIG.get("vector_index", {})
+    interval = cfg.get("refresh_interval_seconds", 5)
+    deletion_sync_every = max(int(cfg.get("deletion_sync_every", 12)), 1)
+
+    async def refresh_loop():
+        tick = 0
+        while True:
+            await asyncio.sleep(interval)
+            tick += 1
+            try:
+                # DB 查詢與矩陣更新在 thread 中執行，避免阻塞 event loop
+                await asyncio.to_thread(
+                    refresh_loaded_vector_index,
+                    sync_deletions=(tick % deletion_sync_every == 0),
+                    overlap_seconds=cfg.get("refresh_overlap_seconds", 30),
+                    max_delta_ratio=cfg.get("max_delta_ratio", 0.2),
+                )
+            except Exception:
+                recommend_logger.exception("Error in vector index refresh_loop")
+
+    asyncio.create_task(refresh_loop())
+
+
+@app.on_event("shutdown")
+async def flush_query_embedding_touches():
+    """關閉前把尚未寫回的 query_embeddings 命中紀錄（hit_count / last_used_at）寫入 DB"""
+    from app.services.query_embedding_cache import query_embedding_cache
+
+    if query_embedding_cache.use_db:
+        await asyncio.to_thread(query_embedding_cache.flush_touches)
+
+
 # --- 6. 你的測試路由 (保持不變) ---
 @app.get("/db-test")
 def db_test():
@@ -1,7 +1,7 @@
 """
 Movies API Routes - 處理電影資料的獲取和儲存
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy.sql.expression import func
 from typing import List
@@ -12,6 +12,8 @@ from datetime import datetime
 from db.database import get_db
 from app.models import Movie
 from app.schemas.movie_result import FrontendMovie
+from app.services.movie_neighbors import get_similar_movie_ids
+from app.services.phase36_config import PHASE36_CONFIG
 
 router = APIRouter(prefix="/api/movies", tags=["movies"])
 
@@ -186,6 +188,34 @@ async def check_movie_exists(
     return {"exists": movie is not None, "tmdb_id": tmdb_id}
 
 
+@router.get("/{tmdb_id}/similar", response_model=List[FrontendMovie])
+async def get_similar_movies(
+    tmdb_id: int,
+    limit: int = Query(20, ge=1, le=PHASE36_CONFIG["movie_neighbors"]["k"]),
+    db: Session = Depends(get_db),
+):
+    """取得相似電影（預先計算的 movie_neighbors，依相似度降序）"""
+    neighbors = get_similar_movie_ids(db, tmdb_id, limit)
+    
+    if neighbors is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="此電影尚未計算相似電影"
+        )
+    
+    neighbor_ids = [neighbor_id for neighbor_id, _ in neighbors]
+    movies_by_id = {
+        movie.tmdb_id: movie
+        for movie in db.query(Movie).filter(Movie.tmdb_id.in_(neighbor_ids)).all()
+    }
+    
+    return [
+        _build_frontend_movie(movies_by_id[neighbor_id])
+        for neighbor_id in neighbor_ids
+        if neighbor_id in movies_by_id
+    ]
+
+
 @router.get("/{tmdb_id}", response_model=FrontendMovie)
 async def get_movie(
     tmdb_id: int,
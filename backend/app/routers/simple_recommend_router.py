@@ -2,13 +2,25 @@
 """
 智能混合推薦 Router (Feature + Embedding)
 """
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+import json
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from db.database import SessionLocal, get_db
-from app.services.simple_recommend import recommend_movies_embedding_first
+from app.services.simple_recommend import (
+    recommend_movies_embedding_first_batch,
+    recommend_movies_embedding_first_stream,
+    recommend_movies_embedding_first_with_session,
+    recommend_movies_session_page,
+)
+from app.services.recommendation_sessions import recommendation_sessions
 from app.services.mapping_tables import get_mood_label_list  # 修改導入 ⭐
+from app.services.phase36_config import PHASE36_CONFIG
+from app.services.pipeline_trace import span, trace_request
+from app.core.security import get_optional_current_user
+from app.models import User
 
 router = APIRouter(prefix="/api/recommend/v2", tags=["recommend-v2"])
 
@@ -17,11 +29,33 @@ class SimpleRecommendRequest(BaseModel):
     selected_genres: Optional[List[str]] = None  # 類型標籤 (繁體中文)
     selected_moods: Optional[List[str]] = None   # 心情/情境標籤
     selected_eras: Optional[List[str]] = None    # 年代標籤 (如 ["90s", "00s"])
+    personalized: bool = False                   # 個人化模式（需登入）
+
+
+# 單次批次請求最多的查詢數
+MAX_BATCH_QUERIES = 32
+
+
+class BatchRecommendRequest(BaseModel):
+    queries: List[SimpleRecommendRequest] = Field(..., min_length=1, max_length=MAX_BATCH_QUERIES)
+    count: int = Field(10, ge=1, le=50)  # 每個查詢的返回數量
+
+
+def _eras_to_year_ranges(selected_eras: Optional[List[str]]) -> Optional[List[List[int]]]:
+    """將 selected_eras 轉換為 year_ranges"""
+    from app.services.mapping_tables import ERA_RANGE_MAP
+    
+    if not selected_eras:
+        return None
+    return [ERA_RANGE_MAP.get(era, [2000, 2009]) for era in selected_eras]
+
 
 @router.post("/movies")
 async def get_simple_recommendations(
     request: SimpleRecommendRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
 ):
     """
     Phase 3.6 Embedding-First 推薦 API
@@ -40,35 +74,50 @@ async def get_simple_recommendations(
     - selected_moods: 心情/情境標籤（如 ["heartwarming", "uplifting"]）
     - selected_genres: 類型標籤（如 ["劇情", "愛情"]）
     - selected_eras: 年代標籤（如 ["90s", "00s"]）
+    - personalized: 個人化模式（需登入）：查詢與使用者的品味向量（Watchlist / Top10）
+      混合後搜索，並排除已收藏的電影
     
     返回：
     - movies: 推薦電影列表（包含 embedding_score, match_ratio, quadrant）
     - strategy: "Phase36-EmbeddingFirst"
     - version: "3.6"
+    - session_id / next_cursor / remaining: 「載入更多」用（GET /sessions/{session_id}?cursor=next_cursor），
+      沒有剩餘候選或 Session 停用時 session_id 為 None
+    - Server-Timing header: 各階段耗時（query_gen / embed / search / fetch / filter / rank / select / total）
     """
+    if request.personalized and current_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="個人化推薦需要登入",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     try:
         # Phase 3.6: Embedding-First 架構（唯一推薦引擎）
-        from app.services.mapping_tables import ERA_RANGE_MAP
+        with trace_request() as trace:
+            with span("total"):
+                results, session = await recommend_movies_embedding_first_with_session(
+                    natural_query=request.query or "",
+                    mood_labels=request.selected_moods or [],
+                    genres=request.selected_genres or [],
+                    year_ranges=_eras_to_year_ranges(request.selected_eras),
+                    db_session=db,
+                    count=10,
+                    user_id=current_user.user_id if request.personalized else None
+                )
         
-        # 將 selected_eras 轉換為 year_ranges
-        year_ranges = None
-        if request.selected_eras:
-            year_ranges = [ERA_RANGE_MAP.get(era, [2000, 2009]) for era in request.selected_eras]
-        
-        results = await recommend_movies_embedding_first(
-            natural_query=request.query or "",
-            mood_labels=request.selected_moods or [],
-            genres=request.selected_genres or [],
-            year_ranges=year_ranges,
-            db_session=db,
-            count=10
-        )
+        if PHASE36_CONFIG.get("tracing", {}).get("server_timing_header", True):
+            response.headers["Server-Timing"] = trace.server_timing()
         
         return {
             "success": True,
             "query": request.query,
             "count": len(results),
             "movies": results,
+            "session_id": session.session_id if session else None,
+            "next_cursor": session.first_cursor if session else None,
+            "remaining": session.remaining_after(session.first_cursor) if session else 0,
+            "personalized": request.personalized,
             "strategy": "Phase36-EmbeddingFirst",
             "version": "3.6",
             "config": {
@@ -86,6 +135,200 @@ async def get_simple_recommendations(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/sessions/{session_id}")
+async def get_session_page(
+    session_id: str,
+    response: Response,
+    cursor: int = Query(..., ge=0, description="上一頁（或 /movies）回傳的 next_cursor"),
+    count: Optional[int] = Query(None, ge=1, description="每頁數量（預設 recommendation_sessions.page_size）"),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """
+    推薦 Session 的「載入更多」
+    
+    依 POST /movies 當時 Step 6 的排序往下翻頁：不重新 Embedding / 搜索 / 排序，
+    也不會返回已回傳過的電影。同一個 cursor 重送得到同一頁。
+    
+    返回：
+    - movies: 格式與 POST /movies 相同
+    - next_cursor: 下一頁的 cursor（沒有剩餘時為 None）
+    - remaining: next_cursor 之後剩餘的電影數
+    
+    Session 不存在、已過期（recommendation_sessions.ttl_seconds）或屬於其他使用者時返回 404。
+    """
+    sessions_cfg = PHASE36_CONFIG.get("recommendation_sessions", {})
+    session = recommendation_sessions.get(
+        session_id, user_id=current_user.user_id if current_user is not None else None
+    )
+    if session is None:
+        raise HTTPException(status_code=404, detail="推薦 Session 不存在或已過期")
+    
+    page_size = min(count or sessions_cfg.get("page_size", 10), sessions_cfg.get("max_page_size", 50))
+    
+    try:
+        with trace_request() as trace:
+            with span("total"):
+                results, next_cursor = await recommend_movies_session_page(session, cursor, page_size, db)
+        
+        if PHASE36_CONFIG.get("tracing", {}).get("server_timing_header", True):
+            response.headers["Server-Timing"] = trace.server_timing()
+        
+        return {
+            "success": True,
+            "session_id": session_id,
+            "count": len(results),
+            "movies": results,
+            "next_cursor": next_cursor,
+            "remaining": session.remaining_after(next_cursor),
+            "strategy": "Phase36-EmbeddingFirst",
+            "version": "3.6"
+        }
+        
+    except Exception as e:
+        print(f"[Error] 載入更多失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/movies:stream")
+async def stream_simple_recommendations(
+    request: SimpleRecommendRequest,
+    current_user: Optional[User] = Depends(get_optional_current_user)
+):
+    """
+    Phase 3.6 漸進式推薦 API（NDJSON，每行一個 JSON 事件）
+    
+    參數與 POST /movies 相同。Step 6 排序完成後先送出 header，
+    保證的 Top N 補完詳細欄位後立即送出，隨機選取隨後送出：
+    
+        {"event": "header", "query": "...", "scenario": "nl_only", "conflict_detected": false,
+         "embedding_query": "...", "candidate_count": 150, "quadrant_counts": {"q1_perfect_match": 12, ...},
+         "personalized": false, "strategy": "Phase36-EmbeddingFirst", "version": "3.6"}
+        {"event": "movie", "section": "guaranteed", "rank": 1, "movie": {...}}
+        ...
+        {"event": "movie", "section": "random", "rank": 4, "movie": {...}}
+        ...
+        {"event": "done", "count": 10, "timing_ms": {"query_gen": 0.4, ..., "total": 85.1}}
+    
+    movie 的格式與 POST /movies 的 movies 項目相同。回應開始後才發生的錯誤
+    無法再改變 HTTP 狀態碼，改以 {"event": "error", "detail": "..."} 結束串流。
+    各階段耗時放在 done 事件的 timing_ms（Server-Timing header 必須在內容之前送出）。
+    """
+    if request.personalized and current_user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="個人化推薦需要登入",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user_id = current_user.user_id if request.personalized else None
+    
+    async def events():
+        # 串流在 endpoint 返回後才執行，使用自己的 Session（請求的依賴此時可能已關閉）
+        with trace_request() as trace, SessionLocal() as db:
+            try:
+                with span("total"):
+                    async for event in recommend_movies_embedding_first_stream(
+                        natural_query=request.query or "",
+                        mood_labels=request.selected_moods or [],
+                        genres=request.selected_genres or [],
+                        year_ranges=_eras_to_year_ranges(request.selected_eras),
+                        db_session=db,
+                        count=10,
+                        user_id=user_id
+                    ):
+                        if event["event"] == "done":
+                            # total 結束後才送出，timing_ms 才包含 total
+                            done = event
+                            continue
+                        if event["event"] == "header":
+                            event = {
+                                "event": "header",
+                                "query": request.query,
+                                **{k: v for k, v in event.items() if k != "event"},
+                                "personalized": request.personalized,
+                                "strategy": "Phase36-EmbeddingFirst",
+                                "version": "3.6",
+                            }
+                        yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+                
+                done["timing_ms"] = {stage: round(ms, 2) for stage, ms in trace.durations_ms.items()}
+                yield json.dumps(done, ensure_ascii=False) + "\n"
+            except Exception as e:
+                print(f"[Error] 串流推薦失敗: {e}")
+                import traceback
+                traceback.print_exc()
+                yield json.dumps({"event": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        # 反向代理（nginx）不緩衝，每行到達時即轉送給客戶端
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/movies:batch")
+async def get_batch_recommendations(
+    request: BatchRecommendRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Phase 3.6 批次推薦 API（首頁多列、Mood 預設、A/B 變體、預先計算）
+    
+    每個查詢的參數與 POST /movies 相同。所有查詢共用一次 Embedding 呼叫
+    與一次全庫矩陣運算，之後的過濾 / 分類 / 選取逐一執行。
+    不支援個人化查詢（personalized=true 返回 400，請改用 POST /movies）。
+    
+    返回：
+    - results: 與 queries 順序一致，每項為 {"query", "count", "movies"}
+    """
+    personalized = [i for i, query in enumerate(request.queries) if query.personalized]
+    if personalized:
+        raise HTTPException(
+            status_code=400,
+            detail=f"批次推薦不支援個人化查詢（queries {personalized}），請改用 POST /movies",
+        )
+    
+    try:
+        batch_results = await recommend_movies_embedding_first_batch(
+            [
+                {
+                    "natural_query": query.query or "",
+                    "mood_labels": query.selected_moods or [],
+                    "genres": query.selected_genres or [],
+                    "year_ranges": _eras_to_year_ranges(query.selected_eras),
+                }
+                for query in request.queries
+            ],
+            db_session=db,
+            count=request.count
+        )
+        
+        return {
+            "success": True,
+            "count": len(batch_results),
+            "results": [
+                {
+                    "query": query.query,
+                    "count": len(movies),
+                    "movies": movies
+                }
+                for query, movies in zip(request.queries, batch_results)
+            ],
+            "strategy": "Phase36-EmbeddingFirst",
+            "version": "3.6"
+        }
+        
+    except Exception as e:
+        print(f"[Error] 批次推薦失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/mood-labels")
 async def get_mood_labels():
     """
@@ -110,6 +353,31 @@ async def get_mood_labels():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stats")
+async def get_recommend_stats():
+    """
+    推薦系統執行期統計（快取命中率、各階段延遲直方圖等）
+    """
+    from app.services.query_embedding_cache import query_embedding_cache
+    from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+    from app.services.mood_template_embeddings import get_mood_template_embeddings
+    from app.services.ranked_candidate_cache import ranked_candidate_cache
+    from app.services.pipeline_trace import stage_histograms
+    from app.services.singleflight import recommend_singleflight
+    
+    mood_templates = get_mood_template_embeddings(EMBEDDING_MODEL, EMBEDDING_DIM)
+    
+    return {
+        "success": True,
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "ranked_candidate_cache": ranked_candidate_cache.stats(),
+        "singleflight": recommend_singleflight.stats(),
+        "mood_template_embeddings": mood_templates.stats() if mood_templates is not None else None,
+        "recommendation_sessions": recommendation_sessions.stats(),
+        "stage_latency_ms": stage_histograms.stats()
+    }
+
+
 @router.get("/system-info")
 async def get_system_info():
     """
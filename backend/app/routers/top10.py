@@ -18,6 +18,7 @@ from app.schemas.top10 import (
 )
 from app.schemas.movie_result import FrontendMovie
 from app.core.security import get_current_user
+from app.services.user_taste import diff_weights, top10_weights, update_user_taste_vector
 
 router = APIRouter(prefix="/api/top10", tags=["top10"])
 
@@ -175,6 +176,7 @@ async def add_to_top10(
 ):
     """將電影加入 Top 10 List"""
     category = data.category if data else None
+    weights_before = top10_weights(db, current_user.user_id)
     
     # 檢查該分類的 Top 10 是否已滿
     existing_count = (
@@ -259,6 +261,11 @@ async def add_to_top10(
     db.commit()
     db.refresh(top10_item)
     
+    # 增量更新品味向量（新項目 + 被往後擠的項目）
+    update_user_taste_vector(
+        db, current_user.user_id, diff_weights(weights_before, top10_weights(db, current_user.user_id))
+    )
+    
     return Top10Item(
         id=top10_item.id,
         user_id=top10_item.user_id,
@@ -297,6 +304,7 @@ async def remove_from_top10(
         )
     
     removed_rank = item.rank
+    weights_before = top10_weights(db, current_user.user_id)
     
     db.delete(item)
     
@@ -316,6 +324,11 @@ async def remove_from_top10(
     
     db.commit()
     
+    # 增量更新品味向量（移除的項目 + 往前移的項目）
+    update_user_taste_vector(
+        db, current_user.user_id, diff_weights(weights_before, top10_weights(db, current_user.user_id))
+    )
+    
     return None
 
 
@@ -335,6 +348,8 @@ async def reorder_top10(
                 detail=f"Item {item_data.id} not found or does not belong to you",
             )
     
+    weights_before = top10_weights(db, current_user.user_id)
+    
     # 更新 rank
     for item_data in data.items:
         item = db.query(Top10List).filter(Top10List.id == item_data.id).first()
@@ -342,6 +357,11 @@ async def reorder_top10(
     
     db.commit()
     
+    # 增量更新品味向量（只有排名改變的項目）
+    update_user_taste_vector(
+        db, current_user.user_id, diff_weights(weights_before, top10_weights(db, current_user.user_id))
+    )
+    
     # 回傳更新後的清單
     items = (
         db.query(Top10List)
@@ -396,6 +416,8 @@ async def update_top10_item(
             detail="Movie not found in Top 10 list",
         )
     
+    weights_before = top10_weights(db, current_user.user_id)
+    
     # 更新欄位
     if data.notes is not None:
         item.notes = data.notes
@@ -442,6 +464,11 @@ async def update_top10_item(
     db.commit()
     db.refresh(item)
     
+    # 增量更新品味向量（評分或排名改變的項目）
+    update_user_taste_vector(
+        db, current_user.user_id, diff_weights(weights_before, top10_weights(db, current_user.user_id))
+    )
+    
     movie = db.query(Movie).filter(Movie.tmdb_id == tmdb_id).first()
     
     return Top10Item(
@@ -17,6 +17,7 @@ from app.schemas.watchlist import (
 )
 from app.schemas.movie_result import FrontendMovie
 from app.core.security import get_current_user
+from app.services.user_taste import update_user_taste_vector, watchlist_weight
 
 router = APIRouter(prefix="/api/watchlist", tags=["watchlist"])
 
@@ -120,6 +121,9 @@ async def add_to_watchlist(
     db.commit()
     db.refresh(watchlist_item)
     
+    # 增量更新品味向量（只加上這部電影）
+    update_user_taste_vector(db, current_user.user_id, {tmdb_id: watchlist_weight()})
+    
     return WatchlistItem(
         id=watchlist_item.id,
         user_id=watchlist_item.user_id,
@@ -157,6 +161,9 @@ async def remove_from_watchlist(
     db.delete(item)
     db.commit()
     
+    # 增量更新品味向量（只減去這部電影）
+    update_user_taste_vector(db, current_user.user_id, {tmdb_id: -watchlist_weight()})
+    
     return None
 
 
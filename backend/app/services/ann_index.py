@@ -0,0 +1,154 @@
+# app/services/ann_index.py
+"""
+IVF（Inverted File）近似最近鄰索引
+
+精確搜索每次查詢都要掃過全部 N 列（O(N·d)）。IVF 先以 k-means 將 Base 矩陣分成
+nlist 個群，查詢時只掃描與 query 最接近的 nprobe 個群：
+
+1. 訓練：對（取樣後的）正規化向量做 spherical k-means，得到 nlist 個中心
+2. 分派：每列分到 cosine 最高的中心，依群組織成 CSR（list_offsets + list_rows）
+3. 查詢：centroids @ query 選出 nprobe 個群 → 只對這些群的列計算相似度
+
+召回率 / 延遲由 nprobe 調整（PHASE36_CONFIG["embedding_search"]），
+tools/benchmark_vector_search.py 可產生 exact vs IVF 的召回率報告。
+
+索引只涵蓋 Base 矩陣；Delta 列數量少，由 vector_index.py 精確掃描。
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+# 分派 / 訓練時每次處理的列數（限制 chunk × nlist 分數矩陣的記憶體）
+_ASSIGN_CHUNK_ROWS = 8192
+
+
+def default_nlist(n_rows: int) -> int:
+    """群數經驗值：約 4·√N（至少 1）"""
+    return max(1, int(round(4 * math.sqrt(n_rows))))
+
+
+class IVFIndex:
+    """
+    建立在（已正規化）Base 矩陣上的 IVF 索引
+
+    Attributes:
+        centroids: (nlist × dim) 已正規化的群中心
+        list_offsets: (nlist + 1) CSR 偏移
+        list_rows: (N) 依群排列的 Base 列號（群內遞增，掃描時較接近順序存取）
+    """
+    __slots__ = ("centroids", "list_offsets", "list_rows")
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        nlist: Optional[int] = None,
+        n_iter: int = 10,
+        sample_size: int = 100_000,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        訓練群中心並分派所有列
+
+        Args:
+            matrix: 已正規化的 Base 矩陣（可為唯讀 mmap）
+            nlist: 群數（None → default_nlist）
+            n_iter: k-means 迭代次數
+            sample_size: 訓練取樣列數（分派仍涵蓋全部列）
+            seed: 亂數種子（相同資料 → 相同索引）
+        """
+        n_rows = int(matrix.shape[0])
+        nlist = min(nlist or default_nlist(n_rows), max(n_rows, 1))
+        centroids = train_centroids(matrix, nlist, n_iter=n_iter, sample_size=sample_size, seed=seed)
+        nlist = int(centroids.shape[0])
+
+        assignments = assign_to_centroids(matrix, centroids)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_rows)
+
+    def candidate_rows(self, query: np.ndarray, nprobe: int, min_rows: int = 0) -> np.ndarray:
+        """
+        與 query 最接近的 nprobe 個群中的所有 Base 列號
+
+        若這些群的列數少於 min_rows（例如 top_k 大於候選數），繼續往下探測更多群。
+        """
+        nlist = self.nlist
+        if nlist == 0:
+            return np.empty(0, dtype=np.int64)
+
+        order = np.argsort(-(self.centroids @ query), kind="stable")
+        sizes = np.diff(self.list_offsets)[order]
+        probes = min(max(nprobe, 1), nlist)
+        if min_rows > 0:
+            covered = np.cumsum(sizes)
+            probes = max(probes, min(int(np.searchsorted(covered, min_rows)) + 1, nlist))
+
+        offsets = self.list_offsets
+        return np.concatenate([
+            self.list_rows[offsets[c]:offsets[c + 1]] for c in order[:probes]
+        ])
+
+
+def train_centroids(
+    matrix: np.ndarray,
+    nlist: int,
+    n_iter: int = 10,
+    sample_size: int = 100_000,
+    seed: int = 0
+) -> np.ndarray:
+    """Spherical k-means（cosine）：返回 (nlist × dim) 已正規化的中心（nlist 不超過樣本數）"""
+    rng = np.random.default_rng(seed)
+    n_rows = int(matrix.shape[0])
+    if n_rows > sample_size:
+        sample_rows = np.sort(rng.choice(n_rows, sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+    else:
+        sample = np.asarray(matrix, dtype=np.float32)
+
+    nlist = min(nlist, int(sample.shape[0]))
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        order = np.argsort(assignments, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+
+        # 空群：重新以隨機樣本列作為中心
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = sample[rng.choice(sample.shape[0], empty.size, replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return np.ascontiguousarray(centroids)
+
+
+def assign_to_centroids(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """每列 cosine 最高的中心編號（分段計算，避免 N × nlist 分數矩陣一次佔滿記憶體）"""
+    n_rows = int(matrix.shape[0])
+    assignments = np.empty(n_rows, dtype=np.int64)
+    centroids_t = np.ascontiguousarray(centroids.T)
+    for start in range(0, n_rows, _ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(matrix[start:start + _ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + chunk.shape[0]] = np.argmax(chunk @ centroids_t, axis=1)
+    return assignments
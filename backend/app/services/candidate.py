@@ -0,0 +1,106 @@
+# app/services/candidate.py
+"""
+推薦候選記錄（Phase 3.6 管線中流動的電影）
+
+每個請求約 300 個候選，依序累積 embedding_score → match_ratio / match_count /
+total_features → quadrant → final_score。以 __slots__ 固定欄位取代 dict：
+每個候選少了 hash table，並發請求下配置量與 GC 壓力都較小。
+
+Candidate 同時實作 MutableMapping（m["x"] / m.get / in / update / copy），
+classify_to_3quadrant 等既有函式與 tools 中以 dict 呼叫的寫法不需修改；
+只有最終結果在 _format_recommendations 轉為前端格式的 dict。
+未設定的欄位視為不存在（m.get("quadrant") 返回預設值），
+不在 FIELDS 中的 key 存放於 _extra（只有實際用到時才建立）。
+"""
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional
+
+# 搜索 / 過濾 / 評分欄位 + 最終結果補上的詳細欄位（embedding_service.MOVIE_DETAIL_COLUMNS）
+FIELDS = (
+    "id", "embedding_score",
+    "title", "release_date", "vote_average", "genres", "keywords", "mood_tags",
+    "match_ratio", "match_count", "total_features", "quadrant", "final_score",
+    "embedding_text", "original_title", "overview", "popularity", "vote_count", "poster_path",
+)
+_FIELD_SET = frozenset(FIELDS)
+_MISSING = object()
+
+
+class Candidate(MutableMapping):
+    """一部候選電影（可當 dict 使用的 __slots__ 記錄）"""
+    __slots__ = FIELDS + ("_extra",)
+
+    def __init__(self, id: int, embedding_score: float, fields: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.embedding_score = embedding_score
+        self._extra = None
+        if fields:
+            self.update(fields)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for field in FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def copy(self) -> "Candidate":
+        """淺複製（與 dict.copy() 相同：列表欄位共用）"""
+        clone = Candidate.__new__(Candidate)
+        for field in FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                setattr(clone, field, value)
+        clone._extra = dict(self._extra) if self._extra else None
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"Candidate({self.to_dict()!r})"
+
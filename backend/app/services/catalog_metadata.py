@@ -0,0 +1,423 @@
+# app/services/catalog_metadata.py
+"""
+電影目錄的欄式 Metadata（Hard Filter 下推用）
+
+tiered_feature_filtering 的 Hard Filters（genres / exclude_genres / year_range(s) / min_rating / exclude_ids）
+原本在「全庫計分 → 取 300 → 組成 dict」之後才套用。這裡將過濾所需的欄位存成與向量索引並列的陣列：
+
+    ids          int64    已排序的 tmdb_id
+    genre_bits   uint64   類型 bitmask（每個類型名稱一個 bit，最多 64 種）
+    years        int16    上映年份（YEAR_UNKNOWN 表示無日期）
+    ratings      float32  vote_average（NULL 視為 0.0，與 dict 路徑一致）
+    keywords     TagSets  keywords 的 id 集合（CSR，先轉小寫、去重）
+    moods        TagSets  mood_tags 的 id 集合（CSR，先轉小寫、去重）
+
+build_mask() 將 Hard Filters 轉成布林遮罩，vector_index.search() 在矩陣乘法之前套用，
+選擇性高的條件（例如「90 年代 + 恐怖」）只需掃描符合的列，被排除的電影也不會組成 dict。
+
+遮罩的語意與 tiered_feature_filtering 完全一致（該函式仍保留相同的過濾，作為保險）；
+無法以 bitmask 表示的條件（超過 64 種類型）不下推，交由原本的 dict 過濾處理。
+
+count_feature_matches() 以同一份 Metadata 一次計算所有候選的 Feature 符合數
+（calculate_match_ratio 的向量化版本），每次請求不需再逐部電影轉小寫、線性搜尋。
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+YEAR_UNKNOWN = np.iinfo(np.int16).min
+MAX_GENRE_BITS = 64
+
+
+def _parse_genres(genres) -> List[str]:
+    """movies.genres（JSONB list 或 JSON 字串）→ 類型名稱列表（只取字串，與 `g in m["genres"]` 相同語意）"""
+    if not genres:
+        return []
+    if isinstance(genres, str):
+        try:
+            genres = json.loads(genres)
+        except ValueError:
+            return []
+    if not isinstance(genres, list):
+        return []
+    return [g for g in genres if isinstance(g, str)]
+
+
+def _parse_tags(tags) -> List[str]:
+    """movies.keywords / mood_tags → 小寫標籤（與 calculate_match_ratio 相同：只接受 list）"""
+    if not isinstance(tags, list):
+        return []
+    return [t.lower() for t in tags if isinstance(t, str)]
+
+
+def _parse_year(release_date) -> int:
+    """與 _check_year_in_range 相同的年份解析；無法解析時返回 YEAR_UNKNOWN"""
+    if not release_date:
+        return YEAR_UNKNOWN
+    if hasattr(release_date, 'year'):
+        return int(release_date.year)
+    if isinstance(release_date, str) and len(release_date) >= 4:
+        try:
+            return int(release_date[:4])
+        except ValueError:
+            return YEAR_UNKNOWN
+    return YEAR_UNKNOWN
+
+
+class TagSets:
+    """
+    每部電影的標籤 id 集合（CSR：第 i 列的 id 為 indices[indptr[i]:indptr[i + 1]]）
+
+    不可變；列的順序與 CatalogMetadata.ids 相同。
+    """
+    __slots__ = ("indptr", "indices")
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def empty(cls) -> "TagSets":
+        return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def from_lists(cls, id_lists: Sequence[Sequence[int]]) -> "TagSets":
+        lengths = np.fromiter((len(ids) for ids in id_lists), dtype=np.int64, count=len(id_lists))
+        indptr = np.zeros(len(id_lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.fromiter(
+            (i for ids in id_lists for i in ids), dtype=np.int32, count=int(indptr[-1])
+        )
+        return cls(indptr, indices)
+
+    def _gather(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """rows 各列的 (長度, 串接後的 id)"""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        # 每個輸出位置 = 所屬列的起點 + 列內偏移
+        offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return lengths, self.indices[np.repeat(starts, lengths) + offsets]
+
+    def take(self, rows: np.ndarray) -> "TagSets":
+        """依 rows 重新排列 / 挑選列，返回新的 TagSets"""
+        lengths, indices = self._gather(rows)
+        indptr = np.zeros(rows.shape[0] + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return TagSets(indptr, indices)
+
+    def concat(self, other: "TagSets") -> "TagSets":
+        return TagSets(
+            np.concatenate([self.indptr, other.indptr[1:] + self.indptr[-1]]),
+            np.concatenate([self.indices, other.indices]),
+        )
+
+    def count_matches(self, rows: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """rows 各列的 Σ weights[id]（weights[id] = 要求中此標籤出現的次數）"""
+        lengths, indices = self._gather(rows)
+        owners = np.repeat(np.arange(rows.shape[0]), lengths)
+        return np.bincount(owners, weights=weights[indices], minlength=rows.shape[0])
+
+
+def _tag_ids(tags: List[str], id_of: Dict[str, int]) -> List[int]:
+    """小寫標籤 → 去重後的 id（新標籤分配新 id）"""
+    ids = set()
+    for tag in tags:
+        tag_id = id_of.get(tag)
+        if tag_id is None:
+            tag_id = id_of[tag] = len(id_of)
+        ids.add(tag_id)
+    return sorted(ids)
+
+
+def _tag_weights(wanted: Sequence[str], id_of: Dict[str, int]) -> Optional[np.ndarray]:
+    """要求的標籤 → 每個 id 的出現次數（不分大小寫）；沒有任何已知標籤時返回 None"""
+    weights = None
+    for tag in wanted:
+        tag_id = id_of.get(tag.lower())
+        if tag_id is None:
+            continue
+        if weights is None:
+            weights = np.zeros(len(id_of), dtype=np.float64)
+        weights[tag_id] += 1.0
+    return weights
+
+
+class CatalogMetadata:
+    """
+    不可變的欄式 Metadata（更新時建立新物件並整體替換，與 _IndexState 相同的讀取模式）
+
+    Attributes:
+        genre_bit_of: 類型名稱 → bit 位置
+        keyword_id_of / mood_id_of: 小寫標籤 → id（只增不減）
+        watermark: 涵蓋到的 movies.updated_at 最大值
+    """
+    __slots__ = (
+        "ids", "genre_bits", "years", "ratings", "genre_bit_of", "watermark",
+        "keywords", "keyword_id_of", "moods", "mood_id_of",
+    )
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        genre_bits: np.ndarray,
+        years: np.ndarray,
+        ratings: np.ndarray,
+        genre_bit_of: Dict[str, int],
+        watermark: Optional[datetime] = None,
+        keywords: Optional[TagSets] = None,
+        keyword_id_of: Optional[Dict[str, int]] = None,
+        moods: Optional[TagSets] = None,
+        mood_id_of: Optional[Dict[str, int]] = None
+    ):
+        self.ids = ids
+        self.genre_bits = genre_bits
+        self.years = years
+        self.ratings = ratings
+        self.genre_bit_of = genre_bit_of
+        self.watermark = watermark
+        self.keywords = keywords if keywords is not None else TagSets.from_lists([[]] * ids.shape[0])
+        self.keyword_id_of = keyword_id_of if keyword_id_of is not None else {}
+        self.moods = moods if moods is not None else TagSets.from_lists([[]] * ids.shape[0])
+        self.mood_id_of = mood_id_of if mood_id_of is not None else {}
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    @classmethod
+    def empty(cls) -> "CatalogMetadata":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.uint64),
+            np.empty(0, dtype=np.int16),
+            np.empty(0, dtype=np.float32),
+            {},
+        )
+
+    def with_rows(
+        self,
+        rows: Iterable[Tuple[int, object, object, object, object, object, Optional[datetime]]]
+    ) -> "CatalogMetadata":
+        """
+        套用 (tmdb_id, genres, release_date, vote_average, keywords, mood_tags, updated_at) 列，
+        返回新的 CatalogMetadata
+
+        已存在的 tmdb_id 覆寫，新的 tmdb_id 加入；新出現的類型名稱分配新 bit（最多 64 個），
+        新出現的 keyword / mood 分配新 id。
+        """
+        genre_bit_of = dict(self.genre_bit_of)
+        keyword_id_of = dict(self.keyword_id_of)
+        mood_id_of = dict(self.mood_id_of)
+        watermark = self.watermark
+        updates: Dict[int, Tuple[int, int, float, List[int], List[int]]] = {}
+
+        for tmdb_id, genres, release_date, vote_average, keywords, mood_tags, updated_at in rows:
+            bits = 0
+            for genre in _parse_genres(genres):
+                bit = genre_bit_of.get(genre)
+                if bit is None and len(genre_bit_of) < MAX_GENRE_BITS:
+                    bit = genre_bit_of[genre] = len(genre_bit_of)
+                if bit is not None:
+                    bits |= 1 << bit
+            updates[int(tmdb_id)] = (
+                bits,
+                _parse_year(release_date),
+                float(vote_average) if vote_average else 0.0,
+                _tag_ids(_parse_tags(keywords), keyword_id_of),
+                _tag_ids(_parse_tags(mood_tags), mood_id_of),
+            )
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+
+        if not updates:
+            return CatalogMetadata(
+                self.ids, self.genre_bits, self.years, self.ratings, genre_bit_of, watermark,
+                self.keywords, keyword_id_of, self.moods, mood_id_of,
+            )
+
+        update_ids = np.fromiter(updates.keys(), dtype=np.int64, count=len(updates))
+        update_values = list(updates.values())
+        update_bits = np.array([v[0] for v in update_values], dtype=np.uint64)
+        update_years = np.array([v[1] for v in update_values], dtype=np.int16)
+        update_ratings = np.array([v[2] for v in update_values], dtype=np.float32)
+        update_keywords = TagSets.from_lists([v[3] for v in update_values])
+        update_moods = TagSets.from_lists([v[4] for v in update_values])
+
+        # 保留未更新的舊列，再與更新列合併、依 tmdb_id 排序
+        keep = ~np.isin(self.ids, update_ids)
+        keep_rows = np.flatnonzero(keep)
+        ids = np.concatenate([self.ids[keep], update_ids])
+        order = np.argsort(ids, kind="stable")
+        return CatalogMetadata(
+            ids[order],
+            np.concatenate([self.genre_bits[keep], update_bits])[order],
+            np.concatenate([self.years[keep], update_years])[order],
+            np.concatenate([self.ratings[keep], update_ratings])[order],
+            genre_bit_of,
+            watermark,
+            self.keywords.take(keep_rows).concat(update_keywords).take(order),
+            keyword_id_of,
+            self.moods.take(keep_rows).concat(update_moods).take(order),
+            mood_id_of,
+        )
+
+    def rows_for(self, tmdb_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        tmdb_id 陣列 → (metadata 列號, 是否存在)
+
+        不存在的 tmdb_id 列號為 0，呼叫端須以「是否存在」遮罩。
+        """
+        if self.ids.shape[0] == 0:
+            return np.zeros(tmdb_ids.shape[0], dtype=np.int64), np.zeros(tmdb_ids.shape[0], dtype=bool)
+        rows = np.searchsorted(self.ids, tmdb_ids)
+        rows = np.minimum(rows, self.ids.shape[0] - 1)
+        return rows, self.ids[rows] == tmdb_ids
+
+    def build_mask(
+        self,
+        genres: Optional[Sequence[str]] = None,
+        exclude_genres: Optional[Sequence[str]] = None,
+        year_range: Optional[Sequence[int]] = None,
+        year_ranges: Optional[Sequence[Sequence[int]]] = None,
+        min_rating: Optional[float] = None,
+        exclude_ids: Optional[Sequence[int]] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Hard Filters → metadata 列上的布林遮罩（沒有可下推的條件時返回 None）
+
+        語意與 tiered_feature_filtering 的 Hard Filters 相同：
+        - genres：繁體先轉簡體，符合任一即可
+        - exclude_genres：原字串比對，含任一即排除
+        - year_range / year_ranges：閉區間，無日期的電影不符合
+        - min_rating：vote_average >= min_rating
+        - exclude_ids：排除指定的 tmdb_id（個人化模式排除已收藏的電影）
+        """
+        mask = None
+
+        def combine(condition: np.ndarray) -> None:
+            nonlocal mask
+            mask = condition if mask is None else (mask & condition)
+
+        if genres:
+            from app.services.mapping_tables import GENRE_TRADITIONAL_TO_SIMPLIFIED
+
+            wanted = [GENRE_TRADITIONAL_TO_SIMPLIFIED.get(g, g) for g in genres]
+            # 有任一類型無法以 bit 表示（超過 64 種）→ 不下推，交由 dict 過濾
+            if all(g in self.genre_bit_of or len(self.genre_bit_of) < MAX_GENRE_BITS for g in wanted):
+                bits = self._genre_mask(wanted)
+                combine((self.genre_bits & np.uint64(bits)) != 0)
+
+        if exclude_genres:
+            if all(g in self.genre_bit_of or len(self.genre_bit_of) < MAX_GENRE_BITS for g in exclude_genres):
+                bits = self._genre_mask(exclude_genres)
+                combine((self.genre_bits & np.uint64(bits)) == 0)
+
+        known_year = self.years != YEAR_UNKNOWN
+        if year_range:
+            min_year, max_year = year_range
+            combine(known_year & (self.years >= min_year) & (self.years <= max_year))
+
+        if year_ranges:
+            in_any = np.zeros(self.ids.shape[0], dtype=bool)
+            for min_year, max_year in year_ranges:
+                in_any |= (self.years >= min_year) & (self.years <= max_year)
+            combine(known_year & in_any)
+
+        if min_rating is not None:
+            # 在 float32 空間比較：7.1 存成 float32 後略小於 7.1，直接與 float64 比較會誤排除
+            combine(self.ratings >= np.float32(min_rating))
+
+        if exclude_ids:
+            rows, found = self.rows_for(np.asarray(list(exclude_ids), dtype=np.int64))
+            keep = np.ones(self.ids.shape[0], dtype=bool)
+            keep[rows[found]] = False
+            combine(keep)
+
+        return mask
+
+    def count_feature_matches(
+        self,
+        rows: np.ndarray,
+        keywords: Optional[Sequence[str]] = None,
+        mood_tags: Optional[Sequence[str]] = None,
+        genres: Optional[Sequence[str]] = None
+    ) -> Optional[np.ndarray]:
+        """
+        rows（metadata 列號）各列符合的要求數，語意與 calculate_match_ratio 相同：
+        - keywords / mood_tags：不分大小寫；要求中重複的標籤各算一次
+        - genres：原字串比對（呼叫端先轉成 DB 中的類型名稱）
+
+        有類型無法以 bit 表示（超過 64 種）時返回 None，交由 dict 路徑計算。
+        """
+        if genres and any(
+            g not in self.genre_bit_of and len(self.genre_bit_of) >= MAX_GENRE_BITS for g in genres
+        ):
+            return None
+
+        matched = np.zeros(rows.shape[0], dtype=np.float64)
+        for wanted, tag_sets, id_of in (
+            (keywords, self.keywords, self.keyword_id_of),
+            (mood_tags, self.moods, self.mood_id_of),
+        ):
+            weights = _tag_weights(wanted or [], id_of)
+            if weights is not None:
+                matched += tag_sets.count_matches(rows, weights)
+
+        if genres:
+            bits = self.genre_bits[rows]
+            for genre in genres:
+                bit = self.genre_bit_of.get(genre)
+                if bit is not None:
+                    matched += (bits & np.uint64(1 << bit)) != 0
+        return matched
+
+    def _genre_mask(self, genres: Sequence[str]) -> int:
+        """類型名稱 → bitmask（目錄中不存在的類型沒有 bit，不會符合任何電影）"""
+        bits = 0
+        for genre in genres:
+            bit = self.genre_bit_of.get(genre)
+            if bit is not None:
+                bits |= 1 << bit
+        return bits
+
+
+# ============================================================================
+# DB 載入 / 增量更新
+# ============================================================================
+
+_METADATA_COLUMNS = "m.tmdb_id, m.genres, m.release_date, m.vote_average, m.keywords, m.mood_tags, m.updated_at"
+
+
+def load_catalog_metadata(db_session: Session) -> CatalogMetadata:
+    """從 movies 表載入全部電影的過濾欄位"""
+    result = db_session.execute(text(f"SELECT {_METADATA_COLUMNS} FROM movies m"))
+    return CatalogMetadata.empty().with_rows(result)
+
+
+def refresh_catalog_metadata(
+    db_session: Session,
+    metadata: CatalogMetadata,
+    overlap_seconds: float = 30.0
+) -> Tuple[CatalogMetadata, int]:
+    """
+    套用 movies.updated_at > watermark 的變更
+
+    Returns:
+        (新的 CatalogMetadata, 更新列數)
+    """
+    if metadata.watermark is None:
+        fresh = load_catalog_metadata(db_session)
+        return fresh, len(fresh)
+
+    result = db_session.execute(
+        text(f"SELECT {_METADATA_COLUMNS} FROM movies m WHERE m.updated_at > :since"),
+        {"since": metadata.watermark - timedelta(seconds=overlap_seconds)}
+    )
+    rows = result.fetchall()
+    if not rows:
+        return metadata, 0
+    return metadata.with_rows(rows), len(rows)
@@ -0,0 +1,77 @@
+# app/services/embedding_codec.py
+"""
+movie_vectors 的 embedding 二進位編碼
+
+movie_vectors.embedding（JSONB）每部電影約 20 KB 文字，讀取時還要逐列 json.loads。
+新欄位 movie_vectors.embedding_bin（bytea）存放 little-endian float32（或 float16）原始位元組：
+- float32：1536 維 = 6 KB，np.frombuffer 零拷貝解碼
+- float16：1536 維 = 3 KB，解碼時轉回 float32（需一次複製）
+embedding_dtype 欄位記錄每列的格式（'f4' / 'f2'）。
+
+讀取端一律「binary 優先，JSONB 後備」：
+SELECT 時用 STORED_EMBEDDING_COLUMNS，只在 embedding_bin 為 NULL 時才傳回 JSONB，
+尚未回填的舊資料仍可讀取。
+"""
+import json
+from typing import Optional
+
+import numpy as np
+
+# 支援的二進位格式（固定 little-endian，與機器位元組序無關）
+EMBEDDING_DTYPES = {
+    "f4": np.dtype("<f4"),
+    "f2": np.dtype("<f2"),
+}
+DEFAULT_EMBEDDING_DTYPE = "f4"
+
+# SELECT 片段（movie_vectors 別名為 mv）：embedding_bin, embedding_dtype, 後備 JSONB
+STORED_EMBEDDING_COLUMNS = (
+    "mv.embedding_bin, mv.embedding_dtype, "
+    "CASE WHEN mv.embedding_bin IS NULL THEN mv.embedding END AS embedding_json"
+)
+
+# WHERE 片段：此列有任一格式的 embedding
+HAS_STORED_EMBEDDING = "(mv.embedding_bin IS NOT NULL OR mv.embedding IS NOT NULL)"
+
+
+def get_storage_dtype() -> str:
+    """寫入時使用的二進位格式（PHASE36_CONFIG["embedding_storage"]["binary_dtype"]）"""
+    from app.services.phase36_config import PHASE36_CONFIG
+
+    dtype = PHASE36_CONFIG.get("embedding_storage", {}).get("binary_dtype", DEFAULT_EMBEDDING_DTYPE)
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    return dtype
+
+
+def encode_embedding(embedding, dtype: str = DEFAULT_EMBEDDING_DTYPE) -> bytes:
+    """將向量編碼成 embedding_bin 的位元組"""
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPES[dtype]).tobytes()
+
+
+def decode_embedding_bin(data, dtype: Optional[str] = None) -> np.ndarray:
+    """
+    解碼 embedding_bin
+
+    float32 直接以 np.frombuffer 建立唯讀 view（零拷貝）；float16 轉成 float32。
+    """
+    vector = np.frombuffer(data, dtype=EMBEDDING_DTYPES[dtype or DEFAULT_EMBEDDING_DTYPE])
+    if vector.dtype != np.float32:
+        vector = vector.astype(np.float32)
+    return vector
+
+
+def decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json):
+    """
+    解碼一列 STORED_EMBEDDING_COLUMNS 的結果（binary 優先，JSONB 後備）
+
+    Returns:
+        np.ndarray（binary）、list（JSONB）或 None（沒有 embedding）
+    """
+    if embedding_bin is not None:
+        return decode_embedding_bin(embedding_bin, embedding_dtype)
+    if embedding_json is None:
+        return None
+    if isinstance(embedding_json, str):
+        return json.loads(embedding_json)
+    return embedding_json
@@ -0,0 +1,212 @@
+# app/services/embedding_providers.py
+"""
+Embedding Provider 介面與實作
+
+embedding_service.py 不再寫死 OpenAI client，而是透過 Provider 取得向量，
+讓推薦流程可以在離線、CI、壓力測試環境中執行。
+
+可用的 Provider（環境變數 EMBEDDING_PROVIDER 選擇，預設 openai）：
+- openai                 OpenAI text-embedding-3-small（1536 維，正式環境）
+- local                  Hashed n-gram 投影（1536 維，決定性、無網路、無額外依賴）
+- sentence-transformers  本地小模型（需安裝 sentence-transformers，
+                         模型由 LOCAL_EMBEDDING_MODEL 指定）
+
+注意：不同 Provider 產生的向量彼此不可比較。
+切換 Provider 後，電影向量需以同一 Provider 重新計算（tools/batch_populate_enhanced_embeddings.py），
+向量快照與查詢快取以 Provider 的 model 名稱區分版本，會自動失效。
+"""
+import asyncio
+import hashlib
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingProvider:
+    """
+    Embedding Provider 基底類別
+
+    Attributes:
+        name: Provider 名稱（對應 EMBEDDING_PROVIDER）
+        model: 模型識別字串（寫入 movie_vectors.embedding_version、快照與快取 key）
+        dim: 向量維度
+        max_batch_size: 單次請求最多可送出的文本數
+    """
+    name = "base"
+    model = ""
+    dim = 0
+    max_batch_size = 2048
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        計算一批（非空）文本的向量，返回順序與輸入一致
+
+        呼叫端負責切成 <= max_batch_size 的批次，並處理空文本。
+        """
+        raise NotImplementedError
+
+    async def embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        """embed_batch() 的非同步版本；預設在 thread 中執行同步實作"""
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    OpenAI Embeddings API
+
+    - 同步 client：tools 腳本與同步呼叫端使用（首次使用時建立，不需 API key 即可 import）
+    - 非同步 client：AsyncOpenAI，每個 event loop 一個，共用 httpx 連線池、
+      每次呼叫有逾時，並以 Semaphore 限制同時進行中的請求數
+    """
+    name = "openai"
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        self.model = model
+        self.dim = dim
+        self.max_batch_size = 2048  # OpenAI embeddings API 單次請求上限
+        self._client = None
+        self._async_state: Optional[Tuple[asyncio.AbstractEventLoop, object, asyncio.Semaphore]] = None
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def _get_async_client(self):
+        """取得目前 event loop 的 AsyncOpenAI client 與並行 Semaphore（首次呼叫時建立）"""
+        loop = asyncio.get_running_loop()
+        if self._async_state is not None and self._async_state[0] is loop:
+            return self._async_state[1], self._async_state[2]
+
+        import httpx
+        from openai import AsyncOpenAI
+        from app.services.phase36_config import PHASE36_CONFIG
+
+        cfg = PHASE36_CONFIG.get("embedding_client", {})
+        timeout = cfg.get("timeout_seconds", 10.0)
+
+        async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=timeout,
+            max_retries=cfg.get("max_retries", 2),
+            http_client=httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=cfg.get("max_connections", 32),
+                    max_keepalive_connections=cfg.get("max_keepalive_connections", 16),
+                ),
+            ),
+        )
+        semaphore = asyncio.Semaphore(cfg.get("max_concurrency", 16))
+        self._async_state = (loop, async_client, semaphore)
+        return async_client, semaphore
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self._get_client().embeddings.create(model=self.model, input=texts)
+        return _ordered_embeddings(response, len(texts))
+
+    async def embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        async_client, semaphore = self._get_async_client()
+        async with semaphore:
+            response = await async_client.embeddings.create(model=self.model, input=texts)
+        return _ordered_embeddings(response, len(texts))
+
+
+class LocalHashEmbeddingProvider(EmbeddingProvider):
+    """
+    決定性的本地 Provider：Hashed n-gram 投影
+
+    每段文本拆成「詞 unigram + 詞 bigram + 字元 trigram」，
+    每個特徵以 blake2b 雜湊到 dim 維中的一個位置並帶 ±1 符號（feature hashing），
+    最後 L2 正規化。相同文本永遠得到相同向量，字面相近的文本 cosine 較高。
+
+    適用：離線開發、CI、壓力測試（量測我們自己的 pipeline 成本，不含網路雜訊）。
+    不適用：正式推薦（沒有語義理解）。
+    """
+    name = "local"
+
+    _TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dim: int = 1536):
+        self.model = f"local-hash-ngram-v1-{dim}"
+        self.dim = dim
+        self.max_batch_size = 4096
+
+    def _features(self, text: str) -> List[str]:
+        lowered = text.lower()
+        words = self._TOKEN_RE.findall(lowered)
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        compact = " ".join(words)
+        features += [f"c:{compact[i:i + 3]}" for i in range(max(len(compact) - 2, 0))]
+        return features
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text).tolist() for text in texts]
+
+    async def embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        # 純 CPU 且很快：小批次直接算，避免 thread 切換成本
+        if len(texts) <= 32:
+            return self.embed_batch(texts)
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """本地 sentence-transformers 模型（選用依賴；未安裝時無法選用）"""
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name)
+        self.model = f"st-{model_name}"
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.max_batch_size = 256
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32).tolist()
+
+
+def _ordered_embeddings(response, count: int) -> List[List[float]]:
+    """依 response.data[k].index 還原輸入順序"""
+    results: List[Optional[List[float]]] = [None] * count
+    for item in response.data:
+        results[item.index] = item.embedding
+    return results
+
+
+def create_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    依名稱建立 Provider（未指定時讀取環境變數 EMBEDDING_PROVIDER，預設 openai）
+    """
+    name = (name or os.getenv("EMBEDDING_PROVIDER") or "openai").strip().lower()
+
+    if name == "openai":
+        return OpenAIEmbeddingProvider()
+    if name == "local":
+        return LocalHashEmbeddingProvider()
+    if name in ("sentence-transformers", "sentence_transformers"):
+        try:
+            return SentenceTransformerEmbeddingProvider(
+                os.getenv("LOCAL_EMBEDDING_MODEL") or "all-MiniLM-L6-v2"
+            )
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_PROVIDER=sentence-transformers requires the sentence-transformers package"
+            ) from e
+
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name}")
@@ -104,6 +104,11 @@ def generate_embedding_query(
     
     # 情境 2: 僅 Mood Labels
     if not has_nl and has_moods:
+        # 3 個以上標籤時模板不表達順序（「A and B and C」），先排序讓相同的組合
+        # 產生相同的查詢文本（預先計算模板與查詢快取才能命中）
+        if len(mood_labels) >= 3:
+            mood_labels = sorted(mood_labels)
+        
         # 分析 Mood 關係
         if mood_relationship is None:
             mood_relationship = analyze_mood_combination(mood_labels)
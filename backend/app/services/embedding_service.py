@@ -1,40 +1,219 @@
 # app/services/embedding_service.py
 """
 向量語義搜尋服務
-使用 OpenAI Embeddings 進行電影推薦的語義相似度計算
+透過可抽換的 Embedding Provider（預設 OpenAI，見 embedding_providers.py）
+進行電影推薦的語義相似度計算
 """
 import os
 import json
 import random
+import asyncio
 import numpy as np
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import Session
 
-# OpenAI 客戶端
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from app.services.embedding_providers import create_embedding_provider
+from app.services.embedding_codec import (
+    STORED_EMBEDDING_COLUMNS,
+    HAS_STORED_EMBEDDING,
+    decode_stored_embedding,
+    encode_embedding,
+    get_storage_dtype,
+)
+from app.services.phase36_config import PHASE36_CONFIG
+from app.services.candidate import Candidate
+from app.services.pipeline_trace import debug_enabled, recommend_logger as logger, span
+from app.services.vector_index import get_vector_index, get_loaded_vector_index
+from app.services.query_embedding_cache import query_embedding_cache, normalize_query_text
+from app.services.mood_template_embeddings import get_mood_template_embeddings
 
-# 使用 text-embedding-3-small（便宜且效果好）
-EMBEDDING_MODEL = "text-embedding-3-small"
-EMBEDDING_DIM = 1536
+# Embedding Provider（環境變數 EMBEDDING_PROVIDER 選擇：openai / local / sentence-transformers）
+provider = create_embedding_provider()
+
+# 模型名稱與維度由 Provider 決定（OpenAI：text-embedding-3-small，1536 維）
+EMBEDDING_MODEL = provider.model
+EMBEDDING_DIM = provider.dim
+
+# 單次請求最多送出的文本數（OpenAI 上限 2048）
+EMBEDDING_BATCH_SIZE = provider.max_batch_size
 
 
 def get_embedding(text: str) -> List[float]:
     """
     獲取文本的 embedding 向量
     
-    成本：~$0.00002 per 1K tokens
+    成本（OpenAI）：~$0.00002 per 1K tokens
     """
     if not text or not text.strip():
         # 空文本返回零向量
         return [0.0] * EMBEDDING_DIM
     
-    response = client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=text
-    )
-    return response.data[0].embedding
+    return provider.embed_batch([text])[0]
+
+
+def get_embeddings_batch(
+    texts: List[str],
+    batch_size: int = EMBEDDING_BATCH_SIZE
+) -> List[List[float]]:
+    """
+    批次獲取多段文本的 embedding
+    
+    - 每次請求最多送出 batch_size 筆（OpenAI 上限 2048）
+    - 返回順序與輸入一致：結果[i] 對應 texts[i]
+    - 空文本不送出，直接返回零向量（與 get_embedding 一致）
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    pending = []
+    for i, text_item in enumerate(texts):
+        if text_item and text_item.strip():
+            pending.append((i, text_item))
+        else:
+            results[i] = [0.0] * EMBEDDING_DIM
+    
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        embeddings = provider.embed_batch([text_item for _, text_item in chunk])
+        for (i, _), embedding in zip(chunk, embeddings):
+            results[i] = embedding
+    
+    return results
+
+
+def get_precompiled_query_embedding(normalized_text: str) -> Optional[List[float]]:
+    """查預先計算的 Mood-only 模板 Embedding（見 mood_template_embeddings.py；artifact 不存在時返回 None）"""
+    templates = get_mood_template_embeddings(EMBEDDING_MODEL, EMBEDDING_DIM)
+    if templates is None:
+        return None
+    return templates.get(normalized_text)
+
+
+def get_query_embedding(query_text: str) -> List[float]:
+    """
+    獲取「查詢文本」的 embedding（經過預先計算模板與兩層快取）
+    
+    查詢文本先正規化，再依序查預先計算的 Mood 模板、進程內 LRU、Postgres query_embeddings 表，
+    都未命中才呼叫 Provider。電影 overview 等一次性文本請直接用 get_embedding()。
+    """
+    normalized = normalize_query_text(query_text)
+    if not normalized:
+        return [0.0] * EMBEDDING_DIM
+    
+    precompiled = get_precompiled_query_embedding(normalized)
+    if precompiled is not None:
+        return precompiled
+    
+    cached = query_embedding_cache.get(normalized, EMBEDDING_MODEL)
+    if cached is not None:
+        return cached
+    
+    embedding = get_embedding(normalized)
+    query_embedding_cache.put(normalized, EMBEDDING_MODEL, embedding)
+    return embedding
+
+
+# ============================================================================
+# 非同步 Embedding（FastAPI event loop 使用）
+# ============================================================================
+# 
+# 同步呼叫會在網路請求期間阻塞整個 event loop，讓同一 worker 的其他請求停住。
+# 非同步路徑交給 provider.embed_batch_async()：
+# - OpenAI：AsyncOpenAI + 共用 httpx 連線池、逾時、Semaphore 限制並行數
+# - local：純 CPU 計算，不需網路
+# ============================================================================
+
+async def get_embeddings_batch_async(
+    texts: List[str],
+    batch_size: int = EMBEDDING_BATCH_SIZE
+) -> List[List[float]]:
+    """
+    get_embeddings_batch() 的非同步版本（不阻塞 event loop）
+    
+    多個批次並行送出（並行數由 Provider 限制）；返回順序與輸入一致。
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    pending = []
+    for i, text_item in enumerate(texts):
+        if text_item and text_item.strip():
+            pending.append((i, text_item))
+        else:
+            results[i] = [0.0] * EMBEDDING_DIM
+    
+    if not pending:
+        return results
+    
+    async def embed_chunk(chunk):
+        embeddings = await provider.embed_batch_async([text_item for _, text_item in chunk])
+        for (i, _), embedding in zip(chunk, embeddings):
+            results[i] = embedding
+    
+    await asyncio.gather(*[
+        embed_chunk(pending[start:start + batch_size])
+        for start in range(0, len(pending), batch_size)
+    ])
+    return results
+
+
+async def get_embedding_async(text: str) -> List[float]:
+    """get_embedding() 的非同步版本"""
+    return (await get_embeddings_batch_async([text]))[0]
+
+
+async def get_query_embedding_async(query_text: str) -> List[float]:
+    """
+    get_query_embedding() 的非同步版本
+    
+    預先計算模板與 L1 記憶體快取直接在 event loop 查；L2（Postgres）查詢與寫入放到 thread 執行。
+    """
+    normalized = normalize_query_text(query_text)
+    if not normalized:
+        return [0.0] * EMBEDDING_DIM
+    
+    precompiled = get_precompiled_query_embedding(normalized)
+    if precompiled is not None:
+        return precompiled
+    
+    cached = query_embedding_cache.memory_get(normalized, EMBEDDING_MODEL)
+    if cached is None and query_embedding_cache.use_db:
+        cached = await asyncio.to_thread(query_embedding_cache.db_get, normalized, EMBEDDING_MODEL)
+    if cached is not None:
+        return cached
+    
+    embedding = await get_embedding_async(normalized)
+    await asyncio.to_thread(query_embedding_cache.put, normalized, EMBEDDING_MODEL, embedding)
+    return embedding
+
+
+async def get_query_embeddings_batch_async(query_texts: List[str]) -> List[List[float]]:
+    """
+    多個查詢文本的 embedding（經過預先計算模板與兩層快取）
+    
+    重複的查詢只計算一次；快取未命中的查詢合併成一次 Provider 批次呼叫。
+    返回順序與輸入一致。
+    """
+    normalized_texts = [normalize_query_text(q) for q in query_texts]
+    embeddings: Dict[str, List[float]] = {"": [0.0] * EMBEDDING_DIM}
+    misses = []
+    
+    for normalized in dict.fromkeys(normalized_texts):
+        if not normalized:
+            continue
+        cached = get_precompiled_query_embedding(normalized)
+        if cached is None:
+            cached = query_embedding_cache.memory_get(normalized, EMBEDDING_MODEL)
+        if cached is None and query_embedding_cache.use_db:
+            cached = await asyncio.to_thread(query_embedding_cache.db_get, normalized, EMBEDDING_MODEL)
+        if cached is not None:
+            embeddings[normalized] = cached
+        else:
+            misses.append(normalized)
+    
+    if misses:
+        for normalized, embedding in zip(misses, await get_embeddings_batch_async(misses)):
+            embeddings[normalized] = embedding
+            await asyncio.to_thread(query_embedding_cache.put, normalized, EMBEDDING_MODEL, embedding)
+    
+    return [embeddings[normalized] for normalized in normalized_texts]
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -60,36 +239,101 @@ def store_movie_embedding(
     db_session: Session,
     tmdb_id: int,
     overview: str
-) -> None:
+) -> List[float]:
     """
     計算並儲存電影的 embedding
+    
+    返回計算出的 embedding，呼叫端不需再呼叫一次 API
+    """
+    embedding = get_embedding(overview)
+    store_movie_embeddings_batch(db_session, [(tmdb_id, overview, embedding)])
+    return embedding
+
+
+def store_movie_embeddings_batch(
+    db_session: Session,
+    items: List[Tuple[int, str, List[float]]]
+) -> None:
+    """
+    批次 UPSERT 電影 embeddings（單一 executemany + 單次 commit）
+    
+    Args:
+        items: [(tmdb_id, embedding_text, embedding)]
     """
+    if not items:
+        return
+    
+    storage_config = PHASE36_CONFIG.get("embedding_storage", {})
+    binary_dtype = get_storage_dtype()
+    write_json = storage_config.get("write_json", True)
+    
     try:
-        embedding = get_embedding(overview)
-        embedding_json = json.dumps(embedding)
-        
         # 使用 UPSERT (PostgreSQL) - Phase 1 修復：使用正確的 schema
+        # embedding_bin 為主要格式；JSONB 視設定同步寫入（關閉時清為 NULL，避免讀到舊值）
         query = text("""
-            INSERT INTO movie_vectors (tmdb_id, embedding, embedding_text, embedding_version, updated_at)
-            VALUES (:tmdb_id, :embedding, :embedding_text, :embedding_version, now())
-            ON CONFLICT (tmdb_id) 
-            DO UPDATE SET 
+            INSERT INTO movie_vectors (
+                tmdb_id, embedding, embedding_bin, embedding_dtype,
+                embedding_text, embedding_version, updated_at
+            )
+            VALUES (
+                :tmdb_id, :embedding, :embedding_bin, :embedding_dtype,
+                :embedding_text, :embedding_version, now()
+            )
+            ON CONFLICT (tmdb_id)
+            DO UPDATE SET
                 embedding = EXCLUDED.embedding,
+                embedding_bin = EXCLUDED.embedding_bin,
+                embedding_dtype = EXCLUDED.embedding_dtype,
                 embedding_text = EXCLUDED.embedding_text,
                 embedding_version = EXCLUDED.embedding_version,
                 updated_at = now()
         """)
         
-        db_session.execute(query, {
-            "tmdb_id": tmdb_id,
-            "embedding": embedding_json,
-            "embedding_text": overview,
-            "embedding_version": "text-embedding-3-small"
-        })
+        db_session.execute(query, [
+            {
+                "tmdb_id": tmdb_id,
+                "embedding": json.dumps(list(map(float, embedding))) if write_json else None,
+                "embedding_bin": encode_embedding(embedding, binary_dtype),
+                "embedding_dtype": binary_dtype,
+                "embedding_text": embedding_text,
+                "embedding_version": EMBEDDING_MODEL
+            }
+            for tmdb_id, embedding_text, embedding in items
+        ])
         db_session.commit()
     except Exception as e:
         db_session.rollback()
         raise e
+    
+    # 同步更新已載入的向量索引，讓新電影立即可被搜索
+    index = get_loaded_vector_index()
+    if index is not None:
+        index.apply_changes(upserts=[(tmdb_id, embedding) for tmdb_id, _, embedding in items])
+
+
+def embed_and_store_movies(
+    db_session: Session,
+    items: List[Tuple[int, str]]
+) -> Dict[int, List[float]]:
+    """
+    批次計算並儲存多部電影的 embedding
+    
+    Args:
+        items: [(tmdb_id, embedding_text)]
+    
+    Returns:
+        {tmdb_id: embedding}
+    """
+    items = [(tmdb_id, embedding_text) for tmdb_id, embedding_text in items if embedding_text]
+    if not items:
+        return {}
+    
+    embeddings = get_embeddings_batch([embedding_text for _, embedding_text in items])
+    store_movie_embeddings_batch(db_session, [
+        (tmdb_id, embedding_text, embedding)
+        for (tmdb_id, embedding_text), embedding in zip(items, embeddings)
+    ])
+    return {tmdb_id: embedding for (tmdb_id, _), embedding in zip(items, embeddings)}
 
 
 async def get_stored_embeddings(
@@ -99,30 +343,30 @@ async def get_stored_embeddings(
     """
     批次取得已儲存的 embeddings
     
-    返回：{tmdb_id: embedding_vector}
+    優先讀取 embedding_bin（np.frombuffer 零拷貝解碼），尚未回填的列才讀 JSONB。
+    
+    返回：{tmdb_id: embedding_vector}（np.ndarray 或 list）
     """
     if not tmdb_ids:
         return {}
     
-    query = text("""
-        SELECT tmdb_id, embedding
-        FROM movie_vectors
-        WHERE tmdb_id = ANY(:ids)
+    query = text(f"""
+        SELECT mv.tmdb_id, {STORED_EMBEDDING_COLUMNS}
+        FROM movie_vectors mv
+        WHERE mv.tmdb_id = ANY(:ids)
+          AND {HAS_STORED_EMBEDDING}
     """)
     
-    result = db_session.execute(query, {"ids": tmdb_ids})
-    
-    embeddings = {}
-    for row in result:
-        tmdb_id = row[0]
-        embedding_data = row[1]
-        # 修復：JSONB 類型已經是 list，不需要 json.loads()
-        if isinstance(embedding_data, str):
-            embeddings[tmdb_id] = json.loads(embedding_data)
-        else:
-            embeddings[tmdb_id] = embedding_data  # 已經是 list
+    def load() -> Dict[int, List[float]]:
+        embeddings = {}
+        for tmdb_id, embedding_bin, embedding_dtype, embedding_json in db_session.execute(query, {"ids": tmdb_ids}):
+            embedding = decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json)
+            if embedding is not None:
+                embeddings[tmdb_id] = embedding
+        return embeddings
     
-    return embeddings
+    # 同步 DB 查詢 + 解碼在 thread 中執行，不阻塞 event loop
+    return await asyncio.to_thread(load)
 
 
 def calculate_diversity_score(
@@ -198,6 +442,113 @@ def calculate_diversity_score(
     return diversity_scores
 
 
+def _release_year(release_date) -> Optional[int]:
+    """與 calculate_diversity_score 相同的年份解析（datetime.date 或 'YYYY-...' 字串）"""
+    if not release_date:
+        return None
+    if hasattr(release_date, 'year'):
+        year = str(release_date.year)
+    elif isinstance(release_date, str) and len(release_date) >= 4:
+        year = release_date[:4]
+    else:
+        return None
+    try:
+        return int(year)
+    except ValueError:
+        return None
+
+
+def select_diverse_movies(
+    movies: List[Dict[str, Any]],
+    top_k: int,
+    diversity_weight: float
+) -> List[Dict[str, Any]]:
+    """
+    增量式 MMR（Maximal Marginal Relevance）選片
+    
+    結果與「每輪對剩餘電影呼叫 calculate_diversity_score 再整體排序」完全相同，
+    但特徵只解析一次、每輪只對「新選入的電影」計算懲罰：
+    - 類型：布林矩陣 (n × 類型數)，交集 = 矩陣-向量乘法
+    - 年份：int 陣列 + 是否有效的遮罩
+    - 每部候選的懲罰以累加和保存，多樣性 = max(0.2, 1 - 累加和 / 已選數)
+    
+    同分時的順序也與原本一致：每輪都對「目前的剩餘順序」做穩定排序。
+    
+    參數：
+        movies: 已設定 similarity_score 的候選電影
+        top_k: 選出數量
+        diversity_weight: 多樣性權重（0.0 = 純相似度，1.0 = 純多樣性）
+    
+    返回：
+        選出的電影（依選入順序），並設定 final_score
+    """
+    n = len(movies)
+    if n == 0 or top_k <= 0:
+        return []
+    
+    # 特徵只計算一次
+    genre_vocab: Dict[Any, int] = {}
+    genre_rows = []
+    for movie in movies:
+        genre_rows.append([
+            genre_vocab.setdefault(genre_id, len(genre_vocab))
+            for genre_id in set(movie.get("genre_ids") or [])
+        ])
+    genre_matrix = np.zeros((n, max(len(genre_vocab), 1)), dtype=np.int32)
+    for row, columns in enumerate(genre_rows):
+        genre_matrix[row, columns] = 1
+    genre_counts = genre_matrix.sum(axis=1)
+    
+    years = np.zeros(n, dtype=np.int64)
+    year_known = np.zeros(n, dtype=bool)
+    for row, movie in enumerate(movies):
+        year = _release_year(movie.get("release_date"))
+        if year is not None:
+            years[row] = year
+            year_known[row] = True
+    
+    similarity = np.array([movie["similarity_score"] for movie in movies], dtype=np.float64)
+    penalty_sum = np.zeros(n, dtype=np.float64)
+    
+    order = np.arange(n)  # 目前的剩餘順序（每輪穩定排序後更新）
+    final_scores = np.empty(n, dtype=np.float64)
+    selected: List[int] = []
+    
+    while len(selected) < top_k and order.size:
+        if selected:
+            diversity = np.maximum(0.2, 1 - penalty_sum[order] / len(selected))
+        else:
+            diversity = np.ones(order.size, dtype=np.float64)
+        scores = similarity[order] * (1 - diversity_weight) + diversity * diversity_weight
+        final_scores[order] = scores
+        
+        # 穩定排序（等同 list.sort(reverse=True)），取第一名
+        order = order[np.argsort(-scores, kind="stable")]
+        best = int(order[0])
+        order = order[1:]
+        selected.append(best)
+        movies[best]["final_score"] = float(final_scores[best])
+        
+        if len(selected) < top_k and order.size:
+            # 只對新選入的電影計算懲罰並累加
+            intersection = genre_matrix @ genre_matrix[best]
+            union = genre_counts + genre_counts[best] - intersection
+            genre_overlap = intersection / np.maximum(union, 1)
+            
+            year_penalty = np.zeros(n, dtype=np.float64)
+            if year_known[best]:
+                year_penalty[year_known] = np.maximum(
+                    0, 1 - np.abs(years[year_known] - years[best]) / 10
+                )
+            penalty_sum += genre_overlap * 0.7 + year_penalty * 0.3
+    
+    # 未選入的電影保留最後一輪的綜合分數（與原本迴圈的副作用一致）
+    for row in order.tolist():
+        movies[row]["final_score"] = float(final_scores[row])
+    
+    return [movies[row] for row in selected]
+
+
 async def rerank_by_semantic_similarity(
     query_text: str,
     candidate_movies: List[Dict[str, Any]],
@@ -227,15 +578,19 @@ async def rerank_by_semantic_similarity(
     if not candidate_movies:
         return []
     
+    verbose = debug_enabled()
+    
     # 1. 計算用戶查詢的 embedding
-    print(f"[Embedding] 計算查詢 embedding: '{query_text[:50]}...'")
-    query_embedding = get_embedding(query_text)
+    if verbose:
+        logger.debug(f"[Embedding] 計算查詢 embedding: '{query_text[:50]}...'")
+    query_embedding = await get_query_embedding_async(query_text)
     
     # 2. 取得候選電影的 embeddings
     tmdb_ids = [movie["id"] for movie in candidate_movies]
     stored_embeddings = await get_stored_embeddings(db_session, tmdb_ids)
     
-    print(f"[Embedding] 找到 {len(stored_embeddings)} / {len(candidate_movies)} 部電影的 embeddings")
+    if verbose:
+        logger.debug(f"[Embedding] 找到 {len(stored_embeddings)} / {len(candidate_movies)} 部電影的 embeddings")
     
     # 3. 對於沒有 embedding 的電影，即時計算並儲存
     movies_needing_embedding = [
@@ -244,16 +599,26 @@ async def rerank_by_semantic_similarity(
     ]
     
     if movies_needing_embedding:
-        print(f"[Embedding] 即時計算 {len(movies_needing_embedding)} 部電影的 embeddings")
-        for movie in movies_needing_embedding:
-            overview = movie.get("overview", "")
-            if overview:
-                try:
-                    store_movie_embedding(db_session, movie["id"], overview)
-                    # 重新取得
-                    stored_embeddings[movie["id"]] = get_embedding(overview)
-                except Exception as e:
-                    print(f"[Embedding] 計算失敗 (tmdb_id={movie['id']}): {e}")
+        if verbose:
+            logger.debug(f"[Embedding] 即時計算 {len(movies_needing_embedding)} 部電影的 embeddings（批次）")
+        try:
+            # 一次非同步批次 API 請求 + 一次 bulk UPSERT，直接沿用計算結果
+            items = [
+                (movie["id"], movie.get("overview", ""))
+                for movie in movies_needing_embedding
+                if movie.get("overview")
+            ]
+            embeddings = await get_embeddings_batch_async([overview for _, overview in items])
+            await asyncio.to_thread(store_movie_embeddings_batch, db_session, [
+                (tmdb_id, overview, embedding)
+                for (tmdb_id, overview), embedding in zip(items, embeddings)
+            ])
+            stored_embeddings.update({
+                tmdb_id: embedding
+                for (tmdb_id, _), embedding in zip(items, embeddings)
+            })
+        except Exception as e:
+            logger.warning(f"[Embedding] 批次計算失敗 ({len(movies_needing_embedding)} 部): {e}")
     
     # 4. 計算相似度分數
     for movie in candidate_movies:
@@ -272,41 +637,160 @@ async def rerank_by_semantic_similarity(
             # [新增] 如果是精確匹配，提升權重
             if boost_exact_matches and movie.get("is_exact_match"):
                 base_score = min(1.0, base_score * 1.5)  # 提升 50%
-                print(f"[Embedding] 精確匹配加權: {movie.get('title')} - {base_score:.3f}")
+                if verbose:
+                    logger.debug(f"[Embedding] 精確匹配加權: {movie.get('title')} - {base_score:.3f}")
             
             # [新增] 如果有 keyword 匹配，提升權重
             if boost_keyword_matches and movie.get("has_keyword_match"):
                 base_score = min(1.0, base_score * 1.3)  # 提升 30%
-                print(f"[Embedding] Keyword 匹配加權: {movie.get('title')} - {base_score:.3f}")
+                if verbose:
+                    logger.debug(f"[Embedding] Keyword 匹配加權: {movie.get('title')} - {base_score:.3f}")
             
             movie["similarity_score"] = base_score
         else:
             movie["similarity_score"] = 0.0
     
-    # 5. 使用 Maximal Marginal Relevance (MMR) 選擇多樣化結果
-    selected_movies = []
-    remaining_movies = candidate_movies.copy()
+    # 5. 使用 Maximal Marginal Relevance (MMR) 選擇多樣化結果（增量式，見 select_diverse_movies）
+    selected_movies = select_diverse_movies(candidate_movies, top_k, diversity_weight)
     
-    while len(selected_movies) < top_k and remaining_movies:
-        # 計算當前候選電影的多樣性分數
-        diversity_scores = calculate_diversity_score(remaining_movies, selected_movies)
-        
-        # 計算綜合分數 = 相似度 * (1 - diversity_weight) + 多樣性 * diversity_weight
-        for movie in remaining_movies:
-            similarity = movie["similarity_score"]
-            diversity = diversity_scores.get(movie["id"], 1.0)
-            movie["final_score"] = similarity * (1 - diversity_weight) + diversity * diversity_weight
+    if verbose:
+        logger.debug(f"[Embedding] 返回 {len(selected_movies)} 部電影，Top 10 分數:")
+        for i, movie in enumerate(selected_movies[:10]):
+            logger.debug(f"  {i+1}. {movie.get('title', 'Unknown')} - 相似度:{movie['similarity_score']:.3f}, 最終分數:{movie.get('final_score', 0):.3f}")
+    
+    return selected_movies
+
+
+# ============================================================================
+# Phase 3.6: 電影欄位（特徵 / 詳細資料分開查詢）
+# ============================================================================
+# 
+# 300 個候選的過濾、Match Ratio、三象限分類只需要特徵欄位；
+# overview、poster_path 等較大的欄位只有最終返回的約 10 部電影需要。
+# ============================================================================
+
+# 過濾 / 評分階段使用的欄位（title 供 log 使用）
+MOVIE_FEATURE_COLUMNS = (
+    "m.title",
+    "m.release_date",
+    "m.vote_average",
+    "m.genres",
+    "m.keywords",
+    "m.mood_tags",
+)
+
+# 只有最終結果需要的欄位
+MOVIE_DETAIL_COLUMNS = (
+    "mv.embedding_text",
+    "m.original_title",
+    "m.overview",
+    "m.popularity",
+    "m.vote_count",
+    "m.poster_path",
+)
+
+
+def _movie_columns_to_dict(columns: Tuple[str, ...], values) -> Dict[str, Any]:
+    """SELECT 欄位（"m.title" 形式）與對應的值 → 電影 dict（NULL 數值 / 列表欄位給預設值）"""
+    movie = {}
+    for column, value in zip(columns, values):
+        field = column.split(".", 1)[1]
+        if field in ("popularity", "vote_average"):
+            value = float(value) if value else 0.0
+        elif field == "vote_count":
+            value = int(value) if value else 0
+        elif field in ("genres", "keywords", "mood_tags"):
+            value = value if value else []
+        movie[field] = value
+    return movie
+
+
+def _fetch_movie_columns(
+    db_session: Session,
+    tmdb_ids: List[int],
+    columns: Tuple[str, ...]
+) -> Dict[int, Dict[str, Any]]:
+    """查詢有 embedding 的電影的指定欄位：{tmdb_id: {欄位: 值}}"""
+    if not tmdb_ids:
+        return {}
+    
+    query = text(f"""
+        SELECT m.tmdb_id, {', '.join(columns)}
+        FROM movie_vectors mv
+        JOIN movies m ON mv.tmdb_id = m.tmdb_id
+        WHERE mv.tmdb_id = ANY(:ids)
+    """)
+    return {
+        row[0]: _movie_columns_to_dict(columns, row[1:])
+        for row in db_session.execute(query, {"ids": [int(i) for i in tmdb_ids]})
+    }
+
+
+def _build_candidates(
+    top_ids: np.ndarray,
+    top_scores: np.ndarray,
+    movies_by_id: Dict[int, Dict[str, Any]]
+) -> List[Candidate]:
+    """搜索結果 + 電影欄位 → 候選列表（依相似度降序；每個候選是新的 Candidate，見 candidate.py）"""
+    results = []
+    for tmdb_id, similarity in zip(top_ids.tolist(), top_scores.tolist()):
+        fields = movies_by_id.get(tmdb_id)
+        if fields is None:
+            # 索引載入後電影已被刪除
+            continue
         
-        # 選擇分數最高的電影
-        remaining_movies.sort(key=lambda x: x["final_score"], reverse=True)
-        best_movie = remaining_movies.pop(0)
-        selected_movies.append(best_movie)
+        results.append(Candidate(tmdb_id, similarity, fields))
+    return results
+
+
+async def hydrate_movie_details_async(
+    db_session: Session,
+    tmdb_ids: List[int]
+) -> Dict[int, Dict[str, Any]]:
+    """hydrate_movie_details 的非同步版本（DB 查詢在 thread 中執行）"""
+    if not tmdb_ids:
+        return {}
+    return await asyncio.to_thread(hydrate_movie_details, db_session, tmdb_ids)
+
+
+async def _get_vector_index_async(db_session: Session):
+    """
+    取得進程內向量索引：已載入時直接返回；
+    首次載入（DB 查詢 + 解碼整個矩陣）在 thread 中執行，不阻塞 event loop
+    """
+    index = get_loaded_vector_index()
+    if index is not None:
+        return index
+    return await asyncio.to_thread(get_vector_index, db_session, EMBEDDING_DIM, EMBEDDING_MODEL)
+
+
+def hydrate_movie_details(
+    db_session: Session,
+    tmdb_ids: List[int]
+) -> Dict[int, Dict[str, Any]]:
+    """
+    查詢最終結果的詳細欄位（MOVIE_DETAIL_COLUMNS）
     
-    print(f"[Embedding] 返回 {len(selected_movies)} 部電影，Top 10 分數:")
-    for i, movie in enumerate(selected_movies[:10]):
-        print(f"  {i+1}. {movie.get('title', 'Unknown')} - 相似度:{movie['similarity_score']:.3f}, 最終分數:{movie.get('final_score', 0):.3f}")
+    Args:
+        db_session: 資料庫 session
+        tmdb_ids: 要補齊資料的電影
     
-    return selected_movies
+    Returns:
+        {tmdb_id: {"overview": ..., "poster_path": ..., ...}}（已被刪除的電影不在其中）
+    """
+    if not tmdb_ids:
+        return {}
+    
+    query = text(f"""
+        SELECT m.tmdb_id, {', '.join(MOVIE_DETAIL_COLUMNS)}
+        FROM movies m
+        LEFT JOIN movie_vectors mv ON mv.tmdb_id = m.tmdb_id
+        WHERE m.tmdb_id = ANY(:ids)
+    """)
+    return {
+        row[0]: _movie_columns_to_dict(MOVIE_DETAIL_COLUMNS, row[1:])
+        for row in db_session.execute(query, {"ids": [int(i) for i in tmdb_ids]})
+    }
 
 
 # ============================================================================
@@ -316,7 +800,7 @@ async def rerank_by_semantic_similarity(
 # 
 # 功能：
 # - 從整個 movie_vectors 表（668 部電影）搜索與查詢最相似的電影
-# - 計算 Cosine Similarity
+# - 計算 Cosine Similarity（常駐記憶體的正規化 float32 矩陣，見 vector_index.py）
 # - 返回 Top K 候選（預設 300）
 # 
 # 與 rerank_by_semantic_similarity 的區別：
@@ -328,8 +812,12 @@ async def embedding_similarity_search(
     query_text: str,
     db_session: Session,
     top_k: int = 300,
-    min_similarity: float = 0.0
-) -> List[Dict[str, Any]]:
+    min_similarity: float = 0.0,
+    hard_filters: Optional[Dict[str, Any]] = None,
+    hydrate: bool = True,
+    taste_vector: Optional[np.ndarray] = None,
+    taste_weight: float = 0.0
+) -> List[Candidate]:
     """
     Phase 3.6 核心功能：全庫 Embedding 語義搜索
     
@@ -339,18 +827,27 @@ async def embedding_similarity_search(
     
     流程：
     1. 計算 query_text 的 Embedding
-    2. 從 movie_vectors 表查詢所有電影 Embeddings
-    3. 計算 Cosine Similarity
-    4. 返回 Top K 高分電影
+    2. 取得進程內向量索引（vector_index.MovieVectorIndex，首次呼叫時載入；
+       優先 mmap 磁碟快照，快照不存在時從 DB 載入）
+    3. 一次矩陣-向量乘法計算 Cosine Similarity，argpartition 取 Top K
+       （有 hard_filters 時先以欄式 Metadata 遮罩，Top K 只從符合條件的電影中選出）
+    4. 只為 Top K 電影查詢基本資料並返回
     
     Args:
         query_text: 用戶查詢文本（已由 embedding_query_generator 處理）
         db_session: 資料庫 session
         top_k: 返回前 K 部電影（預設 300，供後續 Feature Filtering）
         min_similarity: 最低相似度閾值（預設 0.0，不過濾）
+        hard_filters: 下推到向量搜索的 Hard Filters
+                      {"genres", "exclude_genres", "year_range", "year_ranges", "min_rating", "exclude_ids"}
+        hydrate: True → 返回完整電影資料；
+                 False → 只返回過濾 / 評分所需的特徵欄位（MOVIE_FEATURE_COLUMNS），
+                 最終結果再以 hydrate_movie_details() 補上 overview / poster_path 等欄位
+        taste_vector: 使用者品味向量（個人化模式，已正規化）；與查詢 Embedding 混合後只搜索一次
+        taste_weight: 品味向量的混合比例
     
     Returns:
-        List[Dict]: 包含 tmdb_id, embedding_score, movie 基本資料
+        List[Candidate]: 包含 tmdb_id, embedding_score, movie 基本資料（可當 dict 使用，見 candidate.py）
         [
             {
                 "id": 550,
@@ -369,97 +866,163 @@ async def embedding_similarity_search(
         >>> len(results)  # 300
         >>> results[0]["embedding_score"]  # 0.85
     """
-    print(f"\n🔍 [Phase 3.6 Embedding Search] 全庫語義搜索")
-    print(f"   - Query: '{query_text[:80]}...'")
-    print(f"   - Top K: {top_k}")
-    print(f"   - Min Similarity: {min_similarity}")
-    print(f"{'-'*70}")
+    verbose = debug_enabled()
+    active_filters = {k: v for k, v in (hard_filters or {}).items() if v is not None and v != []}
+    if verbose:
+        logger.debug(f"\n🔍 [Phase 3.6 Embedding Search] 全庫語義搜索")
+        logger.debug(f"   - Query: '{query_text[:80]}...'")
+        logger.debug(f"   - Top K: {top_k}")
+        logger.debug(f"   - Min Similarity: {min_similarity}")
+        if active_filters:
+            logger.debug(f"   - Hard Filters: {active_filters}")
+        logger.debug(f"{'-'*70}")
     
     # Step 1: 計算 query_text 的 Embedding
-    print(f"[1/4] 計算查詢 Embedding...")
-    query_embedding = get_embedding(query_text)
-    
-    # Step 2: 從 DB 查詢所有電影的 Embeddings + 基本資料
-    print(f"[2/4] 從 DB 查詢所有電影 Embeddings...")
-    query = text("""
-        SELECT 
-            mv.tmdb_id,
-            mv.embedding,
-            mv.embedding_text,
-            m.title,
-            m.original_title,
-            m.overview,
-            m.release_date,
-            m.popularity,
-            m.vote_average,
-            m.vote_count,
-            m.genres,
-            m.keywords,
-            m.mood_tags,
-            m.poster_path
-        FROM movie_vectors mv
-        JOIN movies m ON mv.tmdb_id = m.tmdb_id
-        WHERE mv.embedding IS NOT NULL
-    """)
+    if verbose:
+        logger.debug(f"[1/4] 計算查詢 Embedding（查詢快取優先，非同步）...")
+    with span("embed"):
+        query_embedding = await get_query_embedding_async(query_text)
+    if taste_vector is not None and taste_weight > 0.0:
+        from app.services.user_taste import blend_query_with_taste
+        
+        query_embedding = blend_query_with_taste(query_embedding, taste_vector, taste_weight)
+        if verbose:
+            logger.debug(f"   ✓ 已混合使用者品味向量（權重 {taste_weight}）")
     
-    result = db_session.execute(query)
-    rows = result.fetchall()
+    # Step 2: 取得進程內向量索引（首次呼叫時從 DB 載入）
+    if verbose:
+        logger.debug(f"[2/4] 取得電影向量索引...")
+    index = await _get_vector_index_async(db_session)
     
-    print(f"   ✓ 找到 {len(rows)} 部有 Embedding 的電影")
+    if verbose:
+        logger.debug(f"   ✓ 索引共 {len(index)} 部有 Embedding 的電影")
     
-    if not rows:
-        print(f"   ⚠️  沒有電影有 Embedding，返回空列表")
+    if len(index) == 0:
+        if verbose:
+            logger.debug(f"   ⚠️  沒有電影有 Embedding，返回空列表")
         return []
     
-    # Step 3: 計算 Cosine Similarity
-    print(f"[3/4] 計算 Cosine Similarity...")
-    candidates = []
+    # Step 3: 矩陣-向量乘法計算 Cosine Similarity + argpartition 取 Top K
+    # （engine="ivf"：只掃描最接近的 nprobe 個群；"two_stage"：前綴維度粗篩 + 完整維度重算）
+    search_config = PHASE36_CONFIG.get("embedding_search", {})
+    engine = search_config.get("engine", "exact")
+    if not index.supports(engine):
+        engine = "exact"
+    pushdown = "Hard Filter 下推" if active_filters and index.metadata is not None else "無過濾下推"
+    if verbose:
+        logger.debug(f"[3/4] 計算 Cosine Similarity 並取 Top {top_k}（engine: {engine}，{pushdown}）...")
+    # 矩陣運算（NumPy 執行時釋放 GIL）與 DB 查詢都在 thread 中執行，event loop 可同時處理其他請求
+    with span("search"):
+        top_ids, top_scores = await asyncio.to_thread(
+            index.search,
+            query_embedding,
+            top_k,
+            min_similarity,
+            engine=engine,
+            nprobe=search_config.get("ivf_nprobe", 32),
+            shortlist_size=max(
+                top_k * search_config.get("two_stage_shortlist_factor", 8),
+                search_config.get("two_stage_min_shortlist", 1000),
+            ),
+            hard_filters=active_filters,
+        )
     
-    for row in rows:
-        tmdb_id = row[0]
-        embedding_data = row[1]
-        
-        # 解析 embedding（可能是 JSONB 或 JSON string）
-        if isinstance(embedding_data, str):
-            movie_embedding = json.loads(embedding_data)
-        else:
-            movie_embedding = embedding_data  # 已經是 list
-        
-        # 計算相似度
-        similarity = cosine_similarity(query_embedding, movie_embedding)
-        
-        # 過濾低分
-        if similarity < min_similarity:
-            continue
-        
-        # 構建電影資料
-        candidates.append({
-            "id": tmdb_id,
-            "embedding_score": float(similarity),
-            "embedding_text": row[2],
-            "title": row[3],
-            "original_title": row[4],
-            "overview": row[5],
-            "release_date": row[6],
-            "popularity": float(row[7]) if row[7] else 0.0,
-            "vote_average": float(row[8]) if row[8] else 0.0,
-            "vote_count": int(row[9]) if row[9] else 0,
-            "genres": row[10] if row[10] else [],  # 使用 genres 統一命名 ⭐
-            "keywords": row[11] if row[11] else [],
-            "mood_tags": row[12] if row[12] else [],
-            "poster_path": row[13]  # Phase 3.6 新增 ⭐
-        })
-    
-    # Step 4: 排序並返回 Top K
-    print(f"[4/4] 排序並返回 Top {top_k}...")
-    candidates.sort(key=lambda x: x["embedding_score"], reverse=True)
-    results = candidates[:top_k]
-    
-    print(f"   ✓ 返回 {len(results)} 部電影")
-    print(f"\n   📊 Top 10 Embedding Scores:")
-    for i, movie in enumerate(results[:10]):
-        print(f"      {i+1}. {movie['title'][:40]:40s} - {movie['embedding_score']:.4f}")
-    
-    print(f"{'-'*70}\n")
-    
-    return results
\ No newline at end of file
+    if len(top_ids) == 0:
+        return []
+    
+    # Step 4: 只為 Top K 電影查詢資料（hydrate=False 時只取過濾 / 評分所需的特徵欄位）
+    columns = MOVIE_FEATURE_COLUMNS + (MOVIE_DETAIL_COLUMNS if hydrate else ())
+    if verbose:
+        logger.debug(f"[4/4] 查詢 Top {len(top_ids)} 電影{'資料' if hydrate else '特徵欄位'}...")
+    with span("fetch"):
+        movies_by_id = await asyncio.to_thread(_fetch_movie_columns, db_session, top_ids.tolist(), columns)
+        results = _build_candidates(top_ids, top_scores, movies_by_id)
+    
+    if verbose:
+        logger.debug(f"   ✓ 返回 {len(results)} 部電影")
+        logger.debug(f"\n   📊 Top 10 Embedding Scores:")
+        for i, movie in enumerate(results[:10]):
+            logger.debug(f"      {i+1}. {movie['title'][:40]:40s} - {movie['embedding_score']:.4f}")
+        logger.debug(f"{'-'*70}\n")
+    
+    return results
+
+
+async def batch_embedding_similarity_search(
+    query_texts: List[str],
+    db_session: Session,
+    top_k: int = 300,
+    min_similarity: float = 0.0,
+    hard_filters_list: Optional[List[Optional[Dict[str, Any]]]] = None,
+    hydrate: bool = True
+) -> List[List[Candidate]]:
+    """
+    多個查詢的全庫 Embedding 語義搜索（首頁多列、Mood 預設、A/B 變體、預先計算）
+    
+    與逐一呼叫 embedding_similarity_search() 的區別：
+    - 所有查詢的 Embedding 合併成一次 Provider 呼叫（快取命中的不送出）
+    - 以一次矩陣-矩陣乘法計算全部查詢的分數（MovieVectorIndex.search_batch，精確搜索）
+    - 所有查詢的 Top K 電影合併成一次 DB 查詢
+    
+    Args:
+        query_texts: 查詢文本列表
+        db_session: 資料庫 session
+        top_k: 每個查詢返回前 K 部電影
+        min_similarity: 最低相似度閾值
+        hard_filters_list: 每個查詢各自的 Hard Filters（見 embedding_similarity_search）
+        hydrate: 是否返回完整電影資料（見 embedding_similarity_search）
+    
+    Returns:
+        與 query_texts 順序一致的候選列表；每個查詢的候選都是獨立的 Candidate
+    """
+    verbose = debug_enabled()
+    if verbose:
+        logger.debug(f"\n🔍 [Phase 3.6 Batch Embedding Search] {len(query_texts)} 個查詢")
+        logger.debug(f"   - Top K: {top_k}")
+        logger.debug(f"{'-'*70}")
+    
+    if not query_texts:
+        return []
+    
+    # Step 1: 一次取得所有查詢的 Embedding
+    if verbose:
+        logger.debug(f"[1/4] 計算 {len(query_texts)} 個查詢 Embedding（查詢快取優先，未命中的合併送出）...")
+    with span("embed"):
+        query_embeddings = await get_query_embeddings_batch_async(query_texts)
+    
+    # Step 2: 取得進程內向量索引
+    if verbose:
+        logger.debug(f"[2/4] 取得電影向量索引...")
+    index = await _get_vector_index_async(db_session)
+    if len(index) == 0:
+        if verbose:
+            logger.debug(f"   ⚠️  沒有電影有 Embedding，返回空列表")
+        return [[] for _ in query_texts]
+    
+    # Step 3: 一次矩陣-矩陣乘法計算全部查詢的 Cosine Similarity
+    active_filters_list = None
+    if hard_filters_list:
+        active_filters_list = [
+            {k: v for k, v in (hard_filters or {}).items() if v is not None and v != []}
+            for hard_filters in hard_filters_list
+        ]
+    if verbose:
+        logger.debug(f"[3/4] 計算 {len(query_texts)} × {len(index)} Cosine Similarity 並各取 Top {top_k}...")
+    with span("search"):
+        searched = await asyncio.to_thread(
+            index.search_batch, query_embeddings, top_k, min_similarity, active_filters_list
+        )
+    
+    # Step 4: 所有查詢的 Top K 電影一次查詢
+    columns = MOVIE_FEATURE_COLUMNS + (MOVIE_DETAIL_COLUMNS if hydrate else ())
+    all_ids = np.unique(np.concatenate([ids for ids, _ in searched])) if searched else np.empty(0)
+    if verbose:
+        logger.debug(f"[4/4] 查詢 {len(all_ids)} 部電影{'資料' if hydrate else '特徵欄位'}...")
+    with span("fetch"):
+        movies_by_id = await asyncio.to_thread(_fetch_movie_columns, db_session, all_ids.tolist(), columns)
+        results = [_build_candidates(ids, scores, movies_by_id) for ids, scores in searched]
+    if verbose:
+        logger.debug(f"   ✓ 返回 {[len(r) for r in results]} 部電影")
+        logger.debug(f"{'-'*70}\n")
+    
+    return results
@@ -0,0 +1,278 @@
+# app/services/mood_template_embeddings.py
+"""
+Mood-only 查詢模板的預先計算 Embeddings
+
+只選 Mood 按鈕（沒有自然語言）時，generate_embedding_query() 的查詢文本
+只可能來自固定的集合：
+- MOOD_RELATIONSHIP_MATRIX 的模板
+- analyze_by_heuristics() / analyze_mood_combination() 的規則模板
+- generate_mood_template() 的 fallback 模板
+- 沒有任何輸入時的 "popular and highly rated movies"
+
+tools/build_mood_template_embeddings.py 對已知的 Mood 詞彙（前端的 Mood Labels +
+矩陣中的英文 mood tags）列舉 1-2 個標籤的有序組合；3 個以上標籤時 generate_embedding_query()
+先排序標籤，只需列舉前端 Mood Labels 的（無序）組合，直到 max_labels
+（PHASE36_CONFIG["mood_templates"]）。去重後的模板文本一次送給 Embedding Provider，
+存成版本化的 artifact：
+
+    embeddings.npy  float32 矩陣 (N × dim)
+    manifest.json   {"format_version", "embedding_version", "dim", "rows",
+                     "max_labels", "texts", "created_at"}
+
+執行期以正規化後的查詢文本查表（embedding_service 在查詢快取之前查），
+不超過 max_labels 個前端 Mood Labels 的 Mood-only 請求不需要呼叫外部 API；
+超過的組合照常呼叫一次 API，之後由查詢快取命中。
+embedding_version / dim 與目前的 Provider 不符時整份忽略；
+模板文字改動後舊文本只是不再被查到，不會返回錯誤的向量。
+artifact 不可用時每隔 reload_interval_seconds 檢查 manifest，部署後才建置也不需重啟。
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.phase36_config import PHASE36_CONFIG
+from app.services.query_embedding_cache import normalize_query_text
+from app.services.pipeline_trace import recommend_logger as logger
+
+TEMPLATE_FORMAT_VERSION = 1
+
+EMBEDDINGS_FILE = "embeddings.npy"
+MANIFEST_FILE = "manifest.json"
+
+# 預設 artifact 位置：backend/data/mood_templates（可用環境變數覆蓋）
+DEFAULT_TEMPLATE_DIR = Path(__file__).resolve().parents[2] / "data" / "mood_templates"
+
+
+def get_template_dir() -> Path:
+    """Artifact 目錄（環境變數 MOOD_TEMPLATE_DIR 優先）"""
+    return Path(os.getenv("MOOD_TEMPLATE_DIR") or DEFAULT_TEMPLATE_DIR)
+
+
+# ============================================================================
+# 模板列舉
+# ============================================================================
+
+def frontend_mood_labels() -> List[str]:
+    """前端可選的 Mood Labels（MOOD_LABEL_TO_DB_TAGS）"""
+    from app.services.mapping_tables import MOOD_LABEL_TO_DB_TAGS
+
+    return list(MOOD_LABEL_TO_DB_TAGS.keys())
+
+
+def default_mood_vocabulary() -> List[str]:
+    """已知的 Mood 詞彙：前端 Mood Labels（MOOD_LABEL_TO_DB_TAGS）+ 關係矩陣中的英文 mood tags"""
+    from app.services.mapping_tables import MOOD_LABEL_TO_DB_TAGS
+    from app.services.mood_analyzer import MOOD_RELATIONSHIP_MATRIX
+
+    vocabulary = list(MOOD_LABEL_TO_DB_TAGS.keys())
+    english_tags = sorted({tag for pair in MOOD_RELATIONSHIP_MATRIX for tag in pair})
+    return vocabulary + [tag for tag in english_tags if tag not in MOOD_LABEL_TO_DB_TAGS]
+
+
+def enumerate_mood_only_queries(
+    vocabulary: Sequence[str],
+    max_labels: int = 3,
+    combination_vocabulary: Optional[Sequence[str]] = None
+) -> List[str]:
+    """
+    列舉 Mood-only 情境可能產生的所有查詢文本（已正規化、去重、保持列舉順序）
+
+    1-2 個標籤的模板與順序有關（例如 "from X to Y"），列舉詞彙的有序組合：V + V·(V-1) 個。
+    3 個以上標籤時 generate_embedding_query() 先排序標籤，只列舉 combination_vocabulary
+    （預設同 vocabulary）的無序組合：C(L, 3) + ... + C(L, max_labels) 個。
+    """
+    from app.services.embedding_query_generator import generate_embedding_query
+
+    texts: Dict[str, None] = {}
+    # 沒有任何輸入時的 fallback 查詢
+    texts[normalize_query_text(generate_embedding_query(None, [])["query"])] = None
+
+    for size in range(1, min(max_labels, 2) + 1):
+        for labels in itertools.permutations(vocabulary, size):
+            query = generate_embedding_query(None, list(labels))["query"]
+            texts[normalize_query_text(query)] = None
+
+    labels_for_combinations = list(combination_vocabulary if combination_vocabulary is not None else vocabulary)
+    for size in range(3, max_labels + 1):
+        for labels in itertools.combinations(labels_for_combinations, size):
+            query = generate_embedding_query(None, list(labels))["query"]
+            texts[normalize_query_text(query)] = None
+    return list(texts)
+
+
+# ============================================================================
+# Artifact 讀寫
+# ============================================================================
+
+class MoodTemplateEmbeddings:
+    """正規化模板文本 → embedding 的唯讀查表"""
+
+    def __init__(self, texts: Sequence[str], matrix: np.ndarray, manifest: Optional[dict] = None):
+        self.row_of: Dict[str, int] = {t: i for i, t in enumerate(texts)}
+        self.matrix = matrix
+        self.manifest = manifest or {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def get(self, normalized_text: str) -> Optional[List[float]]:
+        """查表（文本需先經過 normalize_query_text）；不存在時返回 None"""
+        row = self.row_of.get(normalized_text)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.matrix[row].tolist()
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "templates": len(self),
+            "embedding_version": self.manifest.get("embedding_version"),
+            "max_labels": self.manifest.get("max_labels"),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def write_mood_template_embeddings(
+    template_dir: Path,
+    texts: Sequence[str],
+    embeddings: Iterable[Sequence[float]],
+    embedding_version: str,
+    max_labels: int
+) -> dict:
+    """
+    寫入 artifact（embeddings.npy 先替換，manifest.json 最後寫入）
+
+    讀取端以 manifest 的 rows 驗證兩個檔案一致，避免讀到半套 artifact。
+    """
+    template_dir.mkdir(parents=True, exist_ok=True)
+    matrix = np.ascontiguousarray(np.asarray(list(embeddings), dtype=np.float32))
+    if matrix.ndim != 2 or matrix.shape[0] != len(texts):
+        raise ValueError(f"texts/embeddings mismatch: texts={len(texts)}, embeddings={matrix.shape}")
+
+    tmp_embeddings = template_dir / f"{EMBEDDINGS_FILE}.tmp.npy"
+    np.save(tmp_embeddings, matrix)
+    os.replace(tmp_embeddings, template_dir / EMBEDDINGS_FILE)
+
+    manifest = {
+        "format_version": TEMPLATE_FORMAT_VERSION,
+        "embedding_version": embedding_version,
+        "dim": int(matrix.shape[1]),
+        "rows": int(matrix.shape[0]),
+        "max_labels": max_labels,
+        "texts": list(texts),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_manifest = template_dir / f"{MANIFEST_FILE}.tmp"
+    tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_manifest, template_dir / MANIFEST_FILE)
+    return manifest
+
+
+def load_mood_template_embeddings(
+    template_dir: Path,
+    embedding_version: str,
+    dim: int
+) -> Optional[MoodTemplateEmbeddings]:
+    """
+    以唯讀 mmap 載入 artifact
+
+    Returns:
+        MoodTemplateEmbeddings；artifact 不存在、版本或維度不符時返回 None
+    """
+    manifest_path = template_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning(f"   ⚠️  [MoodTemplates] manifest 無法讀取: {e}")
+        return None
+
+    if manifest.get("format_version") != TEMPLATE_FORMAT_VERSION:
+        logger.warning(f"   ⚠️  [MoodTemplates] 格式版本不符: {manifest.get('format_version')}")
+        return None
+    if manifest.get("embedding_version") != embedding_version:
+        logger.warning(f"   ⚠️  [MoodTemplates] embedding 版本不符: {manifest.get('embedding_version')} != {embedding_version}")
+        return None
+    if manifest.get("dim") != dim:
+        logger.warning(f"   ⚠️  [MoodTemplates] 維度不符: {manifest.get('dim')} != {dim}")
+        return None
+
+    try:
+        matrix = np.load(template_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        logger.warning(f"   ⚠️  [MoodTemplates] embeddings 無法開啟: {e}")
+        return None
+
+    texts = manifest.get("texts") or []
+    if matrix.shape != (manifest.get("rows"), dim) or len(texts) != matrix.shape[0]:
+        logger.warning(f"   ⚠️  [MoodTemplates] embeddings 與 manifest 不一致，忽略")
+        return None
+
+    return MoodTemplateEmbeddings(texts, matrix, manifest)
+
+
+# ============================================================================
+# 進程內單例
+# ============================================================================
+
+_templates: Optional[MoodTemplateEmbeddings] = None
+# 已載入（或嘗試載入）的 manifest mtime_ns；None 表示 manifest 不存在
+_templates_mtime: Optional[int] = None
+# 下一次檢查 manifest 的時間（time.monotonic()）；0 表示尚未載入
+_next_check = 0.0
+_templates_lock = threading.Lock()
+
+
+def _manifest_mtime(template_dir: Path) -> Optional[int]:
+    try:
+        return (template_dir / MANIFEST_FILE).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_mood_template_embeddings(embedding_version: str, dim: int) -> Optional[MoodTemplateEmbeddings]:
+    """
+    取得進程內的模板查表（首次呼叫時載入；artifact 不可用時返回 None）
+
+    每隔 reload_interval_seconds 以 manifest 的 mtime 檢查 artifact 是否建置或更新，
+    有變化時重新載入；兩次檢查之間只有一次時間比較。
+    """
+    global _templates, _templates_mtime, _next_check
+    if time.monotonic() < _next_check:
+        return _templates
+
+    with _templates_lock:
+        now = time.monotonic()
+        if now < _next_check:
+            return _templates
+        interval = PHASE36_CONFIG.get("mood_templates", {}).get("reload_interval_seconds", 60)
+        first_load = _next_check == 0.0
+        _next_check = now + interval
+
+        template_dir = get_template_dir()
+        mtime = _manifest_mtime(template_dir)
+        if first_load or mtime != _templates_mtime:
+            templates = load_mood_template_embeddings(template_dir, embedding_version, dim)
+            _templates_mtime = mtime
+            if templates is not None:
+                _templates = templates
+                logger.info(f"   ✓ [MoodTemplates] 載入 {len(templates)} 個預先計算的 Mood 模板 Embedding")
+            elif mtime is None:
+                # artifact 已被移除
+                _templates = None
+    return _templates
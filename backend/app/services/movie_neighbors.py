@@ -0,0 +1,319 @@
+# app/services/movie_neighbors.py
+"""
+相似電影表（movie_neighbors）
+
+「更多類似電影」若在請求時計算，每次點擊都要掃描全庫。
+這裡離線預先計算每部電影的 Top K cosine 鄰居，存入 movie_neighbors（每部電影一列），
+GET /api/movies/{tmdb_id}/similar 以主鍵讀取一列即可。
+
+計算（tools/build_movie_neighbors.py）：
+- 全量：分塊矩陣乘法 matrix[block] @ matrix.T，每塊 argpartition 取 Top K（排除自己）
+- 增量：只處理 movie_vectors.updated_at 與 source_updated_at 不同的電影（變更集合 C）
+  1. C 中的電影、以及鄰居列表含有 C 或已刪除電影的電影 → 整列重算
+  2. 其他電影的舊列表仍然正確（列表外的電影分數都不高於第 K 名），
+     只需把 C 中分數夠高的電影合併進來
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.embedding_codec import (
+    STORED_EMBEDDING_COLUMNS,
+    HAS_STORED_EMBEDDING,
+    decode_stored_embedding,
+)
+
+
+# ============================================================================
+# Top K 計算
+# ============================================================================
+
+def top_k_neighbors(
+    matrix: np.ndarray,
+    rows: np.ndarray,
+    k: int,
+    block_size: int = 1024
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    matrix（已正規化）中 rows 各列的 Top K 鄰居，排除自己
+
+    Returns:
+        (鄰居列號 (len(rows) × k), 分數 (len(rows) × k))，依分數降序；
+        鄰居不足 K 個時以 -1 / -inf 補齊
+    """
+    n_rows = int(matrix.shape[0])
+    neighbor_rows = np.full((rows.shape[0], k), -1, dtype=np.int64)
+    neighbor_scores = np.full((rows.shape[0], k), -np.inf, dtype=np.float32)
+    k_eff = min(k, n_rows - 1)
+    if k_eff <= 0:
+        return neighbor_rows, neighbor_scores
+
+    for start in range(0, rows.shape[0], block_size):
+        block = rows[start:start + block_size]
+        scores = matrix[block] @ matrix.T
+        scores[np.arange(block.shape[0]), block] = -np.inf
+
+        top = np.argpartition(-scores, k_eff - 1, axis=1)[:, :k_eff]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+
+        stop = start + block.shape[0]
+        neighbor_rows[start:stop, :k_eff] = np.take_along_axis(top, order, axis=1)
+        neighbor_scores[start:stop, :k_eff] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbor_rows, neighbor_scores
+
+
+def merge_neighbors(
+    matrix: np.ndarray,
+    target_rows: np.ndarray,
+    neighbor_rows: np.ndarray,
+    neighbor_scores: np.ndarray,
+    candidate_rows: np.ndarray,
+    block_size: int = 1024
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    將 candidate_rows 合併進 target_rows 既有的 Top K 列表
+
+    前提：target_rows 與其既有列表都不含 candidate_rows 中的電影
+    （變更過的電影），因此既有分數仍然有效，合併結果與整列重算相同。
+    """
+    k = int(neighbor_rows.shape[1])
+    merged_rows = neighbor_rows.copy()
+    merged_scores = neighbor_scores.copy()
+    if candidate_rows.shape[0] == 0 or k == 0:
+        return merged_rows, merged_scores
+
+    candidates_t = np.ascontiguousarray(matrix[candidate_rows].T)
+    for start in range(0, target_rows.shape[0], block_size):
+        stop = min(start + block_size, target_rows.shape[0])
+        scores = np.concatenate(
+            [merged_scores[start:stop], matrix[target_rows[start:stop]] @ candidates_t], axis=1
+        )
+        rows = np.concatenate(
+            [merged_rows[start:stop], np.broadcast_to(candidate_rows, (stop - start, candidate_rows.shape[0]))],
+            axis=1
+        )
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+
+        merged_scores[start:stop] = np.take_along_axis(scores, top, axis=1)
+        merged_rows[start:stop] = np.take_along_axis(rows, top, axis=1)
+
+    return merged_rows, merged_scores
+
+
+# ============================================================================
+# DB 讀寫
+# ============================================================================
+
+def load_movie_vectors(db_session: Session, dim: int) -> Tuple[np.ndarray, np.ndarray, List[Optional[datetime]]]:
+    """
+    載入所有（有對應 movies 的）電影向量
+
+    Returns:
+        (tmdb_ids, 已正規化的 float32 矩陣, 每列的 movie_vectors.updated_at)
+    """
+    result = db_session.execute(text(f"""
+        SELECT mv.tmdb_id, {STORED_EMBEDDING_COLUMNS}, mv.updated_at
+        FROM movie_vectors mv
+        JOIN movies m ON mv.tmdb_id = m.tmdb_id
+        WHERE {HAS_STORED_EMBEDDING}
+        ORDER BY mv.tmdb_id
+    """))
+
+    ids: List[int] = []
+    vectors: List[np.ndarray] = []
+    updated_ats: List[Optional[datetime]] = []
+    for tmdb_id, embedding_bin, embedding_dtype, embedding_json, updated_at in result:
+        vector = np.asarray(
+            decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json), dtype=np.float32
+        )
+        if vector.shape != (dim,):
+            continue
+        ids.append(tmdb_id)
+        vectors.append(vector)
+        updated_ats.append(updated_at)
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.asarray(ids, dtype=np.int64), matrix / norms, updated_ats
+
+
+def load_neighbor_rows(db_session: Session) -> Dict[int, Tuple[List[int], List[float], Optional[datetime], str]]:
+    """目前的 movie_neighbors：{tmdb_id: (neighbor_ids, scores, source_updated_at, embedding_version)}"""
+    result = db_session.execute(text("""
+        SELECT tmdb_id, neighbor_ids, scores, source_updated_at, embedding_version
+        FROM movie_neighbors
+    """))
+    return {
+        tmdb_id: (list(neighbor_ids or []), list(scores or []), source_updated_at, embedding_version)
+        for tmdb_id, neighbor_ids, scores, source_updated_at, embedding_version in result
+    }
+
+
+def write_neighbor_rows(
+    db_session: Session,
+    rows: List[Dict],
+    batch_size: int = 500
+) -> None:
+    """UPSERT 鄰居列表（每筆 {tmdb_id, neighbor_ids, scores, embedding_version, source_updated_at}）"""
+    query = text("""
+        INSERT INTO movie_neighbors (tmdb_id, neighbor_ids, scores, embedding_version, source_updated_at, computed_at)
+        VALUES (:tmdb_id, :neighbor_ids, :scores, :embedding_version, :source_updated_at, NOW())
+        ON CONFLICT (tmdb_id)
+        DO UPDATE SET
+            neighbor_ids = EXCLUDED.neighbor_ids,
+            scores = EXCLUDED.scores,
+            embedding_version = EXCLUDED.embedding_version,
+            source_updated_at = EXCLUDED.source_updated_at,
+            computed_at = NOW()
+    """)
+    for start in range(0, len(rows), batch_size):
+        db_session.execute(query, rows[start:start + batch_size])
+        db_session.commit()
+
+
+def delete_neighbor_rows(db_session: Session, tmdb_ids: Sequence[int]) -> None:
+    """刪除已沒有向量的電影的鄰居列表"""
+    if not tmdb_ids:
+        return
+    db_session.execute(
+        text("DELETE FROM movie_neighbors WHERE tmdb_id = ANY(:ids)"),
+        {"ids": [int(i) for i in tmdb_ids]}
+    )
+    db_session.commit()
+
+
+def get_similar_movie_ids(
+    db_session: Session,
+    tmdb_id: int,
+    limit: int = 20
+) -> Optional[List[Tuple[int, float]]]:
+    """
+    讀取預先計算的相似電影（主鍵查詢一列）
+
+    Returns:
+        [(neighbor_tmdb_id, score), ...]（依相似度降序）；尚未計算時返回 None
+    """
+    row = db_session.execute(
+        text("SELECT neighbor_ids, scores FROM movie_neighbors WHERE tmdb_id = :tmdb_id"),
+        {"tmdb_id": tmdb_id}
+    ).fetchone()
+    if row is None:
+        return None
+    neighbor_ids, scores = row
+    return list(zip(neighbor_ids or [], scores or []))[:limit]
+
+
+# ============================================================================
+# 全量 / 增量更新
+# ============================================================================
+
+def refresh_movie_neighbors(
+    db_session: Session,
+    ids: np.ndarray,
+    matrix: np.ndarray,
+    updated_ats: List[Optional[datetime]],
+    embedding_version: str,
+    k: int = 50,
+    block_size: int = 1024,
+    full: bool = False,
+    full_rebuild_ratio: float = 0.3
+) -> Dict[str, int]:
+    """
+    依目前的向量更新 movie_neighbors
+
+    Args:
+        ids / matrix / updated_ats: load_movie_vectors() 的結果
+        embedding_version: 目前的 embedding 模型（不同版本的舊列表視為變更）
+        k: 每部電影保存的鄰居數
+        block_size: 分塊矩陣乘法每塊的列數
+        full: 強制全量重算
+        full_rebuild_ratio: 變更比例超過此值時改為全量重算
+
+    Returns:
+        {"changed": 向量變更的電影數, "recomputed": 整列重算數,
+         "merged": 合併後列表有變動的電影數, "deleted": 刪除的列表數}
+    """
+    n_rows = int(ids.shape[0])
+    row_of = {int(tmdb_id): row for row, tmdb_id in enumerate(ids.tolist())}
+    existing = {} if full else load_neighbor_rows(db_session)
+
+    removed = [tmdb_id for tmdb_id in existing if tmdb_id not in row_of]
+    changed_rows = np.array([
+        row for row, tmdb_id in enumerate(ids.tolist())
+        if tmdb_id not in existing
+        or existing[tmdb_id][3] != embedding_version
+        or existing[tmdb_id][2] != updated_ats[row]
+    ], dtype=np.int64)
+
+    stats = {"changed": int(changed_rows.shape[0]), "recomputed": 0, "merged": 0, "deleted": len(removed)}
+    if full or changed_rows.shape[0] > n_rows * full_rebuild_ratio:
+        recompute_rows = np.arange(n_rows, dtype=np.int64)
+        merge_rows = np.empty(0, dtype=np.int64)
+    else:
+        # 列表含有變更 / 刪除的電影（舊分數失效）或長度不足（k 調大、目錄變大）→ 整列重算
+        stale: Set[int] = {int(ids[row]) for row in changed_rows.tolist()} | set(removed)
+        expected = min(k, n_rows - 1)
+        changed_set = set(changed_rows.tolist())
+        recompute = []
+        merge = []
+        for row, tmdb_id in enumerate(ids.tolist()):
+            if row in changed_set:
+                recompute.append(row)
+                continue
+            neighbor_ids = existing[tmdb_id][0]
+            if len(neighbor_ids) < expected - changed_rows.shape[0] or any(n in stale for n in neighbor_ids):
+                recompute.append(row)
+            elif changed_rows.shape[0]:
+                merge.append(row)
+        recompute_rows = np.array(recompute, dtype=np.int64)
+        merge_rows = np.array(merge, dtype=np.int64)
+
+    output: List[Dict] = []
+
+    def collect(rows: np.ndarray, neighbor_rows: np.ndarray, neighbor_scores: np.ndarray, only_changed: bool) -> int:
+        count = 0
+        for row, nbr_rows, nbr_scores in zip(rows.tolist(), neighbor_rows, neighbor_scores):
+            valid = nbr_rows >= 0
+            neighbor_ids = ids[nbr_rows[valid]].tolist()
+            tmdb_id = int(ids[row])
+            if only_changed and neighbor_ids == existing[tmdb_id][0]:
+                continue
+            output.append({
+                "tmdb_id": tmdb_id,
+                "neighbor_ids": neighbor_ids,
+                "scores": [round(float(s), 6) for s in nbr_scores[valid]],
+                "embedding_version": embedding_version,
+                "source_updated_at": updated_ats[row],
+            })
+            count += 1
+        return count
+
+    if recompute_rows.shape[0]:
+        neighbor_rows, neighbor_scores = top_k_neighbors(matrix, recompute_rows, k, block_size)
+        stats["recomputed"] = collect(recompute_rows, neighbor_rows, neighbor_scores, only_changed=False)
+
+    if merge_rows.shape[0]:
+        old_rows = np.full((merge_rows.shape[0], k), -1, dtype=np.int64)
+        old_scores = np.full((merge_rows.shape[0], k), -np.inf, dtype=np.float32)
+        for i, row in enumerate(merge_rows.tolist()):
+            neighbor_ids, scores, _, _ = existing[int(ids[row])]
+            count = min(len(neighbor_ids), k)
+            old_rows[i, :count] = [row_of[n] for n in neighbor_ids[:count]]
+            old_scores[i, :count] = scores[:count]
+        neighbor_rows, neighbor_scores = merge_neighbors(
+            matrix, merge_rows, old_rows, old_scores, changed_rows, block_size
+        )
+        stats["merged"] = collect(merge_rows, neighbor_rows, neighbor_scores, only_changed=True)
+
+    write_neighbor_rows(db_session, output)
+    delete_neighbor_rows(db_session, removed)
+    return stats
@@ -82,6 +82,178 @@ PHASE36_CONFIG = {
         # 是否啟用多樣性機制（Phase 3.6 暫不使用，保留給未來）
         "enable_diversity": False,
         "diversity_weight": 0.3,
+        
+        # Top K 搜索引擎：
+        # - "exact"：掃描全部向量（電影數少時最快，召回率 100%）
+        # - "ivf"：IVF 近似搜索，只掃描最接近的 nprobe 個群（ann_index.py）
+        # - "two_stage"：前綴維度矩陣粗篩全庫 → 完整維度重算 shortlist
+        # 調參：python tools/benchmark_vector_search.py（exact vs IVF 召回率報告）
+        "engine": "exact",
+        
+        # IVF 群數（None → 約 4·√N）與每次查詢探測的群數（越大召回率越高、越慢）
+        "ivf_nlist": None,
+        "ivf_nprobe": 32,
+        
+        # 電影數低於此值時不建立 IVF（精確搜索已經夠快）
+        "ivf_min_rows": 20000,
+        
+        # k-means 訓練：迭代次數與取樣列數
+        "ivf_train_iterations": 10,
+        "ivf_train_sample": 100000,
+        
+        # two_stage：粗篩使用的前綴維度（1536 → 256，每次查詢掃描的記憶體約 1/6）
+        "two_stage_prefix_dims": 256,
+        
+        # two_stage：shortlist 大小 = max(top_k × factor, min)，以完整維度重新計分
+        "two_stage_shortlist_factor": 8,
+        "two_stage_min_shortlist": 1000,
+    },
+    
+    # ========================================================================
+    # 向量索引（vector_index.py）增量更新配置
+    # ========================================================================
+    "vector_index": {
+        # 背景輪詢 movie_vectors.updated_at > watermark 的間隔（秒）
+        "refresh_interval_seconds": 5,
+        
+        # 每 N 次輪詢比對一次全部 tmdb_id，移除因 movies cascade 刪除的向量
+        "deletion_sync_every": 12,
+        
+        # watermark 往回多看的秒數（涵蓋提交較晚的交易）
+        "refresh_overlap_seconds": 30,
+        
+        # Delta + 已刪除列超過 Base 的比例時合併
+        "max_delta_ratio": 0.2,
+    },
+    
+    # ========================================================================
+    # movie_vectors 的 embedding 儲存格式（embedding_codec.py）
+    # ========================================================================
+    "embedding_storage": {
+        # embedding_bin 的格式：'f4'（float32，零拷貝讀取）或 'f2'（float16，體積減半）
+        "binary_dtype": "f4",
+        
+        # 是否同時寫入舊的 JSONB 欄位（所有讀取端都改讀 embedding_bin 後可關閉）
+        "write_json": True,
+    },
+    
+    # ========================================================================
+    # 相似電影表 movie_neighbors（movie_neighbors.py / tools/build_movie_neighbors.py）
+    # ========================================================================
+    "movie_neighbors": {
+        # 每部電影保存的鄰居數（GET /api/movies/{tmdb_id}/similar 的 limit 上限）
+        "k": 50,
+        
+        # 分塊矩陣乘法每塊的列數（每塊分數矩陣 block_size × N × 4 bytes）
+        "block_size": 1024,
+        
+        # 增量更新時，變更的電影超過全庫此比例就改為全量重算
+        "full_rebuild_ratio": 0.3,
+    },
+    
+    # ========================================================================
+    # 個人化推薦：使用者品味向量（user_taste.py）
+    # ========================================================================
+    "personalization": {
+        # 品味向量與查詢 Embedding 的混合比例（0 = 只用查詢，1 = 只用品味）
+        "taste_weight": 0.3,
+        
+        # 每部 Watchlist 電影的權重
+        "watchlist_weight": 1.0,
+        
+        # Top10 電影的基礎權重：× (11 - rank) / 10（第 1 名 100%，第 10 名 10%）
+        "top10_weight": 2.0,
+        
+        # rating_by_user 的滿分（權重再 × rating / rating_scale；未評分視為滿分）
+        "rating_scale": 10.0,
+        
+        # 個人化模式排除已加入 Watchlist / Top10 的電影
+        "exclude_saved": True,
+    },
+    
+    # ========================================================================
+    # 非同步 Embedding 客戶端（AsyncOpenAI，embedding_service.py）
+    # ========================================================================
+    "embedding_client": {
+        # 單次 API 呼叫逾時（秒）
+        "timeout_seconds": 10.0,
+        
+        # 每個 worker 同時進行中的 embedding 請求上限
+        "max_concurrency": 16,
+        
+        # 共用連線池大小
+        "max_connections": 32,
+        "max_keepalive_connections": 16,
+        
+        # SDK 內建重試次數
+        "max_retries": 2,
+    },
+    
+    # ========================================================================
+    # 查詢 Embedding 快取（query_embedding_cache.py）
+    # ========================================================================
+    "query_embedding_cache": {
+        # L1 進程內 LRU 容量與 TTL（秒）
+        "max_size": 2048,
+        "ttl_seconds": 86400,
+        
+        # L2 Postgres query_embeddings 表（重啟後保留、多 worker 共用）
+        "use_db": True,
+        
+        # L2 命中的 hit_count / last_used_at 批次寫回：累積 N 個 key 或經過 N 秒
+        "touch_flush_size": 256,
+        "touch_flush_seconds": 60,
+    },
+    
+    # ========================================================================
+    # Mood-only 模板的預先計算 Embedding（mood_template_embeddings.py）
+    # ========================================================================
+    "mood_templates": {
+        # tools/build_mood_template_embeddings.py 預設列舉的最多標籤數：
+        # 1-2 個標籤列舉全部詞彙的有序組合；3 個以上標籤（模板與順序無關）只列舉
+        # 前端 Mood Labels 的組合。超過此數量、或 3 個以上且含英文 mood tag 的
+        # Mood-only 請求仍會呼叫一次 Embedding API（之後由查詢快取命中）
+        "max_labels": 3,
+        
+        # artifact 不存在或版本不符時，每隔 N 秒檢查 manifest 是否更新（部署後建置不需重啟）
+        "reload_interval_seconds": 60,
+    },
+    
+    # ========================================================================
+    # 排序後候選快取（ranked_candidate_cache.py）
+    # ========================================================================
+    "ranked_candidate_cache": {
+        # Step 1-6 的結果（排序後的候選）可重用，「再抽一次」只重跑 Step 7 的隨機選取
+        "enabled": True,
+        
+        # 進程內 LRU 容量與 TTL（秒）；索引或 movies 更新時 key 自動改變
+        "max_size": 512,
+        "ttl_seconds": 600,
+    },
+    
+    # ========================================================================
+    # 進行中請求合併（singleflight.py）
+    # ========================================================================
+    "singleflight": {
+        # 相同輸入的並發請求共用一次 Step 2-6 計算（Embedding 呼叫 + 全庫掃描），
+        # 各自只執行 Step 7 的隨機選取；個人化請求不合併
+        "enabled": True,
+    },
+    
+    # ========================================================================
+    # 推薦 Session（recommendation_sessions.py）
+    # ========================================================================
+    "recommendation_sessions": {
+        # /movies 回傳 session_id，GET /sessions/{id}?cursor= 依排序載入更多（不重新計算）
+        "enabled": True,
+        
+        # 進程內 LRU 容量與 TTL（秒）
+        "max_size": 1024,
+        "ttl_seconds": 1800,
+        
+        # 每頁預設數量與上限
+        "page_size": 10,
+        "max_page_size": 50,
     },
     
     # ========================================================================
@@ -112,8 +284,9 @@ PHASE36_CONFIG = {
     # 調試與日誌
     # ========================================================================
     "debug": {
-        # 是否打印詳細日誌
-        "verbose": True,
+        # 推薦管線 logger（app.recommend）的等級；環境變數 RECOMMEND_LOG_LEVEL 優先
+        # DEBUG: 打印每個步驟的詳細日誌（原 verbose）；INFO 以上: 停用，熱路徑不格式化任何字串
+        "log_level": "INFO",
         
         # 是否打印每個階段的候選數
         "print_candidate_counts": True,
@@ -121,6 +294,14 @@ PHASE36_CONFIG = {
         # 是否打印象限分佈統計
         "print_quadrant_stats": True,
     },
+    
+    # ========================================================================
+    # 階段計時（見 pipeline_trace.py）
+    # ========================================================================
+    "tracing": {
+        # /api/recommend/v2/movies 是否返回 Server-Timing header（各階段耗時）
+        "server_timing_header": True,
+    },
 }
 
 
@@ -173,6 +354,7 @@ def update_config(key_path: str, new_value):
         >>> get_config("quadrant_thresholds.high_embedding")
         0.65
     """
+    global _config_generation
     keys = key_path.split(".")
     current = PHASE36_CONFIG
     
@@ -182,6 +364,16 @@ def update_config(key_path: str, new_value):
         current = current[key]
     
     current[keys[-1]] = new_value
+    _config_generation += 1
+
+
+# update_config 每次呼叫遞增；依配置內容計算的結果（如 ranked_candidate_cache 的配置指紋）以此判斷是否失效
+_config_generation = 0
+
+
+def config_generation() -> int:
+    """配置版本（運行時調整必須經過 update_config 才會遞增）"""
+    return _config_generation
 
 
 def print_config():
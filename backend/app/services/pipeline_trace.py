@@ -0,0 +1,179 @@
+# app/services/pipeline_trace.py
+"""
+推薦管線的階段計時與分級 log
+
+- span(stage)：計時一個階段。耗時累計到 stage_histograms，若目前請求有 Trace
+  （trace_request()，以 contextvar 傳遞，不需層層傳參數）也一併記錄
+- Trace.server_timing()：轉為 Server-Timing header，瀏覽器 DevTools 可直接顯示各階段耗時
+- stage_histograms：每個階段的延遲直方圖（固定 bucket，/api/recommend/v2/stats 顯示）
+- recommend_logger：取代 print 的分級 logger（app.recommend）。步驟細節為 DEBUG，
+  呼叫端先以 debug_enabled() 檢查再格式化字串，停用時每個請求只有一次等級比較
+"""
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.services.phase36_config import PHASE36_CONFIG
+
+# Server-Timing 的 metric 名稱 → 說明（也是直方圖的階段名稱）
+STAGE_DESCRIPTIONS = {
+    "query_gen": "Step 1 query generation",
+    "embed": "Step 2 query embedding",
+    "search": "Step 2 vector scoring",
+    "fetch": "Step 2 catalog fetch",
+    "filter": "Step 3 feature filtering",
+    "rank": "Step 4-6 classification, scoring, sorting",
+    "select": "Step 7 selection and formatting",
+    "total": "Total",
+}
+
+# 直方圖 bucket 上界（毫秒），最後一個 bucket 為 +Inf
+BUCKET_BOUNDS_MS = (0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# ============================================================================
+# 分級 logger
+# ============================================================================
+
+recommend_logger = logging.getLogger("app.recommend")
+
+
+def _configure_recommend_logger() -> None:
+    """輸出格式與原本的 print 相同（只有訊息本身），不往 root logger 傳遞"""
+    if not recommend_logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        recommend_logger.addHandler(handler)
+        recommend_logger.propagate = False
+    level = os.getenv("RECOMMEND_LOG_LEVEL") or PHASE36_CONFIG.get("debug", {}).get("log_level", "INFO")
+    recommend_logger.setLevel(str(level).upper())
+
+
+_configure_recommend_logger()
+
+
+def debug_enabled() -> bool:
+    """是否輸出步驟細節（DEBUG）；請求開始時取一次，之後以 if verbose: 檢查"""
+    return recommend_logger.isEnabledFor(logging.DEBUG)
+
+
+# ============================================================================
+# 延遲直方圖
+# ============================================================================
+
+class StageHistograms:
+    """每個階段一組固定 bucket 的計數（執行緒安全；記錄為 O(log buckets)）"""
+
+    def __init__(self, bounds_ms=BUCKET_BOUNDS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self._lock = threading.Lock()
+        # stage → [bucket 計數, 次數, 總耗時, 最大耗時]
+        self._stages: Dict[str, list] = {}
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        bucket = bisect.bisect_left(self.bounds_ms, duration_ms)
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [[0] * (len(self.bounds_ms) + 1), 0, 0.0, 0.0]
+            entry[0][bucket] += 1
+            entry[1] += 1
+            entry[2] += duration_ms
+            entry[3] = max(entry[3], duration_ms)
+
+    def _quantile(self, counts: List[int], total: int, max_ms: float, q: float) -> float:
+        """q 分位數的估計值（所在 bucket 的上界；落在 +Inf bucket 時為最大耗時）"""
+        target = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            cumulative += count
+            if count and cumulative >= target:
+                return round(min(self.bounds_ms[i], max_ms) if i < len(self.bounds_ms) else max_ms, 3)
+        return round(max_ms, 3)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {stage: (list(e[0]), e[1], e[2], e[3]) for stage, e in self._stages.items()}
+
+        labels = [f"le_{bound:g}ms" for bound in self.bounds_ms] + ["le_inf"]
+        stats = {}
+        for stage, (counts, total, sum_ms, max_ms) in snapshot.items():
+            stats[stage] = {
+                "count": total,
+                "mean_ms": round(sum_ms / total, 3) if total else 0.0,
+                "max_ms": round(max_ms, 3),
+                "p50_ms": self._quantile(counts, total, max_ms, 0.50),
+                "p95_ms": self._quantile(counts, total, max_ms, 0.95),
+                "p99_ms": self._quantile(counts, total, max_ms, 0.99),
+                "buckets": {label: count for label, count in zip(labels, counts) if count},
+            }
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+stage_histograms = StageHistograms()
+
+
+# ============================================================================
+# 請求內的 Trace / Span
+# ============================================================================
+
+class Trace:
+    """一個請求內各階段的耗時（同名階段累加，例如批次請求的多次 select）"""
+    __slots__ = ("durations_ms",)
+
+    def __init__(self):
+        self.durations_ms: Dict[str, float] = {}
+
+    def add(self, stage: str, duration_ms: float) -> None:
+        self.durations_ms[stage] = self.durations_ms.get(stage, 0.0) + duration_ms
+
+    def server_timing(self) -> str:
+        """Server-Timing header 值：query_gen;dur=0.4;desc="Step 1 query generation", ..."""
+        return ", ".join(
+            f'{stage};dur={duration_ms:.2f};desc="{STAGE_DESCRIPTIONS.get(stage, stage)}"'
+            for stage, duration_ms in self.durations_ms.items()
+        )
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "recommend_trace", default=None
+)
+
+
+@contextmanager
+def trace_request() -> Iterator[Trace]:
+    """
+    在此區塊內的 span 都記錄到返回的 Trace
+
+    結束時還原 contextvar：keep-alive 連線上的下一個請求不會沿用這個 Trace。
+    """
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """計時一個階段（例外時也記錄）"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        stage_histograms.observe(stage, duration_ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, duration_ms)
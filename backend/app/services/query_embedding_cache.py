@@ -0,0 +1,207 @@
+# app/services/query_embedding_cache.py
+"""
+查詢 Embedding 兩層快取
+
+推薦請求的查詢文本大量重複（特別是 generate_mood_template 產生的 Mood-only 模板），
+每次都呼叫 OpenAI API 會多花 200–600 ms。
+
+兩層結構：
+- L1: 進程內 LRU + TTL（lru_cache.LRUTTLCache）
+- L2: Postgres query_embeddings 表（重啟後保留、多個 worker 共用）
+
+Key = sha256(EMBEDDING_MODEL + 正規化後的查詢文本)，換模型時自動失效。
+
+L2 讀取是單純的 SELECT（不鎖列、不寫 WAL）；hit_count / last_used_at 只用於淘汰舊項目，
+命中先在記憶體中累計，累積 touch_flush_size 個 key 或經過 touch_flush_seconds 後
+才以一次批次 UPDATE 寫回。
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from app.services.lru_cache import LRUTTLCache
+from app.services.pipeline_trace import recommend_logger as logger
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query_text(query_text: str) -> str:
+    """正規化查詢文本：NFKC（全形→半形）、合併空白、去頭尾空白"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", query_text or "")).strip()
+
+
+def make_cache_key(normalized_text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalized_text}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """L1 記憶體 + L2 Postgres 的查詢 embedding 快取"""
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        ttl_seconds: float = 24 * 3600,
+        use_db: bool = True,
+        touch_flush_size: int = 256,
+        touch_flush_seconds: float = 60.0
+    ):
+        self.memory = LRUTTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.use_db = use_db
+        self.db_hits = 0
+        self.db_misses = 0
+        self.db_errors = 0
+
+        # L2 命中尚未寫回的 key → 次數
+        self.touch_flush_size = touch_flush_size
+        self.touch_flush_seconds = touch_flush_seconds
+        self._pending_touches: Dict[str, int] = {}
+        self._touch_lock = threading.Lock()
+        self._last_touch_flush = time.monotonic()
+
+    def get(self, normalized_text: str, model: str) -> Optional[List[float]]:
+        """依序查 L1 → L2；L2 命中時回填 L1"""
+        embedding = self.memory_get(normalized_text, model)
+        if embedding is not None:
+            return embedding
+        return self.db_get(normalized_text, model)
+
+    def memory_get(self, normalized_text: str, model: str) -> Optional[List[float]]:
+        """只查 L1（不碰 DB，可在 event loop 中直接呼叫）"""
+        return self.memory.get(make_cache_key(normalized_text, model))
+
+    def db_get(self, normalized_text: str, model: str) -> Optional[List[float]]:
+        """只查 L2，命中時回填 L1（同步 DB 查詢，async 呼叫端請放到 thread）"""
+        if not self.use_db:
+            return None
+
+        key = make_cache_key(normalized_text, model)
+        embedding = self._db_get(key)
+        if embedding is None:
+            self.db_misses += 1
+            return None
+
+        self.db_hits += 1
+        self.memory.set(key, embedding)
+        self._record_touch(key)
+        return embedding
+
+    def put(self, normalized_text: str, model: str, embedding: List[float]) -> None:
+        """寫入 L1 與 L2（L2 失敗不影響請求）"""
+        key = make_cache_key(normalized_text, model)
+        self.memory.set(key, embedding)
+        if self.use_db:
+            self._db_put(key, normalized_text, model, embedding)
+
+    def stats(self) -> Dict[str, object]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + self.db_hits
+        return {
+            "memory": memory,
+            "db": {
+                "enabled": self.use_db,
+                "hits": self.db_hits,
+                "misses": self.db_misses,
+                "errors": self.db_errors,
+                "pending_touches": len(self._pending_touches),
+            },
+            "hits": hits,
+            "misses": self.db_misses if self.use_db else memory["misses"],
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ------------------------------------------------------------------------
+    # L2: Postgres
+    # ------------------------------------------------------------------------
+
+    def _db_get(self, key: str) -> Optional[List[float]]:
+        try:
+            from db.database import SessionLocal
+            with SessionLocal() as db:
+                row = db.execute(text("""
+                    SELECT embedding FROM query_embeddings WHERE cache_key = :key
+                """), {"key": key}).first()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[QueryEmbeddingCache] 讀取 query_embeddings 失敗: {e}")
+            return None
+
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype="<f4").tolist()
+
+    def _record_touch(self, key: str) -> None:
+        """累計一次 L2 命中；達到數量或時間門檻時批次寫回"""
+        with self._touch_lock:
+            self._pending_touches[key] = self._pending_touches.get(key, 0) + 1
+            due = (
+                len(self._pending_touches) >= self.touch_flush_size
+                or time.monotonic() - self._last_touch_flush >= self.touch_flush_seconds
+            )
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self) -> None:
+        """把累計的命中一次寫回 hit_count / last_used_at（同步 DB 查詢）"""
+        with self._touch_lock:
+            touches, self._pending_touches = self._pending_touches, {}
+            self._last_touch_flush = time.monotonic()
+        if not touches:
+            return
+
+        # key 排序後更新，並發的 worker 以相同順序鎖列，避免死結
+        keys = sorted(touches)
+        try:
+            from db.database import SessionLocal
+            with SessionLocal() as db:
+                db.execute(text("""
+                    UPDATE query_embeddings AS q
+                    SET hit_count = q.hit_count + t.hits, last_used_at = now()
+                    FROM unnest(CAST(:keys AS text[]), CAST(:hits AS integer[])) AS t(cache_key, hits)
+                    WHERE q.cache_key = t.cache_key
+                """), {"keys": keys, "hits": [touches[key] for key in keys]})
+                db.commit()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[QueryEmbeddingCache] 更新 query_embeddings 使用紀錄失敗: {e}")
+
+    def _db_put(self, key: str, normalized_text: str, model: str, embedding: List[float]) -> None:
+        try:
+            from db.database import SessionLocal
+            with SessionLocal() as db:
+                db.execute(text("""
+                    INSERT INTO query_embeddings (cache_key, model, query_text, embedding)
+                    VALUES (:key, :model, :query_text, :embedding)
+                    ON CONFLICT (cache_key) DO NOTHING
+                """), {
+                    "key": key,
+                    "model": model,
+                    "query_text": normalized_text,
+                    "embedding": np.asarray(embedding, dtype="<f4").tobytes(),
+                })
+                db.commit()
+        except Exception as e:
+            self.db_errors += 1
+            logger.warning(f"[QueryEmbeddingCache] 寫入 query_embeddings 失敗: {e}")
+
+
+def _build_default_cache() -> QueryEmbeddingCache:
+    from app.services.phase36_config import PHASE36_CONFIG
+    cfg = PHASE36_CONFIG.get("query_embedding_cache", {})
+    return QueryEmbeddingCache(
+        max_size=cfg.get("max_size", 2048),
+        ttl_seconds=cfg.get("ttl_seconds", 86400),
+        use_db=cfg.get("use_db", True),
+        touch_flush_size=cfg.get("touch_flush_size", 256),
+        touch_flush_seconds=cfg.get("touch_flush_seconds", 60),
+    )
+
+
+# 進程內單例
+query_embedding_cache = _build_default_cache()
@@ -0,0 +1,98 @@
+# app/services/ranked_candidate_cache.py
+"""
+排序後候選快取（Step 1-6 的結果）
+
+recommend_movies_embedding_first 的 Step 7 刻意在前 random_pool_size 名中隨機選取，
+使用者常按「再抽一次」重送相同的查詢；Step 1-6（查詢生成、向量搜索、Feature Filtering、
+三象限分類、評分、排序）在輸入、配置、索引都相同時結果固定，可以直接重用。
+
+Key（全部正規化，同義的請求共用一項）：
+- 查詢文本（normalize_query_text 之後；已涵蓋 natural_query 與 Mood 順序）
+- mood_labels / keywords / genres / exclude_genres / year_ranges（排序後）、year_range、min_rating
+- 配置指紋（PHASE36_CONFIG 的 sha1，配置改動即失效）：每個配置 dict 只計算一次，
+  update_config 遞增 config_generation 後重新計算
+- 索引版本（index.generation, index.version, metadata.watermark）：重新載入、向量或 movies 更新後自動失效
+
+Value 為排序後候選的 tuple，視為唯讀：Step 7 選中的電影會先複製再補上詳細欄位。
+個人化請求（user_id）不使用快取。
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.lru_cache import LRUTTLCache
+from app.services.phase36_config import config_generation
+from app.services.query_embedding_cache import normalize_query_text
+
+# (id(cfg), config_generation) → (cfg, 指紋)；保留 cfg 的參照，id 不會被其他 dict 重用
+_fingerprints: Dict[Tuple[int, int], Tuple[Dict, str]] = {}
+_MAX_FINGERPRINTS = 16
+
+
+def config_fingerprint(cfg: Dict) -> str:
+    """配置內容的 sha1（鍵排序後序列化）；同一個 dict 在 update_config 之前只計算一次"""
+    key = (id(cfg), config_generation())
+    cached = _fingerprints.get(key)
+    if cached is not None and cached[0] is cfg:
+        return cached[1]
+    
+    encoded = json.dumps(cfg, sort_keys=True, ensure_ascii=False, default=str)
+    fingerprint = hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+    if len(_fingerprints) >= _MAX_FINGERPRINTS:
+        _fingerprints.clear()
+    _fingerprints[key] = (cfg, fingerprint)
+    return fingerprint
+
+
+def index_token(index) -> Tuple[int, int, Any]:
+    """向量索引的版本識別（索引重新載入、向量更新或 movies 欄位更新時改變）"""
+    metadata = index.metadata
+    return (
+        index.generation,
+        index.version,
+        (metadata.watermark, len(metadata)) if metadata is not None else None,
+    )
+
+
+def _sorted_tuple(values: Optional[Sequence]) -> Tuple:
+    return tuple(sorted(values or []))
+
+
+def ranked_candidates_key(
+    embedding_query_text: str,
+    mood_labels: Optional[List[str]],
+    keywords: Optional[List[str]],
+    genres: Optional[List[str]],
+    exclude_genres: Optional[List[str]],
+    year_range: Optional[Sequence[int]],
+    year_ranges: Optional[List[List[int]]],
+    min_rating: Optional[float],
+    cfg: Dict,
+    index
+) -> Tuple:
+    """建立快取 key（參數順序不影響結果的列表一律排序）"""
+    return (
+        normalize_query_text(embedding_query_text),
+        _sorted_tuple(mood_labels),
+        _sorted_tuple(keywords),
+        _sorted_tuple(genres),
+        _sorted_tuple(exclude_genres),
+        tuple(year_range) if year_range else None,
+        tuple(sorted(tuple(r) for r in year_ranges)) if year_ranges else None,
+        min_rating,
+        config_fingerprint(cfg),
+        index_token(index),
+    )
+
+
+def _build_default_cache() -> LRUTTLCache:
+    from app.services.phase36_config import PHASE36_CONFIG
+    cfg = PHASE36_CONFIG.get("ranked_candidate_cache", {})
+    return LRUTTLCache(
+        max_size=cfg.get("max_size", 512),
+        ttl_seconds=cfg.get("ttl_seconds", 600),
+    )
+
+
+# 進程內單例
+ranked_candidate_cache = _build_default_cache()
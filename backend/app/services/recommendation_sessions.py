@@ -0,0 +1,104 @@
+# app/services/recommendation_sessions.py
+"""
+推薦 Session（「載入更多」分頁）
+
+POST /api/recommend/v2/movies 回傳 session_id：伺服器保留這次請求排序後的候選
+（Step 1-6 的結果）與已回傳的電影，GET /api/recommend/v2/sessions/{id}?cursor=
+依排序往下翻頁，不重新 Embedding、不重新掃描全庫，也不會重複已看過的電影。
+
+- cursor 為排序後候選中的位置：每頁從 cursor 起取 count 部「首頁未回傳」的候選，
+  next_cursor 為下一部的位置（沒有剩餘時為 None）。Session 建立後不再修改，
+  同一個 cursor 重送得到同一頁（客戶端重試安全），並發翻頁也不需加鎖
+- 候選 tuple 與 ranked_candidate_cache 共用（唯讀），每頁選中的電影複製後才補詳細欄位
+- 存放於進程內 LRU + TTL 快取（lru_cache.py）：超過 TTL 或容量時淘汰，
+  多 worker 部署時 Session 只存在於建立它的 worker（需 sticky session）
+- 個人化 Session 只有同一位使用者能讀取
+"""
+import bisect
+import secrets
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.candidate import Candidate
+from app.services.lru_cache import LRUTTLCache
+
+
+class RecommendationSession:
+    """一次推薦請求的排序後候選與首頁已回傳的電影（建立後唯讀）"""
+    __slots__ = ("session_id", "sorted_movies", "user_id", "_positions")
+
+    def __init__(
+        self,
+        session_id: str,
+        sorted_movies: Sequence[Candidate],
+        served_ids: Iterable[int],
+        user_id: Any = None
+    ):
+        self.session_id = session_id
+        self.sorted_movies = sorted_movies
+        self.user_id = user_id
+        served = set(served_ids)
+        # 尚未回傳的候選在排序中的位置（遞增）
+        self._positions = [i for i, movie in enumerate(sorted_movies) if movie.id not in served]
+
+    @property
+    def first_cursor(self) -> Optional[int]:
+        return self._positions[0] if self._positions else None
+
+    def remaining_after(self, cursor: Optional[int]) -> int:
+        """cursor（含）之後尚未回傳的候選數"""
+        if cursor is None:
+            return 0
+        return len(self._positions) - bisect.bisect_left(self._positions, cursor)
+
+    def page(self, cursor: int, count: int) -> Tuple[List[Candidate], Optional[int]]:
+        """從 cursor 起的 count 部候選（未複製）與 next_cursor"""
+        start = bisect.bisect_left(self._positions, cursor)
+        end = start + count
+        movies = [self.sorted_movies[i] for i in self._positions[start:end]]
+        next_cursor = self._positions[end] if end < len(self._positions) else None
+        return movies, next_cursor
+
+
+class RecommendationSessionStore:
+    """Session 的 LRU + TTL 存放"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = 1800):
+        self._sessions = LRUTTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+    def create(
+        self,
+        sorted_movies: Sequence[Candidate],
+        served_ids: Iterable[int],
+        user_id: Any = None
+    ) -> RecommendationSession:
+        session = RecommendationSession(
+            secrets.token_urlsafe(16), tuple(sorted_movies), served_ids, user_id
+        )
+        self._sessions.set(session.session_id, session)
+        return session
+
+    def get(self, session_id: str, user_id: Any = None) -> Optional[RecommendationSession]:
+        """取得 Session；不存在、已過期或不屬於 user_id（個人化 Session）時返回 None"""
+        session = self._sessions.get(session_id)
+        if session is None or (session.user_id is not None and session.user_id != user_id):
+            return None
+        return session
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def stats(self):
+        return self._sessions.stats()
+
+
+def _build_default_store() -> RecommendationSessionStore:
+    from app.services.phase36_config import PHASE36_CONFIG
+    cfg = PHASE36_CONFIG.get("recommendation_sessions", {})
+    return RecommendationSessionStore(
+        max_size=cfg.get("max_size", 1024),
+        ttl_seconds=cfg.get("ttl_seconds", 1800),
+    )
+
+
+# 進程內單例
+recommendation_sessions = _build_default_store()
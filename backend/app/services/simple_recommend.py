@@ -16,12 +16,18 @@ Phase 3.6: Embedding-First 推薦服務
 - docs/phase36-implementation-guide.md
 - app/services/phase36_config.py
 """
+import asyncio
 import os
 import random
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, AsyncIterator, Optional, Sequence, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from app.services.candidate import Candidate
+from app.services.recommendation_sessions import RecommendationSession
+from app.services.pipeline_trace import debug_enabled, recommend_logger as logger, span
+
 # ============================================
 # Phase 3.6: Embedding-First 推薦系統
 # 配置檔案: phase36_config.py
@@ -80,40 +86,92 @@ def calculate_match_ratio(
     - 電影符合: 4 個 moods, 2 個 genres → matched = 6
     - Match Ratio = 6/8 = 0.75 (75%)
     """
-    total_required = 0
+    total_required = len(keywords or []) + len(mood_tags or []) + len(genres or [])
+    if total_required == 0:
+        return 1.0  # 沒有要求時，全部符合
+    
+    genres_zh = [GENRE_EN_TO_ZH.get(g, g) for g in genres or []]
+    return _count_movie_matches(movie, keywords, mood_tags, genres_zh) / total_required
+
+
+def _count_movie_matches(
+    movie: Dict,
+    keywords: List[str],
+    mood_tags: List[str],
+    genres_zh: List[str]
+) -> int:
+    """單部電影符合的要求數（dict 路徑；genres_zh 已轉成 DB 中的類型名稱）"""
     matched = 0
     
     # Keywords 匹配
     if keywords:
-        total_required += len(keywords)
         movie_keywords = movie.get('keywords', []) or []
-        movie_keywords_lower = [k.lower() for k in movie_keywords] if isinstance(movie_keywords, list) else []
-        for kw in keywords:
-            if kw.lower() in movie_keywords_lower:
-                matched += 1
+        movie_keywords_lower = {k.lower() for k in movie_keywords if isinstance(k, str)} if isinstance(movie_keywords, list) else set()
+        matched += sum(1 for kw in keywords if kw.lower() in movie_keywords_lower)
     
     # Mood Tags 匹配
     if mood_tags:
-        total_required += len(mood_tags)
         movie_moods = movie.get('mood_tags', []) or []
-        movie_moods_lower = [m.lower() for m in movie_moods] if isinstance(movie_moods, list) else []
-        for mood in mood_tags:
-            if mood.lower() in movie_moods_lower:
-                matched += 1
+        movie_moods_lower = {m.lower() for m in movie_moods if isinstance(m, str)} if isinstance(movie_moods, list) else set()
+        matched += sum(1 for mood in mood_tags if mood.lower() in movie_moods_lower)
     
     # Genres 匹配
-    if genres:
-        total_required += len(genres)
+    if genres_zh:
         movie_genres = movie.get('genres', []) or []
-        genres_zh = [GENRE_EN_TO_ZH.get(g, g) for g in genres]
-        for genre in genres_zh:
-            if genre in movie_genres:
-                matched += 1
+        matched += sum(1 for genre in genres_zh if genre in movie_genres)
     
-    if total_required == 0:
-        return 1.0  # 沒有要求時，全部符合
+    return matched
+
+
+def count_feature_matches(
+    candidates: List[Dict],
+    keywords: List[str],
+    mood_tags: List[str],
+    genres: List[str]
+) -> np.ndarray:
+    """
+    所有候選符合的要求數（calculate_match_ratio 的向量化版本，一次計算全部候選）
     
-    return matched / total_required
+    優先使用向量索引的 CatalogMetadata：keywords / mood_tags 已在載入時轉小寫並對應成
+    整數 id（CSR），每次請求只需一次 gather + bincount；Metadata 未載入或找不到的候選
+    才逐部以 dict 計算。Metadata 與向量索引一同輪詢更新。
+    """
+    from app.services.vector_index import get_loaded_vector_index
+    
+    matched = np.zeros(len(candidates), dtype=np.float64)
+    if not candidates or not (keywords or mood_tags or genres):
+        return matched
+    
+    genres_zh = [GENRE_EN_TO_ZH.get(g, g) for g in genres or []]
+    found = np.zeros(len(candidates), dtype=bool)
+    
+    index = get_loaded_vector_index()
+    metadata = index.metadata if index is not None else None
+    if metadata is not None:
+        ids = np.fromiter((m["id"] for m in candidates), dtype=np.int64, count=len(candidates))
+        rows, found = metadata.rows_for(ids)
+        counts = metadata.count_feature_matches(rows[found], keywords, mood_tags, genres_zh)
+        if counts is None:
+            found[:] = False
+        else:
+            matched[found] = counts
+    
+    for i in np.flatnonzero(~found).tolist():
+        matched[i] = _count_movie_matches(candidates[i], keywords, mood_tags, genres_zh)
+    return matched
+
+
+def _top_rows(keys: np.ndarray, rows: np.ndarray, limit: int) -> np.ndarray:
+    """
+    rows 中 keys 最大的 limit 列（降序）；argpartition 只對選中的 limit 列排序
+
+    選中的列先依原順序排列再穩定排序，同分時與 list.sort 一樣保留原順序。
+    """
+    if limit <= 0 or rows.shape[0] == 0:
+        return rows[:0]
+    if limit < rows.shape[0]:
+        rows = np.sort(rows[np.argpartition(-keys[rows], limit - 1)[:limit]])
+    return rows[np.argsort(-keys[rows], kind="stable")]
 
 
 async def tiered_feature_filtering(
@@ -126,7 +184,8 @@ async def tiered_feature_filtering(
     year_ranges: List[List[int]] = None,
     min_rating: float = None,
     target_count: int = 150,
-    randomness: float = 0.3
+    randomness: float = 0.3,
+    exclude_ids: List[int] = None
 ) -> List[Dict]:
     """
     Phase 3.6: Tiered Feature Filtering
@@ -149,7 +208,7 @@ async def tiered_feature_filtering(
         - Tier 3 (寬鬆): Match Ratio >= 0% (保底)
     
     🎯 過濾條件:
-        - Hard Filters: exclude_genres, year_range, min_rating（強制過濾）
+        - Hard Filters: exclude_genres, year_range, min_rating, exclude_ids（強制過濾）
         - Soft Filters: keywords, mood_tags, genres（計算 match_ratio）
     
     Args:
@@ -163,6 +222,7 @@ async def tiered_feature_filtering(
         min_rating: 最低評分
         target_count: 目標返回數量（預設 150）
         randomness: 隨機性參數
+        exclude_ids: 排除的 tmdb_id（個人化模式：已收藏的電影）
     
     Returns:
         List[Dict]: 過濾後的候選電影，包含：
@@ -182,14 +242,17 @@ async def tiered_feature_filtering(
         >>> filtered[0]["match_ratio"]  # 0.85
         >>> filtered[0]["embedding_score"]  # 0.82 (preserved)
     """
-    print(f"\n🔧 [Phase 3.6 Feature Filtering] 過濾 Embedding 候選")
-    print(f"   - Input: {len(embedding_candidates)} candidates (from Embedding Search)")
-    print(f"   - Features: {len(keywords)} keywords, {len(mood_tags)} moods, {len(genres)} genres")
-    print(f"   - Target: {target_count} candidates")
-    print(f"{'-'*70}")
+    verbose = debug_enabled()
+    if verbose:
+        logger.debug(f"\n🔧 [Phase 3.6 Feature Filtering] 過濾 Embedding 候選")
+        logger.debug(f"   - Input: {len(embedding_candidates)} candidates (from Embedding Search)")
+        logger.debug(f"   - Features: {len(keywords)} keywords, {len(mood_tags)} moods, {len(genres)} genres")
+        logger.debug(f"   - Target: {target_count} candidates")
+        logger.debug(f"{'-'*70}")
     
     # Step 1: Hard Filters（強制過濾）
-    print(f"\n[1/3] 應用 Hard Filters...")
+    if verbose:
+        logger.debug(f"\n[1/3] 應用 Hard Filters...")
     filtered_candidates = embedding_candidates.copy()
     
     # 過濾：genres（用戶選擇的類型，必須符合）
@@ -208,7 +271,8 @@ async def tiered_feature_filtering(
             m for m in filtered_candidates
             if any(g in m.get("genres", []) for g in genres_simplified)
         ]
-        print(f"   - Genres Filter {genres} → {genres_simplified}: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
+        if verbose:
+            logger.debug(f"   - Genres Filter {genres} → {genres_simplified}: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
     
     # 過濾：exclude_genres
     if exclude_genres:
@@ -217,7 +281,8 @@ async def tiered_feature_filtering(
             m for m in filtered_candidates
             if not any(g in m.get("genres", []) for g in exclude_genres)
         ]
-        print(f"   - Exclude Genres: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
+        if verbose:
+            logger.debug(f"   - Exclude Genres: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
     
     # 過濾：year_range
     if year_range:
@@ -227,7 +292,8 @@ async def tiered_feature_filtering(
             m for m in filtered_candidates
             if _check_year_in_range(m.get("release_date"), min_year, max_year)
         ]
-        print(f"   - Year Range [{min_year}, {max_year}]: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
+        if verbose:
+            logger.debug(f"   - Year Range [{min_year}, {max_year}]: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
     
     # 過濾：year_ranges（多個年份範圍）
     if year_ranges:
@@ -236,7 +302,8 @@ async def tiered_feature_filtering(
             m for m in filtered_candidates
             if any(_check_year_in_range(m.get("release_date"), yr[0], yr[1]) for yr in year_ranges)
         ]
-        print(f"   - Year Ranges: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
+        if verbose:
+            logger.debug(f"   - Year Ranges: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
     
     # 過濾：min_rating
     if min_rating is not None:
@@ -245,69 +312,80 @@ async def tiered_feature_filtering(
             m for m in filtered_candidates
             if m.get("vote_average", 0) >= min_rating
         ]
-        print(f"   - Min Rating >= {min_rating}: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
+        if verbose:
+            logger.debug(f"   - Min Rating >= {min_rating}: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
     
-    print(f"   ✓ Hard Filters 完成: {len(embedding_candidates)} → {len(filtered_candidates)}")
+    # 過濾：exclude_ids（已收藏的電影）
+    if exclude_ids:
+        before_count = len(filtered_candidates)
+        excluded = set(exclude_ids)
+        filtered_candidates = [
+            m for m in filtered_candidates
+            if m.get("id") not in excluded
+        ]
+        if verbose:
+            logger.debug(f"   - Exclude Saved: {before_count} → {len(filtered_candidates)} (-{before_count - len(filtered_candidates)})")
+    
+    if verbose:
+        logger.debug(f"   ✓ Hard Filters 完成: {len(embedding_candidates)} → {len(filtered_candidates)}")
     
     if not filtered_candidates:
-        print(f"   ⚠️  Hard Filters 過濾後無候選，返回空列表")
+        if verbose:
+            logger.debug(f"   ⚠️  Hard Filters 過濾後無候選，返回空列表")
         return []
     
-    # Step 2: 計算 Match Ratio（Soft Filters）
-    print(f"\n[2/3] 計算 Match Ratio...")
-    
-    for movie in filtered_candidates:
-        # 計算 match_ratio（與原 tiered_feature_matching 相同邏輯）
-        movie['match_ratio'] = calculate_match_ratio(
-            movie, keywords, mood_tags, genres
-        )
-        movie['match_count'] = int(movie['match_ratio'] * (len(keywords) + len(mood_tags) + len(genres)))
-        movie['total_features'] = len(keywords) + len(mood_tags) + len(genres)
-    
-    # Step 3: 三層漸進過濾
-    print(f"\n[3/3] 三層漸進過濾...")
-    
-    # Tier 1: Match Ratio >= 80%
-    tier1_results = [m for m in filtered_candidates if m['match_ratio'] >= 0.8]
-    tier1_results.sort(key=lambda x: (x['match_ratio'], x['embedding_score']), reverse=True)
-    
-    print(f"   📍 Tier 1 (>=80%): {len(tier1_results)} candidates")
-    if tier1_results:
-        top = tier1_results[0]
-        print(f"      - Top: {top['title'][:40]:40s} - MR:{top['match_ratio']:.2f}, ES:{top['embedding_score']:.3f}")
+    # Step 2: 計算 Match Ratio（Soft Filters，一次向量化計算全部候選）
+    if verbose:
+        logger.debug(f"\n[2/3] 計算 Match Ratio...")
     
-    if len(tier1_results) >= target_count:
-        results = tier1_results[:target_count]
-        print(f"   🎉 Tier 1 已足夠，返回 {len(results)} candidates")
-        return results
+    total_features = len(keywords) + len(mood_tags) + len(genres)
+    matched = count_feature_matches(filtered_candidates, keywords, mood_tags, genres)
+    ratios = matched / total_features if total_features else np.ones(len(filtered_candidates))
     
-    # Tier 2: Match Ratio >= 50%
-    tier2_results = [m for m in filtered_candidates if 0.5 <= m['match_ratio'] < 0.8]
-    tier2_results.sort(key=lambda x: (x['match_ratio'], x['embedding_score']), reverse=True)
+    for movie, ratio in zip(filtered_candidates, ratios.tolist()):
+        movie['match_ratio'] = ratio
+        movie['match_count'] = int(ratio * total_features)
+        movie['total_features'] = total_features
     
-    print(f"   📍 Tier 2 (50-79%): {len(tier2_results)} candidates")
+    # Step 3: 三層漸進過濾（每層只取還需要的數量，不對整層排序）
+    # - Tier 1/2 依 (match_ratio, embedding_score) 降序，Tier 3 只依 embedding_score
+    if verbose:
+        logger.debug(f"\n[3/3] 三層漸進過濾...")
     
-    combined = tier1_results + tier2_results
-    combined.sort(key=lambda x: (x['match_ratio'], x['embedding_score']), reverse=True)
+    embedding_scores = np.fromiter(
+        (m['embedding_score'] for m in filtered_candidates), dtype=np.float64, count=len(filtered_candidates)
+    )
+    # match 數相同時以 embedding_score 排序（|embedding_score| <= 1，乘 4 保證 match 數優先）
+    tier_keys = matched * 4.0 + embedding_scores
     
-    if len(combined) >= target_count:
-        results = combined[:target_count]
-        print(f"   🎉 Tier 1+2 已足夠，返回 {len(results)} candidates")
-        print(f"      (Tier 1: {len(tier1_results)}, Tier 2: {len(results) - len(tier1_results)})")
-        return results
+    tier1_rows = np.flatnonzero(ratios >= 0.8)
+    tier2_rows = np.flatnonzero((ratios >= 0.5) & (ratios < 0.8))
+    tier3_rows = np.flatnonzero(ratios < 0.5)
     
-    # Tier 3: Match Ratio >= 0% (保底)
-    tier3_results = [m for m in filtered_candidates if m['match_ratio'] < 0.5]
-    tier3_results.sort(key=lambda x: x['embedding_score'], reverse=True)
+    if verbose:
+        logger.debug(f"   📍 Tier 1 (>=80%): {len(tier1_rows)} candidates")
+        logger.debug(f"   📍 Tier 2 (50-79%): {len(tier2_rows)} candidates")
+        logger.debug(f"   📍 Tier 3 (<50%): {len(tier3_rows)} candidates")
+    
+    selected_tier1 = _top_rows(tier_keys, tier1_rows, target_count)
+    selected_tier2 = _top_rows(tier_keys, tier2_rows, target_count - len(selected_tier1))
+    selected_tier3 = _top_rows(
+        embedding_scores, tier3_rows, target_count - len(selected_tier1) - len(selected_tier2)
+    )
     
-    print(f"   📍 Tier 3 (<50%): {len(tier3_results)} candidates")
+    if verbose and len(selected_tier1):
+        top = filtered_candidates[selected_tier1[0]]
+        logger.debug(f"      - Top: {top['title'][:40]:40s} - MR:{top['match_ratio']:.2f}, ES:{top['embedding_score']:.3f}")
     
-    final_results = tier1_results + tier2_results + tier3_results
-    final_results = final_results[:target_count]
+    final_results = [
+        filtered_candidates[i]
+        for i in np.concatenate([selected_tier1, selected_tier2, selected_tier3]).tolist()
+    ]
     
-    print(f"\n   🎉 返回 {len(final_results)} candidates")
-    print(f"      (Tier 1: {len(tier1_results)}, Tier 2: {len(tier2_results)}, Tier 3: {len(final_results) - len(tier1_results) - len(tier2_results)})")
-    print(f"{'-'*70}\n")
+    if verbose:
+        logger.debug(f"\n   🎉 返回 {len(final_results)} candidates")
+        logger.debug(f"      (Tier 1: {len(selected_tier1)}, Tier 2: {len(selected_tier2)}, Tier 3: {len(selected_tier3)})")
+        logger.debug(f"{'-'*70}\n")
     
     return final_results
 
@@ -525,208 +603,147 @@ def sort_by_quadrant_and_embedding(
     return sorted_movies
 
 
-# ============================================
-# Phase 3.5: 四象限混合推薦
-# ============================================
+# ============================================================================
+# Phase 3.6: 推薦流程各步驟（單一查詢 / 批次查詢共用）
+# ============================================================================
 
-async def recommend_movies_embedding_first(
-    natural_query: str = None,
-    mood_labels: List[str] = None,
-    keywords: List[str] = None,
-    genres: List[str] = None,
-    exclude_genres: List[str] = None,
-    year_range: tuple = None,
-    year_ranges: List[List[int]] = None,
-    min_rating: float = None,
-    db_session: Session = None,
-    count: int = 10,
-    config: Dict = None
-) -> List[Dict[str, Any]]:
-    """
-    Phase 3.6: Embedding-First 推薦系統（完整流程）
-    
-    架構流程：
-    1. Query Generation: 生成最佳 Embedding 查詢文本
-       - 情境 1 (NL only): 直接使用自然語言
-       - 情境 2 (Mood only): Relationship-aware Template
-       - 情境 3 (Both): NL 優先，衝突檢測
-    2. Embedding Search: 全庫語義搜索（300 candidates）
-       - 查詢 668 部電影的 embeddings
-       - 計算 Cosine Similarity
-       - 返回 Top 300
-    3. Feature Filtering: 特徵過濾（150 candidates）
-       - Tier 1: Match Ratio >= 80%
-       - Tier 2: Match Ratio 50-79%
-       - Tier 3: Match Ratio < 50%
-    4. 3-Quadrant Classification: 三象限分類
-       - Q1: High Embedding (>=0.60) + High Match (>=0.40) → 完美匹配
-       - Q2: High Embedding (>=0.60) + Low Match (<0.40) → 語義發現
-       - Q4: Low Embedding (<0.60) → 候補
-    5. Score Calculation: 動態權重評分
-       - Q1: E:50% M:20% F:30%
-       - Q2: E:70% M:20% F:10%
-       - Q4: E:30% M:30% F:40%
-    6. Mixed Sorting: 象限優先 + 分數次要排序
-       - Primary: Q1 > Q2 > Q4
-       - Secondary: final_score desc
-    7. Return Top K: 返回前 10 部推薦
-    
-    與 Phase 3.5 的差異：
-    - Primary Engine: Feature Matching → Embedding Search
-    - Secondary Engine: Embedding Reranking → Feature Filtering
-    - Candidates: 150 (Feature) → 300 (Embedding) → 150 (Filtered)
-    - Quadrants: 4 (Q1/Q2/Q3/Q4) → 3 (Q1/Q2/Q4)
-    - Axes: Match Ratio (Y) × Embedding (X) → Embedding (Y) × Match Ratio (X)
-    - Thresholds: 0.50/0.45 → 0.40/0.60
-    
-    Args:
-        natural_query: 自然語言查詢 (例: "難過的時候適合看什麼電影")
-        mood_labels: Mood 標籤列表 (英文，例: ["heartwarming", "uplifting"])
-        keywords: 關鍵詞列表 (英文)
-        genres: 類型列表 (簡體中文，例: ["劇情"])
-        exclude_genres: 排除類型列表
-        year_range: 單一年份範圍 (min, max)
-        year_ranges: 多個年份範圍 [[1990, 1999], [2000, 2009]]
-        min_rating: 最低評分
-        db_session: 資料庫 Session
-        count: 返回數量 (預設 10)
-        config: 自定義配置 (可選，預設使用 phase36_config.PHASE36_CONFIG)
-    
-    Returns:
-        List[Dict]: 推薦電影列表，每部電影包含：
-        - tmdb_id: TMDB ID
-        - title: 電影名稱
-        - overview: 簡介
-        - embedding_score: Embedding 相似度 (0.0-1.0)
-        - match_ratio: Feature 匹配率 (0.0-1.0)
-        - final_score: 綜合評分
-        - quadrant: 象限 (q1_perfect_match | q2_semantic_discovery | q4_fallback)
-        - ... (其他電影資訊)
-    
-    Example:
-        >>> results = await recommend_movies_embedding_first(
-        ...     natural_query="難過的時候適合看什麼電影",
-        ...     mood_labels=["heartwarming", "uplifting"],
-        ...     genres=["劇情"],
-        ...     db_session=session,
-        ...     count=10
-        ... )
-        >>> print(results[0])
-        {
-            "title": "風雲人物",
-            "embedding_score": 0.482,
-            "match_ratio": 0.67,
-            "final_score": 34.45,
-            "quadrant": "q4_fallback"
-        }
-    
-    References:
-        - 決策文檔: docs/phase36-decisions.md
-        - 實現指南: docs/phase36-implementation-guide.md
-        - 配置檔: app/services/phase36_config.py
-    """
-    # 導入依賴
+def _hard_filters(
+    genres: List[str],
+    exclude_genres: List[str],
+    year_range: tuple,
+    year_ranges: List[List[int]],
+    min_rating: float,
+    exclude_ids: List[int] = None
+) -> Dict[str, Any]:
+    """下推到向量搜索的 Hard Filters（與 tiered_feature_filtering 的 Hard Filters 相同）"""
+    return {
+        "genres": genres,
+        "exclude_genres": exclude_genres,
+        "year_range": year_range,
+        "year_ranges": year_ranges,
+        "min_rating": min_rating,
+        "exclude_ids": exclude_ids,
+    }
+
+
+def _generate_query_text(
+    natural_query: str,
+    mood_labels: List[str],
+    verbose: bool
+) -> str:
+    """Step 1: 生成 Embedding 查詢文本"""
+    return _generate_query(natural_query, mood_labels, verbose)["query"]
+
+
+def _generate_query(
+    natural_query: str,
+    mood_labels: List[str],
+    verbose: bool
+) -> Dict[str, Any]:
+    """Step 1: 生成 Embedding 查詢（query / scenario / conflict_detected，見 generate_embedding_query）"""
     from app.services.embedding_query_generator import generate_embedding_query
-    from app.services.embedding_service import embedding_similarity_search
-    from app.services.phase36_config import PHASE36_CONFIG
-    
-    # 使用配置
-    cfg = config or PHASE36_CONFIG
-    verbose = cfg.get("debug", {}).get("verbose", True)
-    
-    if verbose:
-        print("\n" + "🎬"*35)
-        print("Phase 3.6: Embedding-First Recommendation System")
-        print("🎬"*35)
     
     # ========================================================================
     # Step 1: Query Generation
     # ========================================================================
     if verbose:
-        print(f"\n[Step 1/7] Embedding Query Generation")
-        print(f"   - Natural Query: {natural_query or 'None'}")
-        print(f"   - Mood Labels: {mood_labels or []}")
-    
-    query_result = generate_embedding_query(
-        natural_query=natural_query,
-        mood_labels=mood_labels or []
-    )
+        logger.debug(f"\n[Step 1/7] Embedding Query Generation")
+        logger.debug(f"   - Natural Query: {natural_query or 'None'}")
+        logger.debug(f"   - Mood Labels: {mood_labels or []}")
+    
+    with span("query_gen"):
+        query_result = generate_embedding_query(
+            natural_query=natural_query,
+            mood_labels=mood_labels or []
+        )
     
     embedding_query_text = query_result["query"]
-    has_conflict = query_result.get("conflict", False)
+    has_conflict = query_result.get("conflict_detected", False)
     
     if verbose:
-        print(f"   ✓ Generated Query: '{embedding_query_text[:80]}...'")
+        logger.debug(f"   ✓ Generated Query: '{embedding_query_text[:80]}...'")
         if has_conflict:
-            print(f"   ⚠️  Conflict Detected: NL vs Mood sentiment mismatch")
-    
-    # ========================================================================
-    # Step 2: Embedding Similarity Search (全庫搜索)
-    # ========================================================================
-    if verbose:
-        print(f"\n[Step 2/7] Embedding Similarity Search")
+            logger.debug(f"   ⚠️  Conflict Detected: NL vs Mood sentiment mismatch")
     
-    embedding_top_k = cfg.get("candidate_counts", {}).get("embedding_top_k", 300)
-    min_similarity = cfg.get("embedding_search", {}).get("min_similarity", 0.0)
-    
-    embedding_candidates = await embedding_similarity_search(
-        query_text=embedding_query_text,
-        db_session=db_session,
-        top_k=embedding_top_k,
-        min_similarity=min_similarity
-    )
+    return query_result
+
+
+async def _rank_candidates(
+    embedding_candidates: List[Candidate],
+    keywords: List[str],
+    mood_labels: List[str],
+    genres: List[str],
+    exclude_genres: List[str],
+    year_range: tuple,
+    year_ranges: List[List[int]],
+    min_rating: float,
+    cfg: Dict,
+    verbose: bool,
+    exclude_ids: List[int] = None
+) -> List[Candidate]:
+    """
+    Step 3-6: Embedding 候選 → 過濾、分類、評分後排序的候選（結果固定，可快取）
     
-    if verbose:
-        print(f"   ✓ Retrieved {len(embedding_candidates)} candidates")
-    
-    if not embedding_candidates:
-        if verbose:
-            print(f"   ⚠️  No candidates found, returning empty list")
-        return []
+    單一查詢與批次查詢共用；候選會被寫入 match_ratio / quadrant / final_score。
     
+    直接在 event loop 中執行（不放到 thread）：只處理約 300 個候選的集合運算與
+    小型 NumPy 排序，合計約 1 ms（tools/benchmark_recommender.py 的 filter / classify），
+    與 asyncio.to_thread 的排程成本相當。
+    """
     # ========================================================================
     # Step 3: Feature Filtering (漸進式過濾)
     # ========================================================================
     if verbose:
-        print(f"\n[Step 3/7] Tiered Feature Filtering")
+        logger.debug(f"\n[Step 3/7] Tiered Feature Filtering")
     
     feature_filter_k = cfg.get("candidate_counts", {}).get("feature_filter_k", 150)
     randomness = cfg.get("feature_filtering", {}).get("randomness", 0.3)
     
-    filtered_candidates = await tiered_feature_filtering(
-        embedding_candidates=embedding_candidates,
-        keywords=keywords or [],
-        mood_tags=mood_labels or [],
-        genres=genres or [],
-        exclude_genres=exclude_genres,
-        year_range=year_range,
-        year_ranges=year_ranges,
-        min_rating=min_rating,
-        target_count=feature_filter_k,
-        randomness=randomness
-    )
+    with span("filter"):
+        filtered_candidates = await tiered_feature_filtering(
+            embedding_candidates=embedding_candidates,
+            keywords=keywords or [],
+            mood_tags=mood_labels or [],
+            genres=genres or [],
+            exclude_genres=exclude_genres,
+            year_range=year_range,
+            year_ranges=year_ranges,
+            min_rating=min_rating,
+            target_count=feature_filter_k,
+            randomness=randomness,
+            exclude_ids=exclude_ids
+        )
     
     if verbose:
-        print(f"   ✓ Filtered to {len(filtered_candidates)} candidates")
+        logger.debug(f"   ✓ Filtered to {len(filtered_candidates)} candidates")
     
     if not filtered_candidates:
         if verbose:
-            print(f"   ⚠️  All candidates filtered out, returning empty list")
+            logger.debug(f"   ⚠️  All candidates filtered out, returning empty list")
         return []
     
+    with span("rank"):
+        return _classify_score_and_sort(filtered_candidates, cfg, verbose)
+
+
+def _classify_score_and_sort(
+    filtered_candidates: List[Candidate],
+    cfg: Dict,
+    verbose: bool
+) -> List[Candidate]:
+    """Step 4-6: 三象限分類 → 動態權重評分 → 象限優先排序"""
     # ========================================================================
     # Step 4: 3-Quadrant Classification
     # ========================================================================
     if verbose:
-        print(f"\n[Step 4/7] 3-Quadrant Classification")
+        logger.debug(f"\n[Step 4/7] 3-Quadrant Classification")
     
     for movie in filtered_candidates:
-        quadrant = classify_to_3quadrant(
+        movie.quadrant = classify_to_3quadrant(
             movie=movie,
-            embedding_score=movie["embedding_score"],
+            embedding_score=movie.embedding_score,
             config=cfg
         )
-        movie["quadrant"] = quadrant
     
     # 統計象限分佈
     if verbose and cfg.get("debug", {}).get("print_quadrant_stats", True):
@@ -736,36 +753,35 @@ async def recommend_movies_embedding_first(
             "q4_fallback": 0
         }
         for movie in filtered_candidates:
-            quadrant_counts[movie["quadrant"]] += 1
+            quadrant_counts[movie.quadrant] += 1
         
-        print(f"   ✓ Quadrant Distribution:")
-        print(f"      - Q1 (Perfect Match): {quadrant_counts['q1_perfect_match']}")
-        print(f"      - Q2 (Semantic Discovery): {quadrant_counts['q2_semantic_discovery']}")
-        print(f"      - Q4 (Fallback): {quadrant_counts['q4_fallback']}")
+        logger.debug(f"   ✓ Quadrant Distribution:")
+        logger.debug(f"      - Q1 (Perfect Match): {quadrant_counts['q1_perfect_match']}")
+        logger.debug(f"      - Q2 (Semantic Discovery): {quadrant_counts['q2_semantic_discovery']}")
+        logger.debug(f"      - Q4 (Fallback): {quadrant_counts['q4_fallback']}")
     
     # ========================================================================
     # Step 5: Score Calculation (動態權重)
     # ========================================================================
     if verbose:
-        print(f"\n[Step 5/7] Dynamic Score Calculation")
+        logger.debug(f"\n[Step 5/7] Dynamic Score Calculation")
     
     for movie in filtered_candidates:
-        final_score = calculate_3quadrant_score(
+        movie.final_score = calculate_3quadrant_score(
             movie=movie,
-            embedding_score=movie["embedding_score"],
-            quadrant=movie["quadrant"],
+            embedding_score=movie.embedding_score,
+            quadrant=movie.quadrant,
             config=cfg
         )
-        movie["final_score"] = final_score
     
     if verbose:
-        print(f"   ✓ Calculated final scores for all candidates")
+        logger.debug(f"   ✓ Calculated final scores for all candidates")
     
     # ========================================================================
     # Step 6: Mixed Sorting (象限優先 + 分數次要)
     # ========================================================================
     if verbose:
-        print(f"\n[Step 6/7] Mixed Sorting (Quadrant + Score)")
+        logger.debug(f"\n[Step 6/7] Mixed Sorting (Quadrant + Score)")
     
     sorted_movies = sort_by_quadrant_and_embedding(
         movies=filtered_candidates,
@@ -773,8 +789,33 @@ async def recommend_movies_embedding_first(
     )
     
     if verbose:
-        print(f"   ✓ Sorted {len(sorted_movies)} movies")
+        logger.debug(f"   ✓ Sorted {len(sorted_movies)} movies")
     
+    return sorted_movies
+
+
+def _pick_recommendations(
+    sorted_movies: List[Candidate],
+    count: int,
+    cfg: Dict,
+    verbose: bool
+) -> List[Candidate]:
+    """
+    Step 7: 從排序後的候選中選出最終推薦（尚未補上詳細欄位、尚未格式化）
+    
+    sorted_movies 可能來自 ranked_candidate_cache（唯讀），選中的電影一律複製後返回。
+    """
+    top_guaranteed, random_picks = _pick_guaranteed_and_random(sorted_movies, count, cfg, verbose)
+    return top_guaranteed + random_picks
+
+
+def _pick_guaranteed_and_random(
+    sorted_movies: List[Candidate],
+    count: int,
+    cfg: Dict,
+    verbose: bool
+) -> Tuple[List[Candidate], List[Candidate]]:
+    """Step 7 的兩部分：(保證的 Top N, 隨機選取)，皆為複製後的候選"""
     # ========================================================================
     # Step 7: Return Top K (混合策略：Top 3 固定 + 隨機選取)
     # ========================================================================
@@ -783,7 +824,7 @@ async def recommend_movies_embedding_first(
     # - 其他: 從剩餘候選中隨機選取（增加驚喜感）
     
     if verbose:
-        print(f"\n[Step 7/7] Smart Selection Strategy")
+        logger.debug(f"\n[Step 7/7] Smart Selection Strategy")
     
     import random
     
@@ -799,14 +840,130 @@ async def recommend_movies_embedding_first(
     random_count = count - len(top_guaranteed)
     random_picks = random.sample(remaining_pool, min(random_count, len(remaining_pool))) if remaining_pool else []
     
-    final_recommendations = top_guaranteed + random_picks
-    
     if verbose:
-        print(f"   ✓ Guaranteed Top {len(top_guaranteed)}: {[m['title'][:30] for m in top_guaranteed]}")
+        logger.debug(f"   ✓ Guaranteed Top {len(top_guaranteed)}: {[m['title'][:30] for m in top_guaranteed]}")
         if random_picks:
-            print(f"   ✓ Random {len(random_picks)} (from rank {guaranteed_top+1}-{random_pool_size}): {[m['title'][:25] for m in random_picks[:3]]}...")
+            logger.debug(f"   ✓ Random {len(random_picks)} (from rank {guaranteed_top+1}-{random_pool_size}): {[m['title'][:25] for m in random_picks[:3]]}...")
+    
+    return [movie.copy() for movie in top_guaranteed], [movie.copy() for movie in random_picks]
+
+
+def _ranked_cache_key(
+    embedding_query_text: str,
+    mood_labels: List[str],
+    keywords: List[str],
+    genres: List[str],
+    exclude_genres: List[str],
+    year_range: tuple,
+    year_ranges: List[List[int]],
+    min_rating: float,
+    cfg: Dict,
+    db_session: Session
+):
+    """
+    Step 2-6 結果的 key（見 ranked_candidate_cache.py；singleflight 合併也使用同一個 key）
+    
+    key 包含索引版本；索引尚未載入時返回 None（不快取、不合併），
+    不在 event loop 上同步載入索引，載入由 Step 2 在 thread 中完成。
+    """
+    from app.services.ranked_candidate_cache import ranked_candidates_key
+    from app.services.vector_index import get_loaded_vector_index
+    
+    index = get_loaded_vector_index()
+    if index is None:
+        return None
+    return ranked_candidates_key(
+        embedding_query_text, mood_labels, keywords, genres, exclude_genres,
+        year_range, year_ranges, min_rating, cfg, index
+    )
+
+
+async def _search_and_rank(
+    embedding_query_text: str,
+    mood_labels: List[str],
+    keywords: List[str],
+    genres: List[str],
+    exclude_genres: List[str],
+    year_range: tuple,
+    year_ranges: List[List[int]],
+    min_rating: float,
+    db_session: Session,
+    cfg: Dict,
+    verbose: bool,
+    user_id=None
+) -> List[Candidate]:
+    """Step 2-6: 全庫向量搜索 → 排序後的候選"""
+    # ========================================================================
+    # Step 2: Embedding Similarity Search (全庫搜索)
+    # ========================================================================
+    if verbose:
+        logger.debug(f"\n[Step 2/7] Embedding Similarity Search")
+    
+    embedding_top_k = cfg.get("candidate_counts", {}).get("embedding_top_k", 300)
+    min_similarity = cfg.get("embedding_search", {}).get("min_similarity", 0.0)
+    
+    # 個人化模式：品味向量混入查詢向量（仍只掃描一次），已收藏的電影一併下推排除
+    taste_vector = None
+    exclude_ids = None
+    personalization_cfg = cfg.get("personalization", {})
+    if user_id is not None:
+        from app.services.user_taste import get_user_taste_vector, get_saved_movie_ids
+        
+        # 品味向量只讀取（不存在時在背景重算寫入），DB 查詢在 thread 中執行
+        taste_vector = await asyncio.to_thread(get_user_taste_vector, db_session, user_id)
+        if personalization_cfg.get("exclude_saved", True):
+            exclude_ids = await asyncio.to_thread(get_saved_movie_ids, db_session, user_id)
+        if verbose:
+            logger.debug(f"   - Personalized: taste vector {'✓' if taste_vector is not None else '✗ (清單中沒有電影)'}, exclude {len(exclude_ids or [])} saved")
+    
+    # Hard Filters 下推到向量搜索：Top K 只從符合條件的電影中選出
+    # （Step 3 仍套用相同的過濾，Metadata 未載入時由 Step 3 負責）
+    from app.services.embedding_service import embedding_similarity_search
+    
+    embedding_candidates = await embedding_similarity_search(
+        query_text=embedding_query_text,
+        db_session=db_session,
+        top_k=embedding_top_k,
+        min_similarity=min_similarity,
+        hard_filters=_hard_filters(genres, exclude_genres, year_range, year_ranges, min_rating, exclude_ids),
+        # 候選只帶過濾 / 評分所需的特徵欄位，詳細資料在 Step 7 只為最終結果查詢
+        hydrate=False,
+        taste_vector=taste_vector,
+        taste_weight=personalization_cfg.get("taste_weight", 0.3)
+    )
+    
+    if verbose:
+        logger.debug(f"   ✓ Retrieved {len(embedding_candidates)} candidates")
+    
+    if not embedding_candidates:
+        if verbose:
+            logger.debug(f"   ⚠️  No candidates found, returning empty list")
+        return []
     
-    # 格式化電影數據，確保前端所需欄位都存在
+    # ========================================================================
+    # Step 3-6: Feature Filtering → 三象限分類 → 評分 → 排序
+    # ========================================================================
+    return await _rank_candidates(
+        embedding_candidates,
+        keywords=keywords,
+        mood_labels=mood_labels,
+        genres=genres,
+        exclude_genres=exclude_genres,
+        year_range=year_range,
+        year_ranges=year_ranges,
+        min_rating=min_rating,
+        cfg=cfg,
+        verbose=verbose,
+        exclude_ids=exclude_ids
+    )
+
+
+def _format_recommendations(
+    final_recommendations: List[Candidate],
+    count: int,
+    verbose: bool
+) -> List[Dict[str, Any]]:
+    """格式化電影數據，確保前端所需欄位都存在（候選只在這裡轉成前端 dict）"""
     TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
     formatted_results = []
     
@@ -842,17 +999,542 @@ async def recommend_movies_embedding_first(
         formatted_results.append(formatted_movie)
     
     if verbose:
-        print(f"\n[Step 7/7] Returning Top {count} Recommendations")
-        print(f"\n   📊 Top {min(5, len(formatted_results))} Results:")
+        logger.debug(f"\n[Step 7/7] Returning Top {count} Recommendations")
+        logger.debug(f"\n   📊 Top {min(5, len(formatted_results))} Results:")
         for i, movie in enumerate(formatted_results[:5]):
-            print(f"      {i+1}. {movie['title'][:40]:40s}")
-            print(f"         - Quadrant: {movie['quadrant']}")
-            print(f"         - Final Score: {movie['final_score']:.2f}")
-            print(f"         - Embedding: {movie['embedding_score']:.3f}, Match: {movie['match_ratio']:.2f}")
+            logger.debug(f"      {i+1}. {movie['title'][:40]:40s}")
+            logger.debug(f"         - Quadrant: {movie['quadrant']}")
+            logger.debug(f"         - Final Score: {movie['final_score']:.2f}")
+            logger.debug(f"         - Embedding: {movie['embedding_score']:.3f}, Match: {movie['match_ratio']:.2f}")
         
-        print("\n" + "🎬"*35)
-        print(f"Phase 3.6 Recommendation Complete: {len(formatted_results)} movies")
-        print("🎬"*35 + "\n")
+        logger.debug("\n" + "🎬"*35)
+        logger.debug(f"Phase 3.6 Recommendation Complete: {len(formatted_results)} movies")
+        logger.debug("🎬"*35 + "\n")
     
     return formatted_results
 
+
+# ============================================
+# Phase 3.5: 四象限混合推薦
+# ============================================
+
+async def recommend_movies_embedding_first(
+    natural_query: str = None,
+    mood_labels: List[str] = None,
+    keywords: List[str] = None,
+    genres: List[str] = None,
+    exclude_genres: List[str] = None,
+    year_range: tuple = None,
+    year_ranges: List[List[int]] = None,
+    min_rating: float = None,
+    db_session: Session = None,
+    count: int = 10,
+    config: Dict = None,
+    user_id=None
+) -> List[Dict[str, Any]]:
+    """
+    Phase 3.6: Embedding-First 推薦系統（完整流程）
+    
+    架構流程：
+    1. Query Generation: 生成最佳 Embedding 查詢文本
+       - 情境 1 (NL only): 直接使用自然語言
+       - 情境 2 (Mood only): Relationship-aware Template
+       - 情境 3 (Both): NL 優先，衝突檢測
+    2. Embedding Search: 全庫語義搜索（300 candidates）
+       - 查詢 668 部電影的 embeddings
+       - 計算 Cosine Similarity
+       - 返回 Top 300
+    3. Feature Filtering: 特徵過濾（150 candidates）
+       - Tier 1: Match Ratio >= 80%
+       - Tier 2: Match Ratio 50-79%
+       - Tier 3: Match Ratio < 50%
+    4. 3-Quadrant Classification: 三象限分類
+       - Q1: High Embedding (>=0.60) + High Match (>=0.40) → 完美匹配
+       - Q2: High Embedding (>=0.60) + Low Match (<0.40) → 語義發現
+       - Q4: Low Embedding (<0.60) → 候補
+    5. Score Calculation: 動態權重評分
+       - Q1: E:50% M:20% F:30%
+       - Q2: E:70% M:20% F:10%
+       - Q4: E:30% M:30% F:40%
+    6. Mixed Sorting: 象限優先 + 分數次要排序
+       - Primary: Q1 > Q2 > Q4
+       - Secondary: final_score desc
+    7. Return Top K: 返回前 10 部推薦
+    
+    與 Phase 3.5 的差異：
+    - Primary Engine: Feature Matching → Embedding Search
+    - Secondary Engine: Embedding Reranking → Feature Filtering
+    - Candidates: 150 (Feature) → 300 (Embedding) → 150 (Filtered)
+    - Quadrants: 4 (Q1/Q2/Q3/Q4) → 3 (Q1/Q2/Q4)
+    - Axes: Match Ratio (Y) × Embedding (X) → Embedding (Y) × Match Ratio (X)
+    - Thresholds: 0.50/0.45 → 0.40/0.60
+    
+    Args:
+        natural_query: 自然語言查詢 (例: "難過的時候適合看什麼電影")
+        mood_labels: Mood 標籤列表 (英文，例: ["heartwarming", "uplifting"])
+        keywords: 關鍵詞列表 (英文)
+        genres: 類型列表 (簡體中文，例: ["劇情"])
+        exclude_genres: 排除類型列表
+        year_range: 單一年份範圍 (min, max)
+        year_ranges: 多個年份範圍 [[1990, 1999], [2000, 2009]]
+        min_rating: 最低評分
+        db_session: 資料庫 Session
+        count: 返回數量 (預設 10)
+        config: 自定義配置 (可選，預設使用 phase36_config.PHASE36_CONFIG)
+        user_id: 個人化模式的使用者（可選）：查詢 Embedding 與使用者品味向量混合後搜索，
+                 並排除已加入 Watchlist / Top10 的電影（見 user_taste.py）
+    
+    Returns:
+        List[Dict]: 推薦電影列表，每部電影包含：
+        - tmdb_id: TMDB ID
+        - title: 電影名稱
+        - overview: 簡介
+        - embedding_score: Embedding 相似度 (0.0-1.0)
+        - match_ratio: Feature 匹配率 (0.0-1.0)
+        - final_score: 綜合評分
+        - quadrant: 象限 (q1_perfect_match | q2_semantic_discovery | q4_fallback)
+        - ... (其他電影資訊)
+    
+    Example:
+        >>> results = await recommend_movies_embedding_first(
+        ...     natural_query="難過的時候適合看什麼電影",
+        ...     mood_labels=["heartwarming", "uplifting"],
+        ...     genres=["劇情"],
+        ...     db_session=session,
+        ...     count=10
+        ... )
+        >>> print(results[0])
+        {
+            "title": "風雲人物",
+            "embedding_score": 0.482,
+            "match_ratio": 0.67,
+            "final_score": 34.45,
+            "quadrant": "q4_fallback"
+        }
+    
+    References:
+        - 決策文檔: docs/phase36-decisions.md
+        - 實現指南: docs/phase36-implementation-guide.md
+        - 配置檔: app/services/phase36_config.py
+    """
+    results, _, _ = await _recommend_embedding_first(
+        natural_query, mood_labels, keywords, genres, exclude_genres,
+        year_range, year_ranges, min_rating, db_session, count, config, user_id
+    )
+    return results
+
+
+async def recommend_movies_embedding_first_with_session(
+    natural_query: str = None,
+    mood_labels: List[str] = None,
+    keywords: List[str] = None,
+    genres: List[str] = None,
+    exclude_genres: List[str] = None,
+    year_range: tuple = None,
+    year_ranges: List[List[int]] = None,
+    min_rating: float = None,
+    db_session: Session = None,
+    count: int = 10,
+    config: Dict = None,
+    user_id=None
+) -> Tuple[List[Dict[str, Any]], Optional[RecommendationSession]]:
+    """
+    與 recommend_movies_embedding_first 相同，另建立推薦 Session（見 recommendation_sessions.py）
+    
+    Returns:
+        (推薦電影列表, Session)：Session 保留排序後候選與本次已回傳的電影，
+        之後以 recommend_movies_session_page 載入更多；沒有剩餘候選或 Session 停用時為 None
+    """
+    from app.services.phase36_config import PHASE36_CONFIG
+    from app.services.recommendation_sessions import recommendation_sessions
+    
+    cfg = config or PHASE36_CONFIG
+    results, sorted_movies, final_recommendations = await _recommend_embedding_first(
+        natural_query, mood_labels, keywords, genres, exclude_genres,
+        year_range, year_ranges, min_rating, db_session, count, cfg, user_id
+    )
+    if not cfg.get("recommendation_sessions", {}).get("enabled", True):
+        return results, None
+    if len(sorted_movies) <= len(final_recommendations):
+        return results, None
+    
+    session = recommendation_sessions.create(
+        sorted_movies,
+        served_ids=[movie.id for movie in final_recommendations],
+        user_id=user_id
+    )
+    return results, session
+
+
+async def recommend_movies_session_page(
+    session: RecommendationSession,
+    cursor: int,
+    count: int,
+    db_session: Session
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    推薦 Session 的下一頁：不重新計算，依 Step 6 的排序從 cursor 起返回 count 部未回傳過的電影
+    
+    Returns:
+        (推薦電影列表（格式同 recommend_movies_embedding_first）, next_cursor；沒有剩餘時為 None)
+    """
+    with span("select"):
+        movies, next_cursor = session.page(cursor, count)
+        movies = [movie.copy() for movie in movies]
+        await _hydrate_details(db_session, movies)
+        return _format_recommendations(movies, count, False), next_cursor
+
+
+async def _recommend_embedding_first(
+    natural_query: str,
+    mood_labels: List[str],
+    keywords: List[str],
+    genres: List[str],
+    exclude_genres: List[str],
+    year_range: tuple,
+    year_ranges: List[List[int]],
+    min_rating: float,
+    db_session: Session,
+    count: int,
+    config: Dict,
+    user_id
+) -> Tuple[List[Dict[str, Any]], Sequence[Candidate], List[Candidate]]:
+    """recommend_movies_embedding_first 的完整流程；返回 (格式化結果, 排序後候選, 選中的候選)"""
+    # 導入依賴
+    from app.services.phase36_config import PHASE36_CONFIG
+    
+    # 使用配置
+    cfg = config or PHASE36_CONFIG
+    verbose = debug_enabled()
+    
+    if verbose:
+        logger.debug("\n" + "🎬"*35)
+        logger.debug("Phase 3.6: Embedding-First Recommendation System")
+        logger.debug("🎬"*35)
+    
+    # ========================================================================
+    # Step 1: Query Generation
+    # ========================================================================
+    embedding_query_text = _generate_query_text(natural_query, mood_labels, verbose)
+    
+    # ========================================================================
+    # Step 2-6: 向量搜索 → 過濾 → 分類 → 評分 → 排序（結果固定，非個人化請求可快取）
+    # ========================================================================
+    sorted_movies = await _sorted_candidates(
+        embedding_query_text,
+        mood_labels=mood_labels,
+        keywords=keywords,
+        genres=genres,
+        exclude_genres=exclude_genres,
+        year_range=year_range,
+        year_ranges=year_ranges,
+        min_rating=min_rating,
+        db_session=db_session,
+        cfg=cfg,
+        verbose=verbose,
+        user_id=user_id
+    )
+    
+    if not sorted_movies:
+        return [], (), []
+    
+    with span("select"):
+        final_recommendations = _pick_recommendations(sorted_movies, count, cfg, verbose)
+        
+        # 只為最終結果補上 overview / poster_path 等詳細欄位
+        await _hydrate_details(db_session, final_recommendations)
+        
+        return _format_recommendations(final_recommendations, count, verbose), sorted_movies, final_recommendations
+
+
+async def _sorted_candidates(
+    embedding_query_text: str,
+    mood_labels: List[str],
+    keywords: List[str],
+    genres: List[str],
+    exclude_genres: List[str],
+    year_range: tuple,
+    year_ranges: List[List[int]],
+    min_rating: float,
+    db_session: Session,
+    cfg: Dict,
+    verbose: bool,
+    user_id=None
+) -> Sequence[Candidate]:
+    """
+    Step 2-6，先查 ranked_candidate_cache；未命中時相同 key 的並發請求合併為一次計算
+    （singleflight.py），各呼叫者只各自執行 Step 7。個人化請求不快取也不合併。
+    
+    返回的排序後候選可能與其他請求共用，視為唯讀。
+    """
+    from app.services.ranked_candidate_cache import ranked_candidate_cache
+    from app.services.singleflight import recommend_singleflight
+    
+    use_cache = cfg.get("ranked_candidate_cache", {}).get("enabled", True)
+    use_singleflight = cfg.get("singleflight", {}).get("enabled", True)
+    
+    key = _ranked_cache_key(
+        embedding_query_text, mood_labels, keywords, genres, exclude_genres,
+        year_range, year_ranges, min_rating, cfg, db_session
+    ) if user_id is None and (use_cache or use_singleflight) else None
+    
+    if key is not None and use_cache:
+        sorted_movies = ranked_candidate_cache.get(key)
+        if sorted_movies is not None:
+            if verbose:
+                logger.debug(f"\n[Step 2-6/7] ⚡ Ranked Candidate Cache Hit: {len(sorted_movies)} sorted candidates")
+            return sorted_movies
+    
+    async def search_and_rank(session: Session) -> Tuple[Candidate, ...]:
+        sorted_movies = tuple(await _search_and_rank(
+            embedding_query_text,
+            mood_labels=mood_labels,
+            keywords=keywords,
+            genres=genres,
+            exclude_genres=exclude_genres,
+            year_range=year_range,
+            year_ranges=year_ranges,
+            min_rating=min_rating,
+            db_session=session,
+            cfg=cfg,
+            verbose=verbose,
+            user_id=user_id
+        ))
+        if key is not None and use_cache:
+            ranked_candidate_cache.set(key, sorted_movies)
+        return sorted_movies
+    
+    if key is None or not use_singleflight:
+        return await search_and_rank(db_session)
+    
+    async def search_and_rank_shared() -> Tuple[Candidate, ...]:
+        # 共用的計算可能比發起它的請求活得更久（該客戶端斷線時 get_db 會關閉請求的 Session），
+        # 因此使用自己的 Session
+        from db.database import SessionLocal
+        
+        with SessionLocal() as session:
+            return await search_and_rank(session)
+    
+    coalesced = recommend_singleflight.is_running(key)
+    sorted_movies = await recommend_singleflight.run(key, search_and_rank_shared)
+    if verbose and coalesced:
+        logger.debug(f"\n[Step 2-6/7] ⚡ Coalesced with in-flight request: {len(sorted_movies)} sorted candidates")
+    return sorted_movies
+
+
+async def _hydrate_details(db_session: Session, movies: List[Candidate]) -> None:
+    """為選中的候選補上 overview / poster_path 等詳細欄位（一次 DB 查詢，在 thread 中執行）"""
+    from app.services.embedding_service import hydrate_movie_details_async
+    
+    if not movies:
+        return
+    details = await hydrate_movie_details_async(db_session, [m["id"] for m in movies])
+    for movie in movies:
+        movie.update(details.get(movie["id"], {}))
+
+
+async def recommend_movies_embedding_first_stream(
+    natural_query: str = None,
+    mood_labels: List[str] = None,
+    keywords: List[str] = None,
+    genres: List[str] = None,
+    exclude_genres: List[str] = None,
+    year_range: tuple = None,
+    year_ranges: List[List[int]] = None,
+    min_rating: float = None,
+    db_session: Session = None,
+    count: int = 10,
+    config: Dict = None,
+    user_id=None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Phase 3.6: 漸進式推薦（參數與 recommend_movies_embedding_first 相同）
+    
+    Step 6 排序完成後就能確定保證的 Top N，不必等所有電影補完詳細欄位。
+    依序產生事件（router 以 NDJSON 逐行送出）：
+    - {"event": "header", "scenario", "conflict_detected", "embedding_query",
+       "candidate_count", "quadrant_counts"}
+    - {"event": "movie", "section": "guaranteed", "rank", "movie"}：Top N（補完詳細欄位後逐部送出）
+    - {"event": "movie", "section": "random", "rank", "movie"}：隨機選取
+    - {"event": "done", "count"}
+    
+    詳細欄位每個區段一次 DB 查詢（保證 Top N 一次、隨機選取一次），
+    首部電影的等待時間只包含 Top N 的查詢。
+    """
+    from app.services.phase36_config import PHASE36_CONFIG
+    
+    cfg = config or PHASE36_CONFIG
+    verbose = debug_enabled()
+    
+    # Step 1
+    query = _generate_query(natural_query, mood_labels, verbose)
+    
+    # Step 2-6
+    sorted_movies = await _sorted_candidates(
+        query["query"],
+        mood_labels=mood_labels,
+        keywords=keywords,
+        genres=genres,
+        exclude_genres=exclude_genres,
+        year_range=year_range,
+        year_ranges=year_ranges,
+        min_rating=min_rating,
+        db_session=db_session,
+        cfg=cfg,
+        verbose=verbose,
+        user_id=user_id
+    )
+    
+    quadrant_counts: Dict[str, int] = {}
+    for movie in sorted_movies:
+        quadrant = movie.get("quadrant", "unknown")
+        quadrant_counts[quadrant] = quadrant_counts.get(quadrant, 0) + 1
+    
+    yield {
+        "event": "header",
+        "scenario": query.get("scenario"),
+        "conflict_detected": query.get("conflict_detected", False),
+        "embedding_query": query["query"],
+        "candidate_count": len(sorted_movies),
+        "quadrant_counts": quadrant_counts,
+    }
+    
+    # Step 7: 兩個區段各自補上詳細欄位後送出
+    rank = 0
+    if sorted_movies:
+        with span("select"):
+            sections = _pick_guaranteed_and_random(sorted_movies, count, cfg, verbose)
+        
+        for section, movies in zip(("guaranteed", "random"), sections):
+            with span("select"):
+                await _hydrate_details(db_session, movies)
+                formatted = _format_recommendations(movies, count, False)
+            for movie in formatted:
+                rank += 1
+                yield {"event": "movie", "section": section, "rank": rank, "movie": movie}
+    
+    yield {"event": "done", "count": rank}
+
+
+# 批次推薦每個請求可用的參數（與 recommend_movies_embedding_first 相同名稱）
+BATCH_REQUEST_FIELDS = (
+    "natural_query", "mood_labels", "keywords", "genres",
+    "exclude_genres", "year_range", "year_ranges", "min_rating",
+)
+
+
+async def recommend_movies_embedding_first_batch(
+    requests: List[Dict[str, Any]],
+    db_session: Session = None,
+    count: int = 10,
+    config: Dict = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Phase 3.6: 批次 Embedding-First 推薦（首頁多列、Mood 預設、A/B 變體、預先計算）
+    
+    與逐一呼叫 recommend_movies_embedding_first() 結果相同（隨機選取部分除外），但：
+    - 排序後候選快取命中的查詢直接跳到 Step 7（見 ranked_candidate_cache.py）
+    - 其餘查詢的 Step 2 共用：batch_embedding_similarity_search 一次 Provider 呼叫 + 一次矩陣-矩陣乘法
+    - Step 3-7 逐一執行（各查詢的過濾條件不同）
+    - 最終結果的詳細欄位合併成一次 DB 查詢
+    
+    Args:
+        requests: 每個查詢的參數 dict（鍵見 BATCH_REQUEST_FIELDS）
+        db_session: 資料庫 Session
+        count: 每個查詢的返回數量
+        config: 自定義配置（可選，預設使用 phase36_config.PHASE36_CONFIG）
+    
+    Returns:
+        與 requests 順序一致的推薦電影列表
+    """
+    from app.services.embedding_service import batch_embedding_similarity_search, hydrate_movie_details_async
+    from app.services.phase36_config import PHASE36_CONFIG
+    from app.services.ranked_candidate_cache import ranked_candidate_cache
+    
+    cfg = config or PHASE36_CONFIG
+    verbose = debug_enabled()
+    
+    if not requests:
+        return []
+    
+    params = [{field: request.get(field) for field in BATCH_REQUEST_FIELDS} for request in requests]
+    
+    # Step 1: 每個查詢各自生成查詢文本
+    query_texts = [
+        _generate_query_text(p["natural_query"], p["mood_labels"], verbose)
+        for p in params
+    ]
+    
+    # 排序後候選快取：命中的查詢不需要 Step 2-6
+    cache_keys = [
+        _ranked_cache_key(
+            query_text, p["mood_labels"], p["keywords"], p["genres"], p["exclude_genres"],
+            p["year_range"], p["year_ranges"], p["min_rating"], cfg, db_session
+        )
+        for p, query_text in zip(params, query_texts)
+    ] if cfg.get("ranked_candidate_cache", {}).get("enabled", True) else [None] * len(params)
+    all_sorted = [
+        ranked_candidate_cache.get(key) if key is not None else None
+        for key in cache_keys
+    ]
+    missing = [i for i, sorted_movies in enumerate(all_sorted) if sorted_movies is None]
+    
+    if verbose and len(missing) < len(params):
+        logger.debug(f"\n   ⚡ Ranked Candidate Cache Hit: {len(params) - len(missing)}/{len(params)} queries")
+    
+    if missing:
+        # Step 2: 未命中的查詢共用一次批次搜索
+        embedding_top_k = cfg.get("candidate_counts", {}).get("embedding_top_k", 300)
+        min_similarity = cfg.get("embedding_search", {}).get("min_similarity", 0.0)
+        
+        all_candidates = await batch_embedding_similarity_search(
+            [query_texts[i] for i in missing],
+            db_session=db_session,
+            top_k=embedding_top_k,
+            min_similarity=min_similarity,
+            hard_filters_list=[
+                _hard_filters(p["genres"], p["exclude_genres"], p["year_range"], p["year_ranges"], p["min_rating"])
+                for p in (params[i] for i in missing)
+            ],
+            hydrate=False
+        )
+        
+        # Step 3-6: 逐一排序並寫入快取
+        for i, embedding_candidates in zip(missing, all_candidates):
+            p = params[i]
+            sorted_movies = []
+            if embedding_candidates:
+                sorted_movies = await _rank_candidates(
+                    embedding_candidates,
+                    keywords=p["keywords"],
+                    mood_labels=p["mood_labels"],
+                    genres=p["genres"],
+                    exclude_genres=p["exclude_genres"],
+                    year_range=p["year_range"],
+                    year_ranges=p["year_ranges"],
+                    min_rating=p["min_rating"],
+                    cfg=cfg,
+                    verbose=verbose
+                )
+            if cache_keys[i] is not None:
+                ranked_candidate_cache.set(cache_keys[i], tuple(sorted_movies))
+            all_sorted[i] = sorted_movies
+    
+    # Step 7: 逐一選取
+    with span("select"):
+        all_recommendations = [
+            _pick_recommendations(sorted_movies, count, cfg, verbose) if sorted_movies else []
+            for sorted_movies in all_sorted
+        ]
+        
+        # 所有查詢的最終結果一次補上詳細欄位
+        final_ids = {m["id"] for recommendations in all_recommendations for m in recommendations}
+        details = await hydrate_movie_details_async(db_session, sorted(final_ids))
+        for recommendations in all_recommendations:
+            for movie in recommendations:
+                movie.update(details.get(movie["id"], {}))
+        
+        return [
+            _format_recommendations(recommendations, count, verbose)
+            for recommendations in all_recommendations
+        ]
@@ -0,0 +1,83 @@
+# app/services/singleflight.py
+"""
+進行中請求合併（singleflight）
+
+熱門的 Mood 預設按鈕常在同一時間被許多使用者點擊：ranked_candidate_cache 只在
+第一個請求完成後才有結果，在那之前同時到達的相同請求會各自呼叫 Embedding API、
+各自掃描全庫。SingleFlight 讓相同 key 的並發呼叫共用同一個進行中的計算：
+
+- 第一個呼叫者建立計算（獨立的 asyncio Task），之後到達的呼叫者等待同一個 Task
+- 每個呼叫者以 asyncio.shield 等待：某個客戶端斷線（被取消）不會取消共用的計算，
+  其他等待者照常拿到結果
+- 計算結束（成功或例外）即從進行中表移除；例外會傳給所有等待者，下一個請求重新計算
+- 結果由所有呼叫者共用，必須視為唯讀（與 ranked_candidate_cache 的 value 相同）
+
+共用的計算可能比第一個呼叫者活得更久，不能使用請求範圍的資源（推薦管線中
+自己開 DB Session，不使用第一個請求的 db_session）。Task 建立時複製的
+contextvars 屬於第一個呼叫者：各階段 span 只出現在它的 Server-Timing 中，
+合併的呼叫者只記錄自己的 query_gen / select / total。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """以 key 合併並發的 async 計算（單一 event loop 內使用）"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """執行 fn()；已有相同 key 的計算進行中時等待它的結果"""
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            return await asyncio.shield(task)
+
+        self.coalesced += 1
+        waiters = self._waiters[key] = self._waiters[key] + 1
+        self.max_waiters = max(self.max_waiters, waiters)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            # 完成或被取消都離開等待；計算已結束時 _finish 已移除計數
+            if self._flights.get(key) is task:
+                self._waiters[key] -= 1
+
+    def is_running(self, key: Hashable) -> bool:
+        """key 是否有進行中的計算（下一個 run(key) 會合併）"""
+        return key in self._flights
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        self._flights.pop(key, None)
+        self._waiters.pop(key, None)
+        # 所有等待者都已取消時，避免 "Task exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "waiting": sum(self._waiters.values()),
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "max_waiters": self.max_waiters,
+            "coalesce_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+# 進程內單例：推薦管線 Step 2-6（key 同 ranked_candidate_cache）
+recommend_singleflight = SingleFlight()
@@ -0,0 +1,434 @@
+# app/services/user_taste.py
+"""
+使用者品味向量（個人化推薦）
+
+每位使用者一列 user_taste_vectors：已加入 Watchlist / Top10 的電影 embedding
+（先正規化）的加權總和與權重總和。品味向量 = weighted_sum 正規化（即加權平均的方向）。
+
+權重（PHASE36_CONFIG["personalization"]）：
+- Watchlist：watchlist_weight
+- Top10：top10_weight × (11 - rank) / 10 × rating_by_user / rating_scale（未評分視為滿分）
+同一部電影同時在多個清單中時權重相加。
+
+增量更新：新增 / 移除 / 調整排名時，router 只送出權重的變化量 {tmdb_id: Δweight}，
+這裡只讀取這幾部電影的向量並更新總和（O(變動數 × dim)），不重新讀取整份清單的向量。
+列不存在或 embedding 版本不符時改為整份重算（rebuild_user_taste_vector）。
+
+增量更新只能減去「當初加入的向量」：電影加入時還沒有 embedding、或之後重新計算過，
+減去的向量就與加入的不同，總和從此錯誤。因此每列記錄整份重算的時間 built_at：
+- 增量更新時，變動的電影向量在 built_at 之後建立或更新過 → 改為整份重算
+- 讀取時核對總和：清單中有 embedding 的電影權重總和與 total_weight 不符（例如加入時
+  還沒有 embedding 的電影後來有了），或任一部的向量在 built_at 之後更新過 → 視為過期
+- 增量更新失敗時刪除該列，下次讀取視同不存在
+
+讀取（get_user_taste_vector）不寫入 DB：列不存在、版本不符或過期時在記憶體中算出這次要用的
+向量，並排入背景重算（獨立的 DB Session，同一使用者同時只排一次），推薦請求不需 commit。
+
+推薦時（simple_recommend 個人化模式）品味向量與查詢 Embedding 先混合成一個查詢向量，
+向量搜索仍然只掃描一次；已收藏的電影以 Hard Filter 下推排除。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.embedding_codec import (
+    STORED_EMBEDDING_COLUMNS,
+    HAS_STORED_EMBEDDING,
+    decode_embedding_bin,
+    decode_stored_embedding,
+    encode_embedding,
+)
+from app.services.phase36_config import PHASE36_CONFIG
+from app.services.pipeline_trace import recommend_logger as logger
+
+# 權重總和低於此值視為空清單（也用來吸收浮點誤差）
+_MIN_TOTAL_WEIGHT = 1e-6
+
+# 讀取時核對 total_weight 的相對誤差上限（增量更新累積的浮點誤差遠小於此值）
+_TOTAL_WEIGHT_TOLERANCE = 1e-4
+
+
+# ============================================================================
+# 權重
+# ============================================================================
+
+def _personalization_config() -> Dict:
+    return PHASE36_CONFIG.get("personalization", {})
+
+
+def watchlist_weight() -> float:
+    """每部 Watchlist 電影的權重"""
+    return float(_personalization_config().get("watchlist_weight", 1.0))
+
+
+def top10_item_weight(rank: int, rating_by_user: Optional[float]) -> float:
+    """Top10 項目的權重（排名越前、評分越高權重越大）"""
+    cfg = _personalization_config()
+    rank_factor = (11 - min(max(int(rank), 1), 10)) / 10
+    rating_factor = 1.0
+    if rating_by_user is not None:
+        rating_factor = min(max(float(rating_by_user) / float(cfg.get("rating_scale", 10.0)), 0.0), 1.0)
+    return float(cfg.get("top10_weight", 2.0)) * rank_factor * rating_factor
+
+
+def top10_weights(db_session: Session, user_id) -> Dict[int, float]:
+    """使用者所有 Top10 項目的權重（tmdb_id → weight，同一電影多個分類時相加）"""
+    result = db_session.execute(
+        text("SELECT tmdb_id, rank, rating_by_user FROM top10_list WHERE user_id = :user_id"),
+        {"user_id": user_id}
+    )
+    weights: Dict[int, float] = {}
+    for tmdb_id, rank, rating_by_user in result:
+        weights[tmdb_id] = weights.get(tmdb_id, 0.0) + top10_item_weight(rank, rating_by_user)
+    return weights
+
+
+def saved_movie_weights(db_session: Session, user_id) -> Dict[int, float]:
+    """Watchlist + Top10 的權重總和（tmdb_id → weight）"""
+    weights = top10_weights(db_session, user_id)
+    result = db_session.execute(
+        text("SELECT tmdb_id FROM watchlist WHERE user_id = :user_id"),
+        {"user_id": user_id}
+    )
+    for (tmdb_id,) in result:
+        weights[tmdb_id] = weights.get(tmdb_id, 0.0) + watchlist_weight()
+    return weights
+
+
+def diff_weights(before: Dict[int, float], after: Dict[int, float]) -> Dict[int, float]:
+    """兩份權重快照的差（只保留有變化的電影）"""
+    deltas = {}
+    for tmdb_id in before.keys() | after.keys():
+        delta = after.get(tmdb_id, 0.0) - before.get(tmdb_id, 0.0)
+        if abs(delta) > 1e-9:
+            deltas[tmdb_id] = delta
+    return deltas
+
+
+def get_saved_movie_ids(db_session: Session, user_id) -> List[int]:
+    """使用者已加入 Watchlist 或 Top10 的電影"""
+    result = db_session.execute(
+        text("""
+            SELECT tmdb_id FROM watchlist WHERE user_id = :user_id
+            UNION
+            SELECT tmdb_id FROM top10_list WHERE user_id = :user_id
+        """),
+        {"user_id": user_id}
+    )
+    return [tmdb_id for (tmdb_id,) in result]
+
+
+# ============================================================================
+# 品味向量讀寫
+# ============================================================================
+
+def _fetch_unit_vectors(
+    db_session: Session,
+    tmdb_ids: List[int],
+    dim: int
+) -> Tuple[Dict[int, np.ndarray], Optional[datetime]]:
+    """
+    讀取電影向量並正規化（沒有 embedding 或維度不符的電影不返回）
+
+    Returns:
+        (tmdb_id → 向量, 這些電影 movie_vectors.updated_at 的最大值)
+    """
+    if not tmdb_ids:
+        return {}, None
+    result = db_session.execute(
+        text(f"""
+            SELECT mv.tmdb_id, {STORED_EMBEDDING_COLUMNS}, mv.updated_at
+            FROM movie_vectors mv
+            WHERE mv.tmdb_id = ANY(:ids) AND {HAS_STORED_EMBEDDING}
+        """),
+        {"ids": [int(i) for i in tmdb_ids]}
+    )
+    vectors = {}
+    latest_update = None
+    for tmdb_id, embedding_bin, embedding_dtype, embedding_json, updated_at in result:
+        if updated_at is not None and (latest_update is None or updated_at > latest_update):
+            latest_update = updated_at
+        vector = np.asarray(
+            decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json), dtype=np.float64
+        )
+        norm = float(np.linalg.norm(vector)) if vector.shape == (dim,) else 0.0
+        if norm > 0.0:
+            vectors[tmdb_id] = vector / norm
+    return vectors, latest_update
+
+
+def _embedded_state(db_session: Session, tmdb_ids: List[int]) -> Tuple[Set[int], Optional[datetime]]:
+    """哪些電影有 embedding，以及它們 movie_vectors.updated_at 的最大值（不讀取向量本身）"""
+    if not tmdb_ids:
+        return set(), None
+    result = db_session.execute(
+        text(f"""
+            SELECT mv.tmdb_id, mv.updated_at
+            FROM movie_vectors mv
+            WHERE mv.tmdb_id = ANY(:ids) AND {HAS_STORED_EMBEDDING}
+        """),
+        {"ids": [int(i) for i in tmdb_ids]}
+    )
+    embedded = set()
+    latest_update = None
+    for tmdb_id, updated_at in result:
+        embedded.add(tmdb_id)
+        if updated_at is not None and (latest_update is None or updated_at > latest_update):
+            latest_update = updated_at
+    return embedded, latest_update
+
+
+def _write_taste_row(
+    db_session: Session,
+    user_id,
+    weighted_sum: np.ndarray,
+    total_weight: float,
+    embedding_version: str,
+    rebuilt: bool
+) -> None:
+    """寫入品味向量；rebuilt（整份重算）時 built_at 設為現在，增量更新保留原值"""
+    db_session.execute(
+        text("""
+            INSERT INTO user_taste_vectors (user_id, weighted_sum, total_weight, embedding_version, built_at, updated_at)
+            VALUES (:user_id, :weighted_sum, :total_weight, :embedding_version,
+                    CASE WHEN :rebuilt THEN NOW() END, NOW())
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                weighted_sum = EXCLUDED.weighted_sum,
+                total_weight = EXCLUDED.total_weight,
+                embedding_version = EXCLUDED.embedding_version,
+                built_at = CASE WHEN :rebuilt THEN NOW() ELSE user_taste_vectors.built_at END,
+                updated_at = NOW()
+        """),
+        {
+            "user_id": user_id,
+            "weighted_sum": encode_embedding(weighted_sum, "f4"),
+            "total_weight": float(total_weight),
+            "embedding_version": embedding_version,
+            "rebuilt": rebuilt,
+        }
+    )
+
+
+def _compute_taste_sum(db_session: Session, user_id, dim: int) -> Tuple[np.ndarray, float]:
+    """以目前的 Watchlist / Top10 整份計算 (weighted_sum, total_weight)，只讀取不寫入"""
+    weights = saved_movie_weights(db_session, user_id)
+    vectors, _ = _fetch_unit_vectors(db_session, list(weights), dim)
+
+    weighted_sum = np.zeros(dim, dtype=np.float64)
+    total_weight = 0.0
+    for tmdb_id, vector in vectors.items():
+        weighted_sum += weights[tmdb_id] * vector
+        total_weight += weights[tmdb_id]
+    return weighted_sum, total_weight
+
+
+def rebuild_user_taste_vector(db_session: Session, user_id, dim: int, embedding_version: str) -> np.ndarray:
+    """
+    以目前的 Watchlist / Top10 整份重算品味向量並寫入
+
+    用於第一次建立、embedding 版本更換，或清單清空後歸零（同時消除累積的浮點誤差）。
+
+    Returns:
+        weighted_sum（float64）
+    """
+    weighted_sum, total_weight = _compute_taste_sum(db_session, user_id, dim)
+    _write_taste_row(db_session, user_id, weighted_sum, total_weight, embedding_version, rebuilt=True)
+    db_session.commit()
+    return weighted_sum
+
+
+def apply_taste_deltas(
+    db_session: Session,
+    user_id,
+    deltas: Dict[int, float],
+    dim: int,
+    embedding_version: str
+) -> None:
+    """
+    增量更新品味向量：weighted_sum += Σ Δweight · v，total_weight += Σ Δweight
+
+    只讀取 deltas 中電影的向量；列以 FOR UPDATE 鎖定，同一使用者的並行更新不會互相覆蓋。
+    變動的電影向量在上次整份重算（built_at）之後建立或更新過時，總和中的舊向量
+    無法正確減去，改為整份重算。
+    """
+    if not deltas:
+        return
+
+    row = db_session.execute(
+        text("""
+            SELECT weighted_sum, total_weight, embedding_version, built_at
+            FROM user_taste_vectors
+            WHERE user_id = :user_id
+            FOR UPDATE
+        """),
+        {"user_id": user_id}
+    ).fetchone()
+
+    if row is None or row[2] != embedding_version or row[3] is None:
+        # 尚未建立、模型已更換或未記錄重算時間：整份重算（已包含這次的變動）
+        rebuild_user_taste_vector(db_session, user_id, dim, embedding_version)
+        return
+
+    vectors, latest_update = _fetch_unit_vectors(db_session, list(deltas), dim)
+    if latest_update is not None and latest_update > row[3]:
+        rebuild_user_taste_vector(db_session, user_id, dim, embedding_version)
+        return
+
+    weighted_sum = decode_embedding_bin(row[0], "f4").astype(np.float64)
+    total_weight = float(row[1])
+    for tmdb_id, vector in vectors.items():
+        weighted_sum += deltas[tmdb_id] * vector
+        total_weight += deltas[tmdb_id]
+
+    if total_weight <= _MIN_TOTAL_WEIGHT:
+        # 清單已清空（或誤差累積）：重算歸零
+        rebuild_user_taste_vector(db_session, user_id, dim, embedding_version)
+        return
+
+    _write_taste_row(db_session, user_id, weighted_sum, total_weight, embedding_version, rebuilt=False)
+    db_session.commit()
+
+
+def update_user_taste_vector(db_session: Session, user_id, deltas: Dict[int, float]) -> None:
+    """
+    Watchlist / Top10 變動後呼叫（清單變動已 commit）
+
+    品味向量只影響個人化推薦，更新失敗不應讓清單操作失敗：錯誤只記錄，並刪除該使用者的
+    品味向量列（這次的變動已遺失，之後的增量更新不能疊加在錯誤的總和上）。下次讀取時視同
+    不存在，在記憶體中整份計算並排入背景重算。刪除也失敗時（例如 DB 無法連線），
+    讀取時的總和核對仍會發現不一致。
+    """
+    from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+
+    try:
+        apply_taste_deltas(db_session, user_id, deltas, EMBEDDING_DIM, EMBEDDING_MODEL)
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"   ⚠️  [TasteVector] 使用者 {user_id} 品味向量更新失敗，改為下次讀取時重算: {e}")
+        try:
+            db_session.execute(
+                text("DELETE FROM user_taste_vectors WHERE user_id = :user_id"),
+                {"user_id": user_id}
+            )
+            db_session.commit()
+        except Exception as delete_error:
+            db_session.rollback()
+            logger.warning(f"   ⚠️  [TasteVector] 使用者 {user_id} 品味向量列無法刪除: {delete_error}")
+
+
+def get_user_taste_vector(db_session: Session, user_id) -> Optional[np.ndarray]:
+    """
+    取得使用者的品味向量（已正規化的 float32）
+
+    只讀取：列不存在、embedding 版本不符或過期（_taste_row_is_current）時在記憶體中整份計算，
+    寫入交給背景重算。
+
+    Returns:
+        品味向量；清單中沒有任何有 embedding 的電影時返回 None
+    """
+    from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+
+    row = db_session.execute(
+        text("""
+            SELECT weighted_sum, total_weight, embedding_version, built_at
+            FROM user_taste_vectors
+            WHERE user_id = :user_id
+        """),
+        {"user_id": user_id}
+    ).fetchone()
+
+    if row is None or row[2] != EMBEDDING_MODEL or not _taste_row_is_current(db_session, user_id, row):
+        weighted_sum, total_weight = _compute_taste_sum(db_session, user_id, EMBEDDING_DIM)
+        schedule_taste_vector_rebuild(user_id, EMBEDDING_DIM, EMBEDDING_MODEL)
+        if total_weight <= _MIN_TOTAL_WEIGHT:
+            return None
+    elif float(row[1]) <= _MIN_TOTAL_WEIGHT:
+        return None
+    else:
+        weighted_sum = decode_embedding_bin(row[0], "f4")
+
+    norm = float(np.linalg.norm(weighted_sum))
+    if norm == 0.0:
+        return None
+    return (np.asarray(weighted_sum) / norm).astype(np.float32)
+
+
+def _taste_row_is_current(db_session: Session, user_id, row) -> bool:
+    """
+    核對品味向量列與目前的清單 / 電影向量是否一致（只讀取權重與 updated_at，不讀取向量）
+
+    - built_at 為 NULL（舊資料）→ 過期
+    - 清單中任一部電影的向量在 built_at 之後建立或更新 → 過期
+    - 清單中有 embedding 的電影權重總和與 total_weight 不符 → 過期
+    """
+    built_at = row[3]
+    if built_at is None:
+        return False
+    weights = saved_movie_weights(db_session, user_id)
+    embedded, latest_update = _embedded_state(db_session, list(weights))
+    if latest_update is not None and latest_update > built_at:
+        return False
+    expected_total = sum(weights[tmdb_id] for tmdb_id in embedded)
+    return abs(expected_total - float(row[1])) <= _TOTAL_WEIGHT_TOLERANCE * max(1.0, expected_total)
+
+
+# ============================================================================
+# 背景重算（讀取路徑發現列不存在、版本不符或過期時）
+# ============================================================================
+
+_rebuild_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="taste-rebuild")
+_pending_rebuilds: Set = set()
+_pending_lock = threading.Lock()
+
+
+def _rebuild_in_background(user_id, dim: int, embedding_version: str) -> None:
+    from db.database import SessionLocal
+
+    try:
+        with SessionLocal() as db:
+            # 鎖定既有的列，與同一使用者的增量更新（apply_taste_deltas）依序執行
+            db.execute(
+                text("SELECT 1 FROM user_taste_vectors WHERE user_id = :user_id FOR UPDATE"),
+                {"user_id": user_id}
+            )
+            rebuild_user_taste_vector(db, user_id, dim, embedding_version)
+    except Exception as e:
+        logger.warning(f"   ⚠️  [TasteVector] 使用者 {user_id} 品味向量背景重算失敗: {e}")
+    finally:
+        with _pending_lock:
+            _pending_rebuilds.discard(user_id)
+
+
+def schedule_taste_vector_rebuild(user_id, dim: int, embedding_version: str) -> bool:
+    """
+    排入背景重算並寫入品味向量；同一使用者已在排隊時不重複排入
+
+    Returns:
+        是否排入了新的重算
+    """
+    with _pending_lock:
+        if user_id in _pending_rebuilds:
+            return False
+        _pending_rebuilds.add(user_id)
+    _rebuild_executor.submit(_rebuild_in_background, user_id, dim, embedding_version)
+    return True
+
+
+def blend_query_with_taste(query_embedding, taste_vector: np.ndarray, taste_weight: float) -> np.ndarray:
+    """
+    查詢 Embedding 與品味向量混合：(1 - w)·q̂ + w·t̂（向量索引搜索時會再正規化）
+
+    cosine similarity 對查詢向量是線性的，混合後的排名等同兩者分數的加權和，
+    向量搜索仍只需一次矩陣-向量乘法。
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(query))
+    if norm > 0.0:
+        query = query / norm
+    return (1.0 - taste_weight) * query + taste_weight * taste_vector
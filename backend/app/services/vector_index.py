@@ -0,0 +1,951 @@
+# app/services/vector_index.py
+"""
+電影向量索引（常駐記憶體）
+
+將 movie_vectors 的所有 embeddings 載入為一個連續、已正規化的 float32 矩陣
+(N × EMBEDDING_DIM)，並搭配平行的 tmdb_id 陣列。
+
+查詢流程：
+1. 正規化 query 向量
+2. 一次矩陣-向量乘法 (matrix @ query) 取得所有 cosine similarity
+3. argpartition 取 Top K，再只對 K 筆排序
+
+取代原本「每次請求 JOIN 全表 → 逐列 json.loads → 逐列 cosine_similarity」的 Python 迴圈。
+
+載入來源（依序）：
+1. 磁碟快照（vector_snapshot.py，唯讀 mmap，多個 worker 共用 page cache）
+2. Postgres movie_vectors（快照不存在或版本不符時；優先讀 embedding_bin，見 embedding_codec.py）
+
+增量更新：
+- Base 矩陣載入後不再修改（可能是唯讀 mmap）
+- 新增 / 更新的電影寫入小型 Delta 矩陣，被取代或刪除的 Base 列以 alive 遮罩標記
+- refresh_loaded_vector_index() 依 movie_vectors.updated_at > watermark 輪詢變更
+  （使用 idx_movie_vectors_updated），由 main.py 的背景 Task 定期呼叫
+- Delta 過大時 compact() 合併成新的 Base
+
+Hard Filter 下推：
+- index.metadata（catalog_metadata.CatalogMetadata）保存過濾欄位，與向量一同增量更新
+- search(hard_filters=...) 在矩陣乘法前套用遮罩，選擇性高時只掃描符合的列
+"""
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.embedding_codec import (
+    STORED_EMBEDDING_COLUMNS,
+    HAS_STORED_EMBEDDING,
+    decode_stored_embedding,
+)
+from app.services.ann_index import IVFIndex
+from app.services.catalog_metadata import CatalogMetadata, load_catalog_metadata, refresh_catalog_metadata
+from app.services.phase36_config import PHASE36_CONFIG
+from app.services.pipeline_trace import recommend_logger as logger
+from app.services.vector_snapshot import get_snapshot_dir, load_snapshot, parse_manifest_watermark
+
+# 符合 Hard Filters 的 Base 列不超過此比例時，只取出這些列計算（否則全庫計算後遮罩）
+_SUBSET_SCAN_RATIO = 0.5
+
+# search_batch() 每次矩陣-矩陣乘法處理的查詢數（限制 查詢數 × N 分數矩陣的記憶體）
+_BATCH_QUERY_CHUNK = 32
+
+
+class _IndexState:
+    """
+    索引在某一時間點的完整狀態
+
+    每次變更都建立新的 _IndexState 並整體替換，
+    搜索只讀取一次 self._state，因此不需要讀鎖也不會看到半套更新。
+    """
+    __slots__ = (
+        "base_ids", "base_matrix", "base_row_of", "alive", "dead_count",
+        "delta_ids", "delta_matrix", "delta_row_of", "ann", "prefix_matrix",
+    )
+
+    def __init__(
+        self, base_ids, base_matrix, base_row_of, alive, delta_ids, delta_matrix, delta_row_of,
+        ann=None, prefix_matrix=None
+    ):
+        self.base_ids = base_ids
+        self.base_matrix = base_matrix
+        self.base_row_of = base_row_of
+        self.alive = alive
+        self.dead_count = int(alive.shape[0] - np.count_nonzero(alive))
+        self.delta_ids = delta_ids
+        self.delta_matrix = delta_matrix
+        self.delta_row_of = delta_row_of
+        # 建立在 Base 矩陣上的 ANN 索引（ann_index.IVFIndex；未建立時為 None）
+        self.ann = ann
+        # Base 矩陣前 k 維重新正規化後的副本（two_stage 粗篩用；未建立時為 None）
+        self.prefix_matrix = prefix_matrix
+
+    @property
+    def live_count(self) -> int:
+        return int(self.base_ids.shape[0]) - self.dead_count + int(self.delta_ids.shape[0])
+
+
+# MovieVectorIndex.generation 的來源（next() 在 GIL 下是原子操作）
+_index_generations = itertools.count(1)
+
+
+class MovieVectorIndex:
+    """
+    常駐記憶體的向量索引（Base + Delta）
+
+    Attributes:
+        source: 載入來源 "db" | "snapshot" | "compacted"
+        watermark: 索引涵蓋到的 movie_vectors.updated_at 最大值
+        version: 每次套用變更後遞增
+        generation: 進程內建立索引的序號（單調遞增；重新載入的索引一定不同）
+        metadata: Hard Filter 下推用的欄式 Metadata（未載入時為 None，搜索不下推）
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        matrix: np.ndarray,
+        normalized: bool = False,
+        source: str = "db",
+        watermark: Optional[datetime] = None
+    ):
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+        if matrix.ndim != 2 or matrix.shape[0] != ids.shape[0]:
+            raise ValueError(
+                f"ids/matrix shape mismatch: ids={ids.shape}, matrix={matrix.shape}"
+            )
+
+        # 快照中的矩陣已正規化：直接沿用（保持 mmap，不複製）
+        if not normalized:
+            matrix = _normalize_rows(matrix)
+
+        self._dim = int(matrix.shape[1])
+        self._state = _new_base_state(ids, matrix)
+        self._write_lock = threading.Lock()
+        # 最近套用過的 (tmdb_id → updated_at)，避免 overlap 視窗內重複套用
+        self._recent_updates: Dict[int, datetime] = {}
+        # (base_ids, metadata, metadata 列號, 是否存在)：Base 列 → Metadata 列的對應快取
+        self._metadata_rows: Optional[Tuple[np.ndarray, CatalogMetadata, np.ndarray, np.ndarray]] = None
+
+        self.source = source
+        self.watermark = watermark
+        self.version = 0
+        self.generation = next(_index_generations)
+        self.metadata: Optional[CatalogMetadata] = None
+
+    def __len__(self) -> int:
+        return self._state.live_count
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @property
+    def delta_size(self) -> int:
+        return int(self._state.delta_ids.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        state = self._state
+        return int(state.base_matrix.nbytes + state.delta_matrix.nbytes)
+
+    def __contains__(self, tmdb_id: int) -> bool:
+        state = self._state
+        tmdb_id = int(tmdb_id)
+        if tmdb_id in state.delta_row_of:
+            return True
+        row = state.base_row_of.get(tmdb_id)
+        return row is not None and bool(state.alive[row])
+
+    def live_ids(self) -> np.ndarray:
+        """目前可被搜索的所有 tmdb_id"""
+        state = self._state
+        base_ids = state.base_ids[state.alive] if state.dead_count else state.base_ids
+        if state.delta_ids.shape[0] == 0:
+            return base_ids
+        return np.concatenate([base_ids, state.delta_ids])
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Tuple[int, object, Optional[datetime]]],
+        dim: int
+    ) -> "MovieVectorIndex":
+        """
+        從 (tmdb_id, embedding, updated_at) 列建立索引
+
+        embedding 可以是 embedding_bin 解碼後的 np.ndarray、JSONB 解析後的 list，或 JSON 字串
+        """
+        ids: List[int] = []
+        vectors: List[object] = []
+        watermark: Optional[datetime] = None
+        for tmdb_id, embedding_data, updated_at in rows:
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+            embedding_data = _decode_embedding(embedding_data, dim)
+            if embedding_data is None:
+                continue
+            ids.append(tmdb_id)
+            vectors.append(embedding_data)
+
+        if not ids:
+            return cls(
+                np.empty(0, dtype=np.int64),
+                np.empty((0, dim), dtype=np.float32),
+                watermark=watermark
+            )
+
+        return cls(
+            np.asarray(ids, dtype=np.int64),
+            np.asarray(vectors, dtype=np.float32),
+            watermark=watermark
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot_dir, embedding_version: str, dim: int) -> Optional["MovieVectorIndex"]:
+        """從磁碟快照以唯讀 mmap 建立索引；快照不可用時返回 None"""
+        loaded = load_snapshot(snapshot_dir, embedding_version, dim)
+        if loaded is None:
+            return None
+        ids, vectors, manifest = loaded
+        return cls(
+            ids,
+            vectors,
+            normalized=True,
+            source="snapshot",
+            watermark=parse_manifest_watermark(manifest)
+        )
+
+    @property
+    def has_ann(self) -> bool:
+        return self._state.ann is not None
+
+    @property
+    def has_prefix(self) -> bool:
+        return self._state.prefix_matrix is not None
+
+    def supports(self, engine: str) -> bool:
+        """此 engine 所需的結構是否已建立（exact 永遠可用）"""
+        if engine == "ivf":
+            return self.has_ann
+        if engine == "two_stage":
+            return self.has_prefix
+        return engine == "exact"
+
+    def search(
+        self,
+        query_vector,
+        top_k: int,
+        min_similarity: float = 0.0,
+        engine: str = "exact",
+        nprobe: int = 16,
+        shortlist_size: int = 0,
+        hard_filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top K cosine similarity 搜索
+
+        Args:
+            query_vector: 查詢向量（不需預先正規化）
+            top_k: 返回數量
+            min_similarity: 最低相似度閾值
+            engine: "exact"（掃描全部列）、
+                    "ivf"（只掃描 nprobe 個群）或
+                    "two_stage"（以前綴維度矩陣粗篩全庫，再以完整維度重算 shortlist）；
+                    所需結構尚未建立時退回 exact
+            nprobe: IVF 探測的群數（越大召回率越高、越慢）
+            shortlist_size: two_stage 粗篩保留的列數（不足 top_k 時以 top_k 計）
+            hard_filters: CatalogMetadata.build_mask() 的參數
+                          （genres / exclude_genres / year_range / year_ranges / min_rating / exclude_ids）；
+                          在矩陣乘法前以遮罩套用，Metadata 尚未載入時忽略
+
+        Returns:
+            (tmdb_ids, scores)，依分數降序排列
+        """
+        state = self._state
+        n_base = int(state.base_ids.shape[0])
+        n_delta = int(state.delta_ids.shape[0])
+        if n_base + n_delta == 0 or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # 可參與排名的列：Hard Filter 遮罩 ∩ 未刪除（None 表示全部）
+        base_keep, delta_keep = self._filter_masks(state, hard_filters)
+        if base_keep is None and state.dead_count:
+            base_keep = state.alive
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0:
+            # 零向量與任何電影的 cosine similarity 皆為 0
+            scores = np.zeros(n_base + n_delta, dtype=np.float32)
+            if base_keep is not None:
+                scores[:n_base][~base_keep] = -np.inf
+            if delta_keep is not None:
+                scores[n_base:][~delta_keep] = -np.inf
+            return self._select_top_k(state, None, scores, top_k, min_similarity)
+
+        query = query / norm
+
+        kept = int(np.count_nonzero(base_keep)) if base_keep is not None else n_base
+        if base_keep is not None and kept <= n_base * _SUBSET_SCAN_RATIO:
+            # 選擇性高的過濾（例如「90 年代 + 恐怖」）：只掃描符合的列，任何 engine 都是精確結果
+            base_rows = np.flatnonzero(base_keep)
+            scores = state.base_matrix[base_rows] @ query
+        elif engine == "ivf" and state.ann is not None:
+            # 只掃描最接近的 nprobe 個群（過濾後候選不足 top_k 時多探測幾個群）；Delta 全部精確掃描
+            min_rows = int(top_k * n_base / max(kept, 1))
+            base_rows = state.ann.candidate_rows(query, nprobe, min_rows=min_rows)
+            if base_keep is not None:
+                base_rows = base_rows[base_keep[base_rows]]
+            scores = state.base_matrix[base_rows] @ query
+        elif engine == "two_stage" and state.prefix_matrix is not None:
+            base_rows = self._prefix_shortlist(state, query, max(shortlist_size, top_k), base_keep)
+            scores = state.base_matrix[base_rows] @ query
+        else:
+            # 精確搜索：分數陣列的位置即合併列號，不需額外的列號陣列
+            base_rows = None
+            scores = state.base_matrix @ query
+            if base_keep is not None:
+                # 已被取代、刪除或被 Hard Filter 排除的 Base 列不參與排名
+                scores[~base_keep] = -np.inf
+
+        if n_delta:
+            delta_scores = state.delta_matrix @ query
+            if delta_keep is not None:
+                delta_scores[~delta_keep] = -np.inf
+            if base_rows is not None:
+                base_rows = np.concatenate([base_rows, np.arange(n_base, n_base + n_delta)])
+            scores = np.concatenate([scores, delta_scores])
+
+        return self._select_top_k(state, base_rows, scores, top_k, min_similarity)
+
+    def search_batch(
+        self,
+        query_vectors,
+        top_k: int,
+        min_similarity: float = 0.0,
+        hard_filters_list: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        多個查詢的 Top K cosine similarity 搜索（一律精確搜索）
+
+        每 _BATCH_QUERY_CHUNK 個查詢做一次 (B × dim) @ (dim × N) 矩陣-矩陣乘法，
+        Base 矩陣每個 chunk 只讀取一次，而不是每個查詢各掃描一次。
+
+        Args:
+            query_vectors: (B × dim) 查詢向量（不需預先正規化）
+            top_k: 每個查詢返回的數量
+            min_similarity: 最低相似度閾值
+            hard_filters_list: 每個查詢各自的 Hard Filters（見 search()）；None 表示都不過濾
+
+        Returns:
+            與查詢順序一致的 [(tmdb_ids, scores), ...]
+        """
+        state = self._state
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, self._dim)
+        n_queries = int(queries.shape[0])
+        n_base = int(state.base_ids.shape[0])
+        n_delta = int(state.delta_ids.shape[0])
+        if n_base + n_delta == 0 or top_k <= 0:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return [empty] * n_queries
+
+        # 零向量查詢維持為零向量：所有分數為 0（與 search() 一致）
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        queries = queries / norms
+
+        results = []
+        for start in range(0, n_queries, _BATCH_QUERY_CHUNK):
+            chunk = queries[start:start + _BATCH_QUERY_CHUNK]
+            # (B × N)：每個查詢的分數是連續的一列
+            scores = chunk @ state.base_matrix.T
+            if n_delta:
+                scores = np.concatenate([scores, chunk @ state.delta_matrix.T], axis=1)
+
+            for offset in range(chunk.shape[0]):
+                hard_filters = hard_filters_list[start + offset] if hard_filters_list else None
+                base_keep, delta_keep = self._filter_masks(state, hard_filters)
+                if base_keep is None and state.dead_count:
+                    base_keep = state.alive
+
+                row_scores = scores[offset]
+                if base_keep is not None:
+                    row_scores[:n_base][~base_keep] = -np.inf
+                if delta_keep is not None:
+                    row_scores[n_base:][~delta_keep] = -np.inf
+                results.append(self._select_top_k(state, None, row_scores, top_k, min_similarity))
+
+        return results
+
+    def _filter_masks(
+        self,
+        state: _IndexState,
+        hard_filters: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Hard Filters → (Base 列遮罩, Delta 列遮罩)；沒有可下推的條件或 Metadata 未載入時為 (None, None)
+
+        Base 列遮罩已與 alive 取交集。
+        """
+        metadata = self.metadata
+        if not hard_filters or metadata is None:
+            return None, None
+        mask = metadata.build_mask(**hard_filters)
+        if mask is None:
+            return None, None
+
+        # Base 列 → Metadata 列的對應只在 Base 或 Metadata 換新時重算
+        cached = self._metadata_rows
+        if cached is not None and cached[0] is state.base_ids and cached[1] is metadata:
+            base_rows, base_found = cached[2], cached[3]
+        else:
+            base_rows, base_found = metadata.rows_for(state.base_ids)
+            self._metadata_rows = (state.base_ids, metadata, base_rows, base_found)
+
+        base_keep = base_found & mask[base_rows]
+        if state.dead_count:
+            base_keep &= state.alive
+
+        delta_rows, delta_found = metadata.rows_for(state.delta_ids)
+        delta_keep = delta_found & mask[delta_rows]
+        return base_keep, delta_keep
+
+    @staticmethod
+    def _prefix_shortlist(
+        state: _IndexState,
+        query: np.ndarray,
+        shortlist_size: int,
+        base_keep: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        two_stage 第一階段：以前綴維度計算全庫近似分數，返回前 shortlist_size 個 Base 列號
+
+        前綴矩陣只有完整矩陣的 prefix_dims / dim，每次查詢掃描的記憶體等比例減少；
+        text-embedding-3 系列的前綴維度本身就是有效的低維 embedding。
+        """
+        prefix_dims = int(state.prefix_matrix.shape[1])
+        prefix_query = query[:prefix_dims]
+        prefix_norm = float(np.linalg.norm(prefix_query))
+        if prefix_norm > 0.0:
+            prefix_query = prefix_query / prefix_norm
+
+        coarse = state.prefix_matrix @ prefix_query
+        if base_keep is not None:
+            coarse[~base_keep] = -np.inf
+        rows = _top_k_rows(coarse, shortlist_size)
+        return rows[np.isfinite(coarse[rows])]
+
+    @staticmethod
+    def _select_top_k(
+        state: _IndexState,
+        rows: Optional[np.ndarray],
+        scores: np.ndarray,
+        top_k: int,
+        min_similarity: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        對候選列取 Top K、套用閾值，並轉回 tmdb_id
+
+        rows[i] 為 scores[i] 的合併列號（Base 在前、Delta 在後）；None 表示 scores 涵蓋全部列。
+        """
+        picked = _top_k_rows(scores, top_k)
+        top_scores = scores[picked]
+
+        keep = top_scores >= min_similarity if min_similarity > 0.0 else np.isfinite(top_scores)
+        picked = picked[keep]
+        top_scores = top_scores[keep]
+
+        if rows is not None:
+            picked = rows[picked]
+        return _rows_to_ids(state, picked), top_scores
+
+    def build_ann(
+        self,
+        nlist: Optional[int] = None,
+        n_iter: int = 10,
+        sample_size: int = 100_000
+    ) -> None:
+        """
+        在目前的 Base 矩陣上建立 IVF 索引（CPU 密集，請在背景 thread 呼叫）
+
+        只涵蓋 Base；之後的 Delta 由 search() 精確掃描，compact() 時重建。
+        """
+        state = self._state
+        if state.base_ids.shape[0] == 0:
+            return
+        ann = IVFIndex.build(state.base_matrix, nlist=nlist, n_iter=n_iter, sample_size=sample_size)
+
+        with self._write_lock:
+            current = self._state
+            if current.base_matrix is not state.base_matrix:
+                # 建立期間 Base 已被 compact() 取代，這份索引作廢
+                return
+            self._state = _IndexState(
+                current.base_ids,
+                current.base_matrix,
+                current.base_row_of,
+                current.alive,
+                current.delta_ids,
+                current.delta_matrix,
+                current.delta_row_of,
+                ann,
+                current.prefix_matrix,
+            )
+            self.version += 1
+
+    def build_prefix(self, prefix_dims: int = 256) -> None:
+        """
+        建立 two_stage 用的前綴矩陣：Base 前 prefix_dims 維、逐列重新正規化
+
+        額外記憶體約為 Base 的 prefix_dims / dim（進程私有，不在 mmap 快照中）。
+        """
+        state = self._state
+        if state.base_ids.shape[0] == 0 or prefix_dims <= 0 or prefix_dims >= self._dim:
+            return
+        prefix_matrix = _normalize_rows(np.asarray(state.base_matrix[:, :prefix_dims], dtype=np.float32))
+
+        with self._write_lock:
+            current = self._state
+            if current.base_matrix is not state.base_matrix:
+                # 建立期間 Base 已被 compact() 取代，這份前綴矩陣作廢
+                return
+            self._state = _IndexState(
+                current.base_ids,
+                current.base_matrix,
+                current.base_row_of,
+                current.alive,
+                current.delta_ids,
+                current.delta_matrix,
+                current.delta_row_of,
+                current.ann,
+                prefix_matrix,
+            )
+            self.version += 1
+
+    def upsert(self, tmdb_id: int, vector) -> None:
+        """新增或更新單一電影的向量（供即時計算 embedding 後使用）"""
+        self.apply_changes(upserts=[(tmdb_id, vector)])
+
+    def apply_changes(
+        self,
+        upserts: Iterable[Tuple[int, object]] = (),
+        deletes: Iterable[int] = (),
+        watermark: Optional[datetime] = None
+    ) -> int:
+        """
+        套用增量變更（只寫入 Delta / alive 遮罩，不複製 Base 矩陣）
+
+        Args:
+            upserts: [(tmdb_id, vector)]，vector 不需預先正規化
+            deletes: 要移除的 tmdb_id
+            watermark: 套用後的新 watermark（只會往前推進）
+
+        Returns:
+            實際變更的電影數
+        """
+        with self._write_lock:
+            old = self._state
+            alive = old.alive
+            alive_copied = False
+            delta: Dict[int, np.ndarray] = {
+                tmdb_id: old.delta_matrix[row]
+                for tmdb_id, row in old.delta_row_of.items()
+            }
+            changed = 0
+
+            def retire_base_row(tmdb_id: int) -> None:
+                nonlocal alive, alive_copied
+                row = old.base_row_of.get(tmdb_id)
+                if row is not None and alive[row]:
+                    if not alive_copied:
+                        alive = alive.copy()
+                        alive_copied = True
+                    alive[row] = False
+
+            for tmdb_id in deletes:
+                tmdb_id = int(tmdb_id)
+                if tmdb_id in self:
+                    changed += 1
+                retire_base_row(tmdb_id)
+                delta.pop(tmdb_id, None)
+
+            for tmdb_id, vector in upserts:
+                tmdb_id = int(tmdb_id)
+                vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+                if vector.shape[1] != self._dim:
+                    continue
+                retire_base_row(tmdb_id)
+                delta[tmdb_id] = _normalize_rows(vector)[0]
+                changed += 1
+
+            if not changed:
+                if watermark is not None and (self.watermark is None or watermark > self.watermark):
+                    self.watermark = watermark
+                return 0
+
+            delta_ids = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+            if delta:
+                delta_matrix = np.ascontiguousarray(np.stack(list(delta.values())), dtype=np.float32)
+            else:
+                delta_matrix = np.empty((0, self._dim), dtype=np.float32)
+
+            self._state = _IndexState(
+                old.base_ids,
+                old.base_matrix,
+                old.base_row_of,
+                alive,
+                delta_ids,
+                delta_matrix,
+                {tmdb_id: row for row, tmdb_id in enumerate(delta.keys())},
+                old.ann,
+                old.prefix_matrix,
+            )
+            if watermark is not None and (self.watermark is None or watermark > self.watermark):
+                self.watermark = watermark
+            self.version += 1
+            return changed
+
+    def compact(self) -> None:
+        """
+        將 Base（扣除已刪除列）與 Delta 合併成新的 Base
+
+        合併後的矩陣是進程私有記憶體（不再共用快照的 page cache），
+        重新產生快照後重啟即可恢復共用。
+        IVF 索引與前綴矩陣綁定舊的 Base，合併後需重新呼叫 build_ann() / build_prefix()。
+        """
+        with self._write_lock:
+            old = self._state
+            base_ids = old.base_ids[old.alive] if old.dead_count else old.base_ids
+            base_matrix = old.base_matrix[old.alive] if old.dead_count else old.base_matrix
+            ids = np.concatenate([base_ids, old.delta_ids])
+            matrix = np.ascontiguousarray(np.vstack([base_matrix, old.delta_matrix]), dtype=np.float32)
+            self._state = _new_base_state(ids, matrix)
+            self.source = "compacted"
+            self.version += 1
+
+    def should_compact(self, max_delta_ratio: float) -> bool:
+        """Delta + 已刪除列超過 Base 的一定比例時建議合併"""
+        state = self._state
+        n_base = max(int(state.base_ids.shape[0]), 1)
+        return (int(state.delta_ids.shape[0]) + state.dead_count) / n_base > max_delta_ratio
+
+
+def _new_base_state(ids: np.ndarray, matrix: np.ndarray) -> _IndexState:
+    return _IndexState(
+        ids,
+        matrix,
+        {tmdb_id: row for row, tmdb_id in enumerate(ids.tolist())},
+        np.ones(ids.shape[0], dtype=bool),
+        np.empty(0, dtype=np.int64),
+        np.empty((0, matrix.shape[1]), dtype=np.float32),
+        {},
+    )
+
+
+def _rows_to_ids(state: _IndexState, rows: np.ndarray) -> np.ndarray:
+    """將合併分數陣列中的列號轉回 tmdb_id（前段為 Base，後段為 Delta）"""
+    n_base = int(state.base_ids.shape[0])
+    if state.delta_ids.shape[0] == 0:
+        return state.base_ids[rows]
+    ids = np.empty(rows.shape[0], dtype=np.int64)
+    in_base = rows < n_base
+    ids[in_base] = state.base_ids[rows[in_base]]
+    ids[~in_base] = state.delta_ids[rows[~in_base] - n_base]
+    return ids
+
+
+def _decode_embedding(embedding_data, dim: int):
+    """解析 DB 中的 embedding（np.ndarray、JSONB list 或 JSON 字串）；維度不符時返回 None"""
+    if embedding_data is None:
+        return None
+    if isinstance(embedding_data, str):
+        embedding_data = json.loads(embedding_data)
+    if len(embedding_data) != dim:
+        # 維度不符（舊模型或損壞資料），略過
+        return None
+    return embedding_data
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """逐列 L2 正規化；零向量保持為零（相似度為 0）"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def _top_k_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """argpartition 取 Top K，只對 K 筆排序"""
+    n = scores.shape[0]
+    if top_k >= n:
+        return np.argsort(-scores, kind="stable")
+    rows = np.argpartition(-scores, top_k - 1)[:top_k]
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+# ============================================================================
+# 進程內單例
+# ============================================================================
+
+_index: Optional[MovieVectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def load_vector_index(db_session: Session, dim: int) -> MovieVectorIndex:
+    """從 DB 載入所有（有對應 movies 的）電影向量"""
+    query = text(f"""
+        SELECT mv.tmdb_id, {STORED_EMBEDDING_COLUMNS}, mv.updated_at
+        FROM movie_vectors mv
+        JOIN movies m ON mv.tmdb_id = m.tmdb_id
+        WHERE {HAS_STORED_EMBEDDING}
+    """)
+    rows = (
+        (tmdb_id, decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json), updated_at)
+        for tmdb_id, embedding_bin, embedding_dtype, embedding_json, updated_at in db_session.execute(query)
+    )
+    return MovieVectorIndex.from_rows(rows, dim=dim)
+
+
+def get_vector_index(
+    db_session: Optional[Session],
+    dim: int,
+    embedding_version: Optional[str] = None
+) -> MovieVectorIndex:
+    """
+    取得進程內的向量索引（首次呼叫時載入）
+
+    優先以 mmap 開啟磁碟快照；快照不存在或版本不符時從 DB 載入。
+    """
+    global _index
+    if _index is not None:
+        return _index
+
+    with _index_lock:
+        if _index is None:
+            index = None
+            if embedding_version:
+                index = MovieVectorIndex.from_snapshot(get_snapshot_dir(), embedding_version, dim)
+            if index is None:
+                if db_session is None:
+                    raise RuntimeError("Vector snapshot unavailable and no db_session given")
+                index = load_vector_index(db_session, dim)
+            _install_index(index, db_session)
+    return _index
+
+
+def _install_index(index: MovieVectorIndex, db_session: Optional[Session]) -> None:
+    """設定進程內索引（呼叫端持有 _index_lock）；有 db_session 時一併載入 CatalogMetadata"""
+    global _index
+    if db_session is not None:
+        index.metadata = load_catalog_metadata(db_session)
+    _index = index
+    logger.info(
+        f"   ✓ [VectorIndex] 從 {index.source} 載入 {len(index)} 部電影向量 "
+        f"({index.nbytes / 1024 / 1024:.1f} MB)"
+    )
+
+
+def warm_vector_index(dim: int, embedding_version: str) -> MovieVectorIndex:
+    """
+    啟動時預先載入索引（供 FastAPI startup 使用）
+
+    只在快照不可用時才開 DB session。
+    """
+    index = get_loaded_vector_index()
+    if index is not None:
+        return index
+
+    # 快照只開啟一次：可用時直接安裝，不可用時才從 DB 載入（不再重試快照）
+    snapshot_index = MovieVectorIndex.from_snapshot(get_snapshot_dir(), embedding_version, dim)
+    if snapshot_index is not None:
+        with _index_lock:
+            if _index is None:
+                _install_index(snapshot_index, None)
+        index = _index
+    else:
+        from db.database import SessionLocal
+        with SessionLocal() as db:
+            index = get_vector_index(db, dim)
+
+    ensure_search_structures(index)
+    return index
+
+
+def ensure_search_structures(index: MovieVectorIndex) -> bool:
+    """
+    依 PHASE36_CONFIG["embedding_search"]["engine"] 建立搜索所需的結構（尚未建立時）
+
+    - "ivf"：IVF 索引（Base 夠大時）
+    - "two_stage"：前綴維度矩陣
+
+    在 startup 預熱與背景增量更新（compact 之後）的 thread 中呼叫，不在請求路徑上建立。
+
+    Returns:
+        是否新建了結構
+    """
+    cfg = PHASE36_CONFIG.get("embedding_search", {})
+    engine = cfg.get("engine", "exact")
+
+    if engine == "two_stage" and not index.has_prefix:
+        started = time.perf_counter()
+        index.build_prefix(cfg.get("two_stage_prefix_dims", 256))
+        if not index.has_prefix:
+            return False
+        logger.info(f"   ✓ [VectorIndex] 前綴矩陣建立完成 ({time.perf_counter() - started:.1f}s)")
+        return True
+
+    if engine != "ivf" or index.has_ann:
+        return False
+    if len(index) < cfg.get("ivf_min_rows", 20000):
+        return False
+
+    started = time.perf_counter()
+    index.build_ann(
+        nlist=cfg.get("ivf_nlist"),
+        n_iter=cfg.get("ivf_train_iterations", 10),
+        sample_size=cfg.get("ivf_train_sample", 100_000),
+    )
+    if not index.has_ann:
+        return False
+    logger.info(f"   ✓ [VectorIndex] IVF 索引建立完成 ({time.perf_counter() - started:.1f}s)")
+    return True
+
+
+def get_loaded_vector_index() -> Optional[MovieVectorIndex]:
+    """返回已載入的索引（未載入時返回 None，不觸發載入）"""
+    return _index
+
+
+def invalidate_vector_index() -> None:
+    """丟棄目前的索引，下次搜索時重新載入"""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+# ============================================================================
+# 增量更新（movie_vectors.updated_at 輪詢）
+# ============================================================================
+
+def refresh_vector_index(
+    db_session: Session,
+    index: MovieVectorIndex,
+    sync_deletions: bool = False,
+    overlap_seconds: float = 30.0
+) -> Dict[str, int]:
+    """
+    將 updated_at > watermark 的變更套用到索引
+
+    - 新增 / 重新計算的 embedding → upsert
+    - embedding 被清空、或對應的 movies 已刪除 → delete
+    - sync_deletions=True 時，比對 DB 中所有 tmdb_id，
+      移除因 movies cascade 而整列消失的向量（這類刪除不會留下 updated_at）
+
+    overlap_seconds：watermark 往回多看一段時間，
+    涵蓋「交易開始得早、提交得晚」而 updated_at 早於 watermark 的列；
+    同一 (tmdb_id, updated_at) 不會重複套用。
+
+    Returns:
+        {"upserted": n, "deleted": n}
+    """
+    params = {}
+    where = ""
+    if index.watermark is not None:
+        where = "WHERE mv.updated_at > :since"
+        params["since"] = index.watermark - timedelta(seconds=overlap_seconds)
+
+    query = text(f"""
+        SELECT mv.tmdb_id, {STORED_EMBEDDING_COLUMNS}, mv.updated_at, m.tmdb_id IS NOT NULL AS has_movie
+        FROM movie_vectors mv
+        LEFT JOIN movies m ON mv.tmdb_id = m.tmdb_id
+        {where}
+        ORDER BY mv.updated_at
+    """)
+
+    upserts: List[Tuple[int, object]] = []
+    deletes: Set[int] = set()
+    new_watermark = index.watermark
+    recent = index._recent_updates
+
+    rows = db_session.execute(query, params)
+    for tmdb_id, embedding_bin, embedding_dtype, embedding_json, updated_at, has_movie in rows:
+        if new_watermark is None or updated_at > new_watermark:
+            new_watermark = updated_at
+        if recent.get(tmdb_id) == updated_at:
+            continue
+        recent[tmdb_id] = updated_at
+
+        vector = None
+        if has_movie:
+            vector = _decode_embedding(
+                decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json), index.dim
+            )
+        if vector is None:
+            deletes.add(tmdb_id)
+        else:
+            upserts.append((tmdb_id, vector))
+
+    if sync_deletions:
+        result = db_session.execute(text(f"""
+            SELECT mv.tmdb_id
+            FROM movie_vectors mv
+            JOIN movies m ON mv.tmdb_id = m.tmdb_id
+            WHERE {HAS_STORED_EMBEDDING}
+        """))
+        db_ids = np.fromiter((row[0] for row in result), dtype=np.int64)
+        upserted_ids = np.fromiter((tmdb_id for tmdb_id, _ in upserts), dtype=np.int64)
+        missing = np.setdiff1d(index.live_ids(), np.concatenate([db_ids, upserted_ids]))
+        deletes.update(missing.tolist())
+
+    # 清理 overlap 視窗外的紀錄
+    if new_watermark is not None:
+        cutoff = new_watermark - timedelta(seconds=overlap_seconds)
+        for tmdb_id in [k for k, v in recent.items() if v <= cutoff]:
+            del recent[tmdb_id]
+
+    index.apply_changes(upserts=upserts, deletes=deletes, watermark=new_watermark)
+    return {"upserted": len(upserts), "deleted": len(deletes)}
+
+
+def refresh_loaded_vector_index(
+    sync_deletions: bool = False,
+    overlap_seconds: float = 30.0,
+    max_delta_ratio: float = 0.2
+) -> Optional[Dict[str, int]]:
+    """
+    背景 Task 使用：對已載入的索引做一次增量更新（索引未載入時不做事）
+    """
+    index = get_loaded_vector_index()
+    if index is None:
+        return None
+
+    from db.database import SessionLocal
+    with SessionLocal() as db:
+        stats = refresh_vector_index(db, index, sync_deletions, overlap_seconds)
+        # 快照載入（沒有 DB session）的索引在此補上 Metadata；sync_deletions 時整份重載以移除已刪除的電影
+        if index.metadata is None or sync_deletions:
+            index.metadata = load_catalog_metadata(db)
+        else:
+            index.metadata, _ = refresh_catalog_metadata(db, index.metadata, overlap_seconds)
+
+    if stats["upserted"] or stats["deleted"]:
+        logger.info(
+            f"   ✓ [VectorIndex] 增量更新: +{stats['upserted']} / -{stats['deleted']} "
+            f"(共 {len(index)} 部，Delta {index.delta_size})"
+        )
+
+    if index.should_compact(max_delta_ratio):
+        index.compact()
+        logger.info(f"   ✓ [VectorIndex] Delta 已合併 (共 {len(index)} 部)")
+
+    # 索引是請求路徑上延遲載入的、或剛合併過：在這個背景 thread 中（重新）建立 IVF / 前綴矩陣
+    ensure_search_structures(index)
+
+    return stats
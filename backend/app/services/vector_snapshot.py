@@ -0,0 +1,205 @@
+# app/services/vector_snapshot.py
+"""
+電影向量快照（磁碟格式 + mmap 載入）
+
+快照目錄結構：
+    CURRENT                    目前生效的 build_id（單一檔案，以 os.replace 原子切換）
+    builds/<build_id>/
+        vectors.npy            已正規化的 float32 矩陣 (N × dim)
+        ids.npy                平行的 tmdb_id 陣列 (int64, N)
+        manifest.json          {"format_version", "build_id", "embedding_version", "rows", "dim",
+                                "ids_sha1", "max_updated_at", "created_at"}
+
+每次匯出寫入新的 build 目錄，完成後才把 CURRENT 指向它：worker 在任何時間點
+（包括匯出途中崩潰後）讀到的都是同一個 build 的 vectors / ids / manifest，
+不會把新的向量配上舊的 id。build 目錄寫入後不再修改；manifest 的 build_id 與
+ids_sha1 在載入時驗證（ids.npy 很小，雜湊成本可忽略）。
+舊 build 保留上一個（可能仍有 worker mmap 中），更舊的在下次匯出時刪除。
+
+每個 uvicorn worker 以唯讀 mmap 開啟 vectors.npy，
+N 個 worker 透過 page cache 共用同一份實體記憶體，而不是各自解碼一份。
+
+快照由 tools/build_vector_snapshot.py 從 Postgres 匯出。
+"""
+import hashlib
+import json
+import os
+import secrets
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.services.pipeline_trace import recommend_logger as logger
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.npy"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+BUILDS_DIR = "builds"
+
+# 預設快照位置：backend/data/vector_snapshot（可用環境變數覆蓋）
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parents[2] / "data" / "vector_snapshot"
+
+
+def get_snapshot_dir() -> Path:
+    """快照目錄（環境變數 VECTOR_SNAPSHOT_DIR 優先）"""
+    return Path(os.getenv("VECTOR_SNAPSHOT_DIR") or DEFAULT_SNAPSHOT_DIR)
+
+
+def _ids_sha1(ids: np.ndarray) -> str:
+    return hashlib.sha1(np.ascontiguousarray(ids, dtype=np.int64).tobytes()).hexdigest()
+
+
+def open_snapshot_writer(snapshot_dir: Path, rows: int, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    在新的 build 目錄建立可逐批寫入的快照檔（commit_snapshot() 切換 CURRENT 後才生效）
+
+    Returns:
+        (ids, vectors) 兩個可寫入的 memmap 陣列
+    """
+    # build_id 以時間開頭，目錄名稱的排序即建立順序
+    build_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{secrets.token_hex(4)}"
+    build_dir = snapshot_dir / BUILDS_DIR / build_id
+    build_dir.mkdir(parents=True)
+    vectors = np.lib.format.open_memmap(
+        build_dir / VECTORS_FILE, mode="w+", dtype=np.float32, shape=(rows, dim)
+    )
+    ids = np.lib.format.open_memmap(
+        build_dir / IDS_FILE, mode="w+", dtype=np.int64, shape=(rows,)
+    )
+    return ids, vectors
+
+
+def read_current_build(snapshot_dir: Path) -> Optional[str]:
+    """CURRENT 指向的 build_id（尚未有快照時返回 None）"""
+    try:
+        return (snapshot_dir / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def commit_snapshot(
+    snapshot_dir: Path,
+    ids: np.ndarray,
+    vectors: np.ndarray,
+    rows: int,
+    embedding_version: str,
+    max_updated_at: Optional[datetime] = None
+) -> dict:
+    """
+    完成 build 目錄並原子性地把 CURRENT 指向它
+
+    build 目錄內的檔案全部寫好（含 manifest）後才切換 CURRENT，
+    讀取端只會看到舊的完整快照或新的完整快照。
+    rows 可小於預先配置的列數（匯出途中有列被刪除或略過）。
+    """
+    build_dir = Path(vectors.filename).parent
+    dim = int(vectors.shape[1])
+    vectors.flush()
+    ids.flush()
+    del vectors, ids
+
+    # 實際列數少於預配置時，截斷成正確大小
+    allocated = np.load(build_dir / IDS_FILE, mmap_mode="r").shape[0]
+    if rows != allocated:
+        for name in (VECTORS_FILE, IDS_FILE):
+            path = build_dir / name
+            data = np.load(path, mmap_mode="r")[:rows]
+            np.save(build_dir / f"{name}.trim.npy", np.ascontiguousarray(data))
+            del data
+            os.replace(build_dir / f"{name}.trim.npy", path)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "build_id": build_dir.name,
+        "embedding_version": embedding_version,
+        "rows": rows,
+        "dim": dim,
+        "ids_sha1": _ids_sha1(np.load(build_dir / IDS_FILE, mmap_mode="r")),
+        "max_updated_at": max_updated_at.isoformat() if max_updated_at else None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    (build_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    previous = read_current_build(snapshot_dir)
+    tmp_current = snapshot_dir / f"{CURRENT_FILE}.tmp"
+    tmp_current.write_text(build_dir.name, encoding="utf-8")
+    os.replace(tmp_current, snapshot_dir / CURRENT_FILE)
+
+    _prune_builds(snapshot_dir, keep={build_dir.name, previous})
+    return manifest
+
+
+def _prune_builds(snapshot_dir: Path, keep: set) -> None:
+    """刪除比保留的 build 更舊的 build 目錄（較新的可能是其他程序正在匯出）"""
+    oldest_kept = min(build_id for build_id in keep if build_id)
+    for build_dir in (snapshot_dir / BUILDS_DIR).iterdir():
+        if build_dir.name not in keep and build_dir.name < oldest_kept:
+            # 已 mmap 的 worker 不受影響（inode 在解除映射前仍存在）
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def load_snapshot(
+    snapshot_dir: Path,
+    embedding_version: str,
+    dim: int
+) -> Optional[Tuple[np.ndarray, np.ndarray, dict]]:
+    """
+    以唯讀 mmap 載入 CURRENT 指向的快照
+
+    Returns:
+        (ids, vectors, manifest)；快照不存在、版本或維度不符、檔案不一致時返回 None
+    """
+    build_id = read_current_build(snapshot_dir)
+    if build_id is None:
+        return None
+    build_dir = snapshot_dir / BUILDS_DIR / build_id
+
+    try:
+        manifest = json.loads((build_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning(f"   ⚠️  [VectorSnapshot] manifest 無法讀取: {e}")
+        return None
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        logger.warning(f"   ⚠️  [VectorSnapshot] 格式版本不符: {manifest.get('format_version')}")
+        return None
+    if manifest.get("build_id") != build_id:
+        logger.warning(f"   ⚠️  [VectorSnapshot] build_id 不符: {manifest.get('build_id')} != {build_id}")
+        return None
+    if manifest.get("embedding_version") != embedding_version:
+        logger.warning(f"   ⚠️  [VectorSnapshot] embedding 版本不符: {manifest.get('embedding_version')} != {embedding_version}")
+        return None
+    if manifest.get("dim") != dim:
+        logger.warning(f"   ⚠️  [VectorSnapshot] 維度不符: {manifest.get('dim')} != {dim}")
+        return None
+
+    try:
+        vectors = np.load(build_dir / VECTORS_FILE, mmap_mode="r")
+        ids = np.load(build_dir / IDS_FILE, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        logger.warning(f"   ⚠️  [VectorSnapshot] 快照檔無法開啟: {e}")
+        return None
+
+    rows = manifest.get("rows")
+    if vectors.shape != (rows, dim) or ids.shape != (rows,) or vectors.dtype != np.float32:
+        logger.warning(f"   ⚠️  [VectorSnapshot] 快照檔與 manifest 不一致，忽略")
+        return None
+    if _ids_sha1(ids) != manifest.get("ids_sha1"):
+        logger.warning(f"   ⚠️  [VectorSnapshot] ids.npy 與 manifest 的 ids_sha1 不符，忽略")
+        return None
+
+    return ids, vectors, manifest
+
+
+def parse_manifest_watermark(manifest: dict) -> Optional[datetime]:
+    """manifest 中的 max_updated_at（快照涵蓋到的最後更新時間）"""
+    value = manifest.get("max_updated_at")
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
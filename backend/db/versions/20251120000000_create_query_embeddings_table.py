@@ -0,0 +1,40 @@
+"""create query_embeddings cache table
+
+Revision ID: 20251120000000
+Revises: a893511813f3
+Create Date: 2025-11-20 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251120000000'
+down_revision: Union[str, Sequence[str], None] = 'a893511813f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the persistent tier of the query embedding cache."""
+    op.create_table(
+        'query_embeddings',
+        sa.Column('cache_key', sa.String(64), nullable=False, comment='sha256(model + normalized query text)'),
+        sa.Column('model', sa.String(50), nullable=False, comment='Embedding model (e.g., text-embedding-3-small)'),
+        sa.Column('query_text', sa.Text(), nullable=False, comment='Normalized query text'),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False, comment='Little-endian float32 vector'),
+        sa.Column('hit_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_used_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index('idx_query_embeddings_last_used', 'query_embeddings', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop query_embeddings table."""
+    op.drop_index('idx_query_embeddings_last_used', table_name='query_embeddings')
+    op.drop_table('query_embeddings')
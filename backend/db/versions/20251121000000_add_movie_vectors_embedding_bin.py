@@ -0,0 +1,92 @@
+"""add binary embedding column to movie_vectors
+
+Revision ID: 20251121000000
+Revises: 20251120000000
+Create Date: 2025-11-21 00:00:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251121000000'
+down_revision: Union[str, Sequence[str], None] = '20251120000000'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    """Add embedding_bin / embedding_dtype and backfill them from the JSONB column."""
+    op.add_column(
+        'movie_vectors',
+        sa.Column('embedding_bin', sa.LargeBinary(), nullable=True, comment='Little-endian float vector (see embedding_dtype)')
+    )
+    op.add_column(
+        'movie_vectors',
+        sa.Column('embedding_dtype', sa.String(4), nullable=True, comment="Binary format: 'f4' (float32) or 'f2' (float16)")
+    )
+
+    # Backfill in batches; updated_at is left untouched so the vector index does not reload every row
+    conn = op.get_bind()
+    last_id = -1
+    while True:
+        rows = conn.execute(sa.text("""
+            SELECT tmdb_id, embedding
+            FROM movie_vectors
+            WHERE tmdb_id > :last_id
+              AND embedding IS NOT NULL
+              AND embedding_bin IS NULL
+            ORDER BY tmdb_id
+            LIMIT :limit
+        """), {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for tmdb_id, embedding in rows:
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            params.append({
+                "tmdb_id": tmdb_id,
+                "embedding_bin": np.asarray(embedding, dtype='<f4').tobytes(),
+            })
+        conn.execute(sa.text("""
+            UPDATE movie_vectors
+            SET embedding_bin = :embedding_bin, embedding_dtype = 'f4'
+            WHERE tmdb_id = :tmdb_id
+        """), params)
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Restore JSONB for binary-only rows, then drop the binary embedding columns."""
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("""
+        SELECT tmdb_id, embedding_bin, embedding_dtype
+        FROM movie_vectors
+        WHERE embedding IS NULL AND embedding_bin IS NOT NULL
+    """)).fetchall()
+    if rows:
+        conn.execute(sa.text("""
+            UPDATE movie_vectors
+            SET embedding = CAST(:embedding AS jsonb)
+            WHERE tmdb_id = :tmdb_id
+        """), [
+            {
+                "tmdb_id": tmdb_id,
+                "embedding": json.dumps(
+                    np.frombuffer(embedding_bin, dtype='<f2' if embedding_dtype == 'f2' else '<f4').tolist()
+                ),
+            }
+            for tmdb_id, embedding_bin, embedding_dtype in rows
+        ])
+
+    op.drop_column('movie_vectors', 'embedding_dtype')
+    op.drop_column('movie_vectors', 'embedding_bin')
@@ -0,0 +1,39 @@
+"""create movie_neighbors table
+
+Revision ID: 20251122000000
+Revises: 20251121000000
+Create Date: 2025-11-22 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251122000000'
+down_revision: Union[str, Sequence[str], None] = '20251121000000'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the precomputed top-K cosine neighbour table (filled by tools/build_movie_neighbors.py)."""
+    op.create_table(
+        'movie_neighbors',
+        sa.Column('tmdb_id', sa.Integer(), nullable=False),
+        sa.Column('neighbor_ids', postgresql.ARRAY(sa.Integer()), nullable=False, comment='Neighbour tmdb_ids, most similar first'),
+        sa.Column('scores', postgresql.ARRAY(sa.REAL()), nullable=False, comment='Cosine similarity for each neighbour'),
+        sa.Column('embedding_version', sa.String(50), nullable=False, comment='Embedding model the neighbours were computed with'),
+        sa.Column('source_updated_at', sa.TIMESTAMP(timezone=True), nullable=True, comment='movie_vectors.updated_at of this movie when computed'),
+        sa.Column('computed_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tmdb_id'], ['movies.tmdb_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tmdb_id')
+    )
+
+
+def downgrade() -> None:
+    """Drop movie_neighbors table."""
+    op.drop_table('movie_neighbors')
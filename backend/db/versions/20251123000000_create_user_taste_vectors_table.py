@@ -0,0 +1,38 @@
+"""create user_taste_vectors table
+
+Revision ID: 20251123000000
+Revises: 20251122000000
+Create Date: 2025-11-23 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251123000000'
+down_revision: Union[str, Sequence[str], None] = '20251122000000'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the per-user taste vector table (maintained incrementally by app/services/user_taste.py)."""
+    op.create_table(
+        'user_taste_vectors',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('weighted_sum', sa.LargeBinary(), nullable=False, comment='Little-endian float32 weighted sum of normalized movie embeddings'),
+        sa.Column('total_weight', sa.Float(), nullable=False, comment='Sum of the weights in weighted_sum'),
+        sa.Column('embedding_version', sa.String(50), nullable=False, comment='Embedding model of the summed vectors'),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Drop user_taste_vectors table."""
+    op.drop_table('user_taste_vectors')
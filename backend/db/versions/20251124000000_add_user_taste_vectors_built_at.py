@@ -0,0 +1,32 @@
+"""add built_at to user_taste_vectors
+
+Revision ID: 20251124000000
+Revises: 20251123000000
+Create Date: 2025-11-24 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20251124000000'
+down_revision: Union[str, Sequence[str], None] = '20251123000000'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Record when each taste vector was last fully rebuilt (existing rows stay NULL and are rebuilt on next use)."""
+    op.add_column(
+        'user_taste_vectors',
+        sa.Column('built_at', sa.TIMESTAMP(timezone=True), nullable=True,
+                  comment='Last full rebuild; movie vectors updated after this force a rebuild'),
+    )
+
+
+def downgrade() -> None:
+    """Drop user_taste_vectors.built_at."""
+    op.drop_column('user_taste_vectors', 'built_at')
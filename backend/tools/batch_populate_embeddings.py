@@ -1,27 +1,19 @@
 ﻿"""
 批次填充缺失的 Embeddings（只處理熱門電影前 500 部）
 """
-import os, json, time
+import os, sys, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv()
 
 from sqlalchemy import create_engine, text as sql_text
-from openai import OpenAI
+from sqlalchemy.orm import Session
+from app.services.embedding_service import get_embeddings_batch, store_movie_embeddings_batch
 
 engine = create_engine(os.getenv("DATABASE_URL"))
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def generate_embedding(content: str) -> list:
-    """生成文本的 embedding"""
-    try:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=content
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"     Embedding 生成失敗: {e}")
-        return None
+BATCH_SIZE = 100  # 每次 embeddings API 請求 + bulk UPSERT 的電影數
 
 print(f"\n{'='*70}")
 print(f" 開始補齊熱門電影 Embeddings")
@@ -55,37 +47,30 @@ with engine.connect() as conn:
     success = 0
     failed = 0
     
-    for idx, (tmdb_id, title, overview) in enumerate(missing_movies, 1):
-        print(f"[{idx}/{total}] {title[:40]}...", end=" ")
-        
-        # 構建文本（標題 + 簡介）
-        movie_text = f"{title}. {overview or ''}"
-        
-        # 生成 embedding
-        embedding = generate_embedding(movie_text)
-        
-        if embedding:
-            # 存入資料庫
-            conn.execute(sql_text("""
-                INSERT INTO movie_vectors (tmdb_id, embedding)
-                VALUES (:tmdb_id, :embedding)
-            """), {
-                "tmdb_id": tmdb_id,
-                "embedding": json.dumps(embedding)
-            })
-            conn.commit()
-            success += 1
-            print(f"")
-        else:
-            failed += 1
-            print(f"")
-        
-        # Rate limit
-        time.sleep(0.3)
-        
-        # 每 10 部顯示進度
-        if idx % 10 == 0:
-            print(f"\n 進度: {idx}/{total} ({idx/total*100:.1f}%) | 成功: {success} | 失敗: {failed}\n")
+    with Session(engine) as db:
+        for start in range(0, total, BATCH_SIZE):
+            batch = missing_movies[start:start + BATCH_SIZE]
+            
+            # 構建文本（標題 + 簡介）
+            texts = [f"{title}. {overview or ''}" for _, title, overview in batch]
+            
+            try:
+                # 一次 API 請求取得整批 embedding，再 bulk UPSERT
+                embeddings = get_embeddings_batch(texts)
+                store_movie_embeddings_batch(db, [
+                    (tmdb_id, movie_text, embedding)
+                    for (tmdb_id, _, _), movie_text, embedding in zip(batch, texts, embeddings)
+                ])
+                success += len(batch)
+            except Exception as e:
+                failed += len(batch)
+                print(f"     Embedding 批次失敗: {e}")
+            
+            done = start + len(batch)
+            print(f"\n 進度: {done}/{total} ({done/total*100:.1f}%) | 成功: {success} | 失敗: {failed}\n")
+            
+            # Rate limit
+            time.sleep(0.3)
 
 print(f"\n{'='*70}")
 print(f" 補齊完成！")
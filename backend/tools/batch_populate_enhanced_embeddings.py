@@ -21,10 +21,14 @@ import time
 from typing import Dict, List, Any
 from sqlalchemy import text
 from db.database import SessionLocal
-from app.services.embedding_service import get_embedding, EMBEDDING_MODEL
+from app.services.embedding_service import (
+    get_embeddings_batch,
+    store_movie_embeddings_batch,
+    EMBEDDING_MODEL,
+)
 
 # Configuration
-BATCH_SIZE = 50  # Process 50 movies at a time
+BATCH_SIZE = 50  # Process 50 movies at a time (one embeddings API request + one bulk upsert per batch)
 DELAY_BETWEEN_BATCHES = 1  # 1 second delay to avoid rate limits
 
 
@@ -135,6 +139,11 @@ def batch_populate_embeddings():
                 print("✓ Deleted existing embeddings")
             else:
                 print("✗ Skipping movies with existing embeddings")
+        
+        # One query for all existing ids instead of one query per movie
+        existing_ids = {
+            row[0] for row in db_session.execute(text("SELECT tmdb_id FROM movie_vectors"))
+        }
         print()
         
         # 3. Generate embeddings in batches
@@ -153,56 +162,42 @@ def batch_populate_embeddings():
             
             print(f"\n  Batch {batch_num}/{total_batches} (movies {i+1}-{min(i+BATCH_SIZE, total_movies)}):")
             
+            to_embed = []
             for movie in batch:
-                tmdb_id = movie['tmdb_id']
-                title = movie['title']
+                # Skip movies that already have an embedding (if we're not deleting)
+                if movie['tmdb_id'] in existing_ids:
+                    skipped += 1
+                    continue
+                
+                # Generate enhanced text
+                embedding_text = generate_enhanced_embedding_text(movie)
+                
+                # Estimate tokens (rough: 1 token ≈ 4 chars)
+                estimated_tokens = len(embedding_text) // 4
+                total_tokens += estimated_tokens
+                
+                to_embed.append((movie, embedding_text, estimated_tokens))
+            
+            if not to_embed:
+                continue
+            
+            try:
+                # Get all embeddings of this batch in one OpenAI request
+                embedding_vectors = get_embeddings_batch([embedding_text for _, embedding_text, _ in to_embed])
+                
+                # Store in database (bulk upsert, single commit)
+                store_movie_embeddings_batch(db_session, [
+                    (movie['tmdb_id'], embedding_text, embedding_vector)
+                    for (movie, embedding_text, _), embedding_vector in zip(to_embed, embedding_vectors)
+                ])
+                
+                successful += len(to_embed)
+                for movie, _, estimated_tokens in to_embed:
+                    print(f"    ✓ {movie['tmdb_id']}: {movie['title'][:50]}... ({estimated_tokens} tokens)")
                 
-                try:
-                    # Check if embedding already exists (if we're not deleting)
-                    if existing_count > 0:
-                        check_query = text("SELECT 1 FROM movie_vectors WHERE tmdb_id = :tmdb_id")
-                        exists = db_session.execute(check_query, {"tmdb_id": tmdb_id}).fetchone()
-                        if exists:
-                            skipped += 1
-                            continue
-                    
-                    # Generate enhanced text
-                    embedding_text = generate_enhanced_embedding_text(movie)
-                    
-                    # Estimate tokens (rough: 1 token ≈ 4 chars)
-                    estimated_tokens = len(embedding_text) // 4
-                    total_tokens += estimated_tokens
-                    
-                    # Get embedding from OpenAI
-                    embedding_vector = get_embedding(embedding_text)
-                    
-                    # Store in database
-                    insert_query = text("""
-                        INSERT INTO movie_vectors (tmdb_id, embedding_text, embedding, embedding_version, updated_at)
-                        VALUES (:tmdb_id, :embedding_text, :embedding, :embedding_version, now())
-                        ON CONFLICT (tmdb_id) 
-                        DO UPDATE SET 
-                            embedding_text = EXCLUDED.embedding_text,
-                            embedding = EXCLUDED.embedding,
-                            embedding_version = EXCLUDED.embedding_version,
-                            updated_at = now()
-                    """)
-                    
-                    db_session.execute(insert_query, {
-                        "tmdb_id": tmdb_id,
-                        "embedding_text": embedding_text,
-                        "embedding": json.dumps(embedding_vector),
-                        "embedding_version": EMBEDDING_MODEL
-                    })
-                    db_session.commit()
-                    
-                    successful += 1
-                    print(f"    ✓ {tmdb_id}: {title[:50]}... ({estimated_tokens} tokens)")
-                    
-                except Exception as e:
-                    failed += 1
-                    print(f"    ✗ {tmdb_id}: {title[:50]}... - Error: {str(e)}")
-                    db_session.rollback()
+            except Exception as e:
+                failed += len(to_embed)
+                print(f"    ✗ Batch {batch_num} ({len(to_embed)} movies) - Error: {str(e)}")
             
             # Delay between batches to avoid rate limits
             if i + BATCH_SIZE < total_movies:
@@ -0,0 +1,172 @@
+"""
+Benchmark exact vs approximate (IVF / two-stage) top-k search on the in-memory vector index.
+
+This script:
+1. Builds a MovieVectorIndex from a synthetic clustered catalog
+   (or from the on-disk vector snapshot with --snapshot)
+2. Builds the IVF index (app/services/ann_index.py) and reports build time
+3. Runs the same queries through the exact scan, through IVF at each nprobe,
+   and through the two-stage prefix search at each shortlist factor
+4. Prints recall@k (approximate results that are also in the exact top-k) and p50/p99 latency
+
+Use the report to pick PHASE36_CONFIG["embedding_search"] settings
+(engine, ivf_nprobe / ivf_nlist, two_stage_*) for large catalogs (100k+ movies).
+
+Usage:
+    python tools/benchmark_vector_search.py [--rows 100000] [--dim 1536]
+        [--queries 200] [--top-k 300] [--nlist N] [--nprobe 4 8 16 32 64]
+        [--prefix-dims 256] [--shortlist-factor 2 4 8]
+    python tools/benchmark_vector_search.py --snapshot
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from app.services.vector_index import MovieVectorIndex
+from app.services.vector_snapshot import get_snapshot_dir, load_snapshot
+
+
+def synthetic_catalog(rows: int, dim: int, clusters: int, seed: int):
+    """
+    Clustered vectors: movies of a genre/theme sit near a shared direction.
+
+    Per-dimension scale decays with the index, mimicking text-embedding-3's
+    Matryoshka training where leading dimensions carry most of the signal
+    (without it, the two-stage prefix numbers would be meaningless).
+    """
+    rng = np.random.default_rng(seed)
+    scale = (1.0 / np.sqrt(1.0 + np.arange(dim) / 32.0)).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) * scale
+    labels = rng.integers(0, clusters, rows)
+    matrix = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 10000):
+        stop = min(start + 10000, rows)
+        noise = rng.standard_normal((stop - start, dim)).astype(np.float32) * scale
+        matrix[start:stop] = centers[labels[start:stop]] + 0.8 * noise
+    return np.arange(rows, dtype=np.int64), matrix
+
+
+def make_queries(index: MovieVectorIndex, count: int, seed: int) -> np.ndarray:
+    """Queries near real catalog rows (like a user asking for 'movies like X')."""
+    rng = np.random.default_rng(seed + 1)
+    state = index._state
+    rows = rng.integers(0, state.base_matrix.shape[0], count)
+    base = np.asarray(state.base_matrix[rows], dtype=np.float32)
+    return base + 0.05 * rng.standard_normal(base.shape).astype(np.float32)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+
+def run_engine(index, queries, top_k, engine, nprobe=16, shortlist_size=0):
+    """Run all queries; return (result id arrays, latencies in seconds)."""
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        ids, _ = index.search(query, top_k, engine=engine, nprobe=nprobe, shortlist_size=shortlist_size)
+        latencies.append(time.perf_counter() - started)
+        results.append(ids)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact vs approximate search recall/latency report")
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic catalog size")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic vector dimension")
+    parser.add_argument("--clusters", type=int, default=500, help="Synthetic topic clusters")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Benchmark the real vector snapshot instead of a synthetic catalog")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=300)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: ~4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--prefix-dims", type=int, default=256, help="Two-stage prefix dimensions")
+    parser.add_argument("--shortlist-factor", type=int, nargs="+", default=[2, 4, 8],
+                        help="Two-stage shortlist size as a multiple of top-k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Vector Search Benchmark: exact vs IVF vs two-stage")
+    print("=" * 80)
+
+    if args.snapshot:
+        from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+        loaded = load_snapshot(get_snapshot_dir(), EMBEDDING_MODEL, EMBEDDING_DIM)
+        if loaded is None:
+            print(f"❌ No usable snapshot in {get_snapshot_dir()} (run tools/build_vector_snapshot.py)")
+            sys.exit(1)
+        ids, matrix, _ = loaded
+        index = MovieVectorIndex(ids, matrix, normalized=True, source="snapshot")
+    else:
+        print(f"Generating synthetic catalog: {args.rows} rows × {args.dim} dims...")
+        ids, matrix = synthetic_catalog(args.rows, args.dim, args.clusters, args.seed)
+        index = MovieVectorIndex(ids, matrix)
+        del matrix
+
+    print(f"✓ Index: {len(index)} vectors, {index.nbytes / 1024 / 1024:.1f} MB")
+
+    started = time.perf_counter()
+    index.build_ann(nlist=args.nlist)
+    build_seconds = time.perf_counter() - started
+    ann = index._state.ann
+    print(f"✓ IVF built in {build_seconds:.1f}s (nlist={ann.nlist})")
+
+    started = time.perf_counter()
+    index.build_prefix(args.prefix_dims)
+    print(f"✓ Prefix matrix built in {time.perf_counter() - started:.1f}s "
+          f"({args.prefix_dims}/{index.dim} dims)")
+
+    queries = make_queries(index, args.queries, args.seed)
+    top_k = min(args.top_k, len(index))
+
+    exact_results, exact_latencies = run_engine(index, queries, top_k, "exact")
+    exact_sets = [set(r.tolist()) for r in exact_results]
+
+    print()
+    print(f"{'engine':<10} {'param':>6} {'scanned':>9} {'recall@' + str(top_k):>11} {'p50 ms':>8} {'p99 ms':>8}")
+    print("-" * 58)
+    print(f"{'exact':<10} {'-':>6} {'100.0%':>9} {1.0:>11.4f} "
+          f"{percentile_ms(exact_latencies, 50):>8.2f} {percentile_ms(exact_latencies, 99):>8.2f}")
+
+    sizes = np.diff(ann.list_offsets)
+    for nprobe in args.nprobe:
+        ivf_results, ivf_latencies = run_engine(index, queries, top_k, "ivf", nprobe)
+        recall = np.mean([
+            len(exact & set(found.tolist())) / max(len(exact), 1)
+            for exact, found in zip(exact_sets, ivf_results)
+        ])
+        # Expected share of the catalog scanned: nprobe average-sized lists
+        scanned = min(nprobe, ann.nlist) * float(sizes.mean()) / max(len(index), 1)
+        print(f"{'ivf':<10} {nprobe:>6} {scanned:>9.1%} {recall:>11.4f} "
+              f"{percentile_ms(ivf_latencies, 50):>8.2f} {percentile_ms(ivf_latencies, 99):>8.2f}")
+
+    for factor in args.shortlist_factor:
+        shortlist_size = top_k * factor
+        two_stage_results, two_stage_latencies = run_engine(
+            index, queries, top_k, "two_stage", shortlist_size=shortlist_size
+        )
+        recall = np.mean([
+            len(exact & set(found.tolist())) / max(len(exact), 1)
+            for exact, found in zip(exact_sets, two_stage_results)
+        ])
+        # Prefix pass over every row plus a full-dimension rescore of the shortlist
+        scanned = args.prefix_dims / index.dim + min(shortlist_size / max(len(index), 1), 1.0)
+        print(f"{'two_stage':<10} {'x' + str(factor):>6} {scanned:>9.1%} {recall:>11.4f} "
+              f"{percentile_ms(two_stage_latencies, 50):>8.2f} {percentile_ms(two_stage_latencies, 99):>8.2f}")
+
+    print()
+    print("Pick the cheapest setting whose recall is acceptable and set")
+    print('PHASE36_CONFIG["embedding_search"] = {"engine": "ivf" | "two_stage", ...}')
+    print("(param = nprobe for ivf, shortlist multiple of top-k for two_stage)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Precompute embeddings for every mood-only query template.
+
+This script:
+1. Enumerates the mood vocabulary (frontend mood labels + English mood tags
+   used by MOOD_RELATIONSHIP_MATRIX)
+2. Runs generate_embedding_query() for every ordered 1-2 label combination of the
+   vocabulary and every unordered 3..--max-labels combination of the frontend mood
+   labels (3+ label templates are order-invariant), and collects the distinct texts
+3. Embeds the texts with the configured provider (one batched call per
+   EMBEDDING_BATCH_SIZE texts)
+4. Writes embeddings.npy + manifest.json (embedding_version, dim, texts)
+
+At runtime embedding_service looks mood-only queries up in this artifact
+before the query cache, so mood-button-only requests with up to --max-labels
+frontend mood labels make no external calls. Larger selections (or 3+ labels that
+include English mood tags) still embed once and are then served by the query cache.
+Running servers pick up a new artifact within PHASE36_CONFIG["mood_templates"]
+["reload_interval_seconds"].
+Rebuild whenever the templates, the mood vocabulary or the embedding model change.
+
+Usage:
+    python tools/build_mood_template_embeddings.py [--max-labels 3] [--output DIR]
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.embedding_service import (
+    EMBEDDING_DIM,
+    EMBEDDING_MODEL,
+    get_embeddings_batch,
+)
+from app.services.phase36_config import PHASE36_CONFIG
+from app.services.mood_template_embeddings import (
+    default_mood_vocabulary,
+    enumerate_mood_only_queries,
+    frontend_mood_labels,
+    get_template_dir,
+    write_mood_template_embeddings,
+)
+
+
+def build_mood_templates(output_dir: Path, max_labels: int) -> dict:
+    """Enumerate, embed and write all mood-only templates; return the manifest."""
+    print("[1/3] Enumerating mood-only templates...")
+    vocabulary = default_mood_vocabulary()
+    texts = enumerate_mood_only_queries(vocabulary, max_labels=max_labels, combination_vocabulary=frontend_mood_labels())
+    print(f"✓ {len(vocabulary)} mood labels → {len(texts)} distinct templates (up to {max_labels} labels)")
+
+    print(f"[2/3] Embedding {len(texts)} templates...")
+    started = time.perf_counter()
+    embeddings = get_embeddings_batch(texts)
+    print(f"✓ Embedded in {time.perf_counter() - started:.1f}s")
+
+    print("[3/3] Writing artifact...")
+    manifest = write_mood_template_embeddings(
+        output_dir,
+        texts,
+        embeddings,
+        embedding_version=EMBEDDING_MODEL,
+        max_labels=max_labels,
+    )
+    print(f"✓ Mood templates written to {output_dir}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute mood-only query template embeddings")
+    parser.add_argument("--max-labels", type=int,
+                        default=PHASE36_CONFIG.get("mood_templates", {}).get("max_labels", 3),
+                        help="Largest mood combination to enumerate (1-2 labels ordered over the full "
+                             "vocabulary, 3+ unordered over the frontend mood labels)")
+    parser.add_argument("--output", type=Path, default=get_template_dir(),
+                        help="Artifact directory (default: MOOD_TEMPLATE_DIR or backend/data/mood_templates)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Mood Template Embeddings Builder")
+    print("=" * 80)
+    print(f"Model: {EMBEDDING_MODEL}")
+    print(f"Embedding Dimension: {EMBEDDING_DIM}")
+    print(f"Output: {args.output}")
+    print()
+
+    manifest = build_mood_templates(args.output, args.max_labels)
+    print(f"  embedding_version: {manifest['embedding_version']}")
+    print(f"  rows: {manifest['rows']}")
@@ -0,0 +1,84 @@
+"""
+Precompute the top-K most similar movies for every movie.
+
+This script:
+1. Loads all movie vectors that have a matching movie (normalized, float32)
+2. Compares them with the rows already in movie_neighbors and finds the
+   movies whose vector changed (movie_vectors.updated_at or embedding model)
+3. Recomputes only the affected neighbor lists with blocked matrix products
+   (falls back to a full rebuild when too much of the catalog changed)
+4. Upserts the changed rows and deletes rows of movies without vectors
+
+GET /api/movies/{tmdb_id}/similar serves these rows with a primary-key lookup.
+Run it after batch_populate_embeddings.py / compute_all_embeddings.py.
+
+Usage:
+    python tools/build_movie_neighbors.py [--full] [--k 50] [--block-size 1024]
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db.database import SessionLocal
+from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+from app.services.movie_neighbors import load_movie_vectors, refresh_movie_neighbors
+from app.services.phase36_config import PHASE36_CONFIG
+
+
+def build_neighbors(full: bool, k: int, block_size: int) -> dict:
+    """Refresh movie_neighbors from the current movie vectors and return the stats."""
+    db_session = SessionLocal()
+
+    try:
+        print("[1/2] Loading movie vectors...")
+        ids, matrix, updated_ats = load_movie_vectors(db_session, EMBEDDING_DIM)
+        print(f"✓ Loaded {len(ids)} movie vectors")
+
+        print(f"[2/2] Computing neighbors ({'full' if full else 'incremental'})...")
+        started = time.perf_counter()
+        stats = refresh_movie_neighbors(
+            db_session,
+            ids,
+            matrix,
+            updated_ats,
+            embedding_version=EMBEDDING_MODEL,
+            k=k,
+            block_size=block_size,
+            full=full,
+            full_rebuild_ratio=PHASE36_CONFIG["movie_neighbors"]["full_rebuild_ratio"],
+        )
+        print(f"✓ Done in {time.perf_counter() - started:.1f}s")
+        return stats
+
+    finally:
+        db_session.close()
+
+
+if __name__ == "__main__":
+    config = PHASE36_CONFIG["movie_neighbors"]
+    parser = argparse.ArgumentParser(description="Precompute per-movie nearest neighbors")
+    parser.add_argument("--full", action="store_true",
+                        help="Recompute every neighbor list instead of only the changed ones")
+    parser.add_argument("--k", type=int, default=config["k"],
+                        help="Neighbors stored per movie")
+    parser.add_argument("--block-size", type=int, default=config["block_size"],
+                        help="Rows per blocked matrix product")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Movie Neighbors Builder")
+    print("=" * 80)
+    print(f"Model: {EMBEDDING_MODEL}")
+    print(f"Embedding Dimension: {EMBEDDING_DIM}")
+    print(f"K: {args.k}")
+    print()
+
+    stats = build_neighbors(args.full, args.k, args.block_size)
+    print(f"  changed vectors: {stats['changed']}")
+    print(f"  recomputed lists: {stats['recomputed']}")
+    print(f"  merged lists: {stats['merged']}")
+    print(f"  deleted lists: {stats['deleted']}")
@@ -0,0 +1,130 @@
+"""
+Export movie_vectors to an on-disk snapshot that workers can mmap.
+
+This script:
+1. Counts movie vectors that have a matching movie
+2. Streams them from Postgres in batches
+3. Normalizes each row and writes it into a new build directory
+   (builds/<build_id>/vectors.npy / ids.npy)
+4. Writes the build's manifest.json (build_id, embedding_version, rows, dim,
+   ids_sha1, max_updated_at), then atomically points CURRENT at the new build
+
+The API loads the snapshot at startup (app/services/vector_index.py) and
+falls back to the database when it is missing or built for another model.
+
+Usage:
+    python tools/build_vector_snapshot.py [--output DIR]
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import json
+import numpy as np
+from sqlalchemy import text
+from db.database import SessionLocal
+from app.services.embedding_service import EMBEDDING_DIM, EMBEDDING_MODEL
+from app.services.embedding_codec import (
+    STORED_EMBEDDING_COLUMNS,
+    HAS_STORED_EMBEDDING,
+    decode_stored_embedding,
+)
+from app.services.vector_snapshot import (
+    get_snapshot_dir,
+    open_snapshot_writer,
+    commit_snapshot,
+)
+
+# Configuration
+FETCH_BATCH_SIZE = 500
+
+
+def build_snapshot(output_dir: Path) -> dict:
+    """Export all movie vectors into output_dir and return the manifest."""
+    db_session = SessionLocal()
+
+    try:
+        print("[1/3] Counting movie vectors...")
+        total = db_session.execute(text(f"""
+            SELECT COUNT(*)
+            FROM movie_vectors mv
+            JOIN movies m ON mv.tmdb_id = m.tmdb_id
+            WHERE {HAS_STORED_EMBEDDING}
+        """)).scalar()
+        print(f"✓ Found {total} movie vectors")
+
+        print(f"[2/3] Streaming vectors (batch size: {FETCH_BATCH_SIZE})...")
+        ids, vectors = open_snapshot_writer(output_dir, total, EMBEDDING_DIM)
+
+        result = db_session.execute(
+            text(f"""
+                SELECT mv.tmdb_id, {STORED_EMBEDDING_COLUMNS}, mv.updated_at
+                FROM movie_vectors mv
+                JOIN movies m ON mv.tmdb_id = m.tmdb_id
+                WHERE {HAS_STORED_EMBEDDING}
+                ORDER BY mv.tmdb_id
+            """).execution_options(yield_per=FETCH_BATCH_SIZE)
+        )
+
+        rows = 0
+        skipped = 0
+        max_updated_at = None
+        for tmdb_id, embedding_bin, embedding_dtype, embedding_json, updated_at in result:
+            if rows >= total:
+                # Rows inserted after COUNT(*); the refresher will pick them up
+                break
+            # Prefer the binary column (zero-copy); fall back to JSONB for rows not yet backfilled
+            embedding_data = decode_stored_embedding(embedding_bin, embedding_dtype, embedding_json)
+            vector = np.asarray(embedding_data, dtype=np.float32)
+            if vector.shape != (EMBEDDING_DIM,):
+                skipped += 1
+                continue
+
+            norm = np.linalg.norm(vector)
+            vectors[rows] = vector / norm if norm > 0 else vector
+            ids[rows] = tmdb_id
+            rows += 1
+
+            if updated_at is not None and (max_updated_at is None or updated_at > max_updated_at):
+                max_updated_at = updated_at
+
+            if rows % 1000 == 0:
+                print(f"  {rows}/{total}")
+
+        print(f"✓ Exported {rows} vectors ({skipped} skipped: wrong dimension)")
+
+        print("[3/3] Writing manifest...")
+        manifest = commit_snapshot(
+            output_dir,
+            ids,
+            vectors,
+            rows=rows,
+            embedding_version=EMBEDDING_MODEL,
+            max_updated_at=max_updated_at,
+        )
+        print(f"✓ Snapshot {manifest['build_id']} written to {output_dir} (CURRENT updated)")
+        print(json.dumps(manifest, indent=2))
+        return manifest
+
+    finally:
+        db_session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the mmap-able movie vector snapshot")
+    parser.add_argument("--output", type=Path, default=get_snapshot_dir(),
+                        help="Snapshot directory (default: VECTOR_SNAPSHOT_DIR or backend/data/vector_snapshot)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Movie Vector Snapshot Builder")
+    print("=" * 80)
+    print(f"Model: {EMBEDDING_MODEL}")
+    print(f"Embedding Dimension: {EMBEDDING_DIM}")
+    print(f"Output: {args.output}")
+    print()
+
+    build_snapshot(args.output)
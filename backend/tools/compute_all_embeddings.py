@@ -8,7 +8,8 @@ from dotenv import load_dotenv
 load_dotenv(dotenv_path=backend_dir / ".env")
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from app.services.embedding_service import store_movie_embedding
+from app.services.embedding_service import embed_and_store_movies
+BATCH_SIZE = 100  # 每次 embeddings API 請求 + bulk UPSERT 的電影數
 engine = create_engine(os.getenv("DATABASE_URL"))
 SessionLocal = sessionmaker(bind=engine)
 def main():
@@ -25,21 +26,29 @@ def main():
         print(f" 已有 {existing} 部電影的 embeddings")
         print(f" 需要計算 {total - existing} 部\n")
         success = skip = errors = 0
+        pending = []
+        def flush():
+            nonlocal success, errors
+            if not pending:
+                return
+            try:
+                embed_and_store_movies(db, [(m.tmdb_id, m.overview) for m in pending])
+                success += len(pending)
+                print(f"   [{success}] ...{pending[-1].title}")
+            except Exception as e:
+                errors += len(pending)
+                print(f"   批次失敗 ({len(pending)} 部): {str(e)[:60]}")
+            pending.clear()
         for i, m in enumerate(movies, 1):
             if not m.overview or len(m.overview.strip()) < 20:
                 skip += 1
                 continue
-            try:
-                store_movie_embedding(db, m.tmdb_id, m.overview)
-                success += 1
-                if success <= 20 or success % 50 == 0:
-                    print(f"   [{i}/{total}] {m.title}")
-                if i % 100 == 0:
-                    print(f"\n 進度：{i}/{total} | 成功:{success} | 跳過:{skip} | 失敗:{errors}\n")
-            except Exception as e:
-                errors += 1
-                if errors <= 10:
-                    print(f"   失敗: {m.title[:30]} - {str(e)[:40]}")
+            pending.append(m)
+            if len(pending) >= BATCH_SIZE:
+                flush()
+            if i % 100 == 0:
+                print(f"\n 進度：{i}/{total} | 成功:{success} | 跳過:{skip} | 失敗:{errors}\n")
+        flush()
         print(f"\n{'='*60}\n 完成！總計:{total} | 成功:{success} | 跳過:{skip} | 失敗:{errors}\n 空間: ~{success*6.4/1024:.2f} MB |  成本: ~${success*0.00001:.4f}\n{'='*60}")
     finally:
         db.close()
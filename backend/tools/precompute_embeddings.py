@@ -22,7 +22,7 @@ print(f"[DEBUG] DATABASE_URL exists: {bool(os.getenv('DATABASE_URL'))}")
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from app.services.embedding_service import store_movie_embedding
+from app.services.embedding_service import embed_and_store_movies
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -67,8 +67,10 @@ async def main():
             try:
                 movies = await fetch_popular_movies(page)
                 
+                # 收集本頁有效電影，一次批次 API 請求 + bulk UPSERT
+                page_items = []
                 for i, movie in enumerate(movies, 1):
-                    if total_processed >= target_count:
+                    if total_processed + len(page_items) >= target_count:
                         break
                         
                     tmdb_id = movie.get("id")
@@ -79,17 +81,21 @@ async def main():
                         print(f"  ⏭️  跳過 {title} (無簡介)")
                         continue
                     
+                    page_items.append((tmdb_id, title, overview))
+                
+                if page_items:
                     try:
-                        store_movie_embedding(db, tmdb_id, overview)
-                        total_processed += 1
-                        print(f"  ✓ [{total_processed}] {title} (ID: {tmdb_id})")
-                        
-                        # 每 100 部顯示進度
-                        if total_processed % 100 == 0:
-                            print(f"\n📊 進度：已處理 {total_processed} / {target_count} 部電影\n")
+                        embed_and_store_movies(db, [(tmdb_id, overview) for tmdb_id, _, overview in page_items])
+                        for tmdb_id, title, _ in page_items:
+                            total_processed += 1
+                            print(f"  ✓ [{total_processed}] {title} (ID: {tmdb_id})")
+                            
+                            # 每 100 部顯示進度
+                            if total_processed % 100 == 0:
+                                print(f"\n📊 進度：已處理 {total_processed} / {target_count} 部電影\n")
                         
                     except Exception as e:
-                        print(f"  ✗ 失敗: {title} - {e}")
+                        print(f"  ✗ 本頁 {len(page_items)} 部失敗: {e}")
                 
                 # 避免 TMDB API 限流（每秒最多 40 次請求）
                 await asyncio.sleep(0.3)
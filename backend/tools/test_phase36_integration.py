@@ -1,12 +1,22 @@
 """
 Phase 3.6 整合測試 - End-to-End
 測試完整的 Embedding-First 推薦流程
+
+離線執行（不呼叫 OpenAI，只量測推薦 pipeline 本身的成本）：
+    python tools/test_phase36_integration.py --local-embeddings
+等同於設定 EMBEDDING_PROVIDER=local。查詢向量由決定性的 hashed n-gram Provider 產生，
+相似度分數不具語義意義，推薦結果僅供檢查流程與耗時。
 """
 
 import asyncio
+import os
 import sys
+import time
 from pathlib import Path
 
+if "--local-embeddings" in sys.argv:
+    os.environ["EMBEDDING_PROVIDER"] = "local"
+
 backend_path = Path(__file__).parent
 sys.path.insert(0, str(backend_path))
 
@@ -14,7 +24,6 @@ from dotenv import load_dotenv
 env_path = backend_path / ".env"
 load_dotenv(env_path)
 
-import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.services.simple_recommend import recommend_movies_embedding_first
@@ -218,15 +227,24 @@ async def test_scenario_4_quadrant_priority():
 async def main():
     print("\n" + "="*70)
     print("Phase 3.6 Integration Tests - End-to-End")
+    print(f"Embedding Provider: {os.getenv('EMBEDDING_PROVIDER') or 'openai'}")
     print("="*70)
     
-    await test_scenario_1_journey()
-    await test_scenario_2_mood_only()
-    await test_scenario_3_filters()
-    await test_scenario_4_quadrant_priority()
+    timings = []
+    for scenario in (
+        test_scenario_1_journey,
+        test_scenario_2_mood_only,
+        test_scenario_3_filters,
+        test_scenario_4_quadrant_priority,
+    ):
+        started = time.perf_counter()
+        await scenario()
+        timings.append((scenario.__name__, time.perf_counter() - started))
     
     print("\n" + "="*70)
     print("All Integration Tests Completed!")
+    for name, seconds in timings:
+        print(f"  {name:40s} {seconds * 1000:8.1f} ms")
     print("="*70)
 
 